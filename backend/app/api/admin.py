@@ -0,0 +1,47 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from app.core.config import settings
+from app.db.query import queries
+
+router = APIRouter(prefix="/admin")
+
+
+def require_admin(authorization: Optional[str], x_admin_token: Optional[str]) -> None:
+    # Disabled (404) unless ADMIN_TOKEN is set; accepts Bearer or X-Admin-Token.
+    # Also guards /metrics
+    expected = settings.ADMIN_TOKEN
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = x_admin_token or ""
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+@router.get("/slow-queries", include_in_schema=False)
+async def slow_queries(
+    limit: int = 50,
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+) -> dict:
+    require_admin(authorization, x_admin_token)
+    log = queries.slow_log
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "explain_sample_rate": settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        "stats": log.stats(),
+        "entries": log.snapshot()[: max(0, limit)],
+    }
+
+
+@router.delete("/slow-queries", include_in_schema=False)
+async def clear_slow_queries(
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+) -> dict:
+    require_admin(authorization, x_admin_token)
+    queries.slow_log.clear()
+    return {"ok": True}
@@ -2,6 +2,7 @@ from typing import List
 from fastapi import APIRouter
 from app.schemas.rule import RuleOut
 from app.repos.rule_repo import list_rules, create_rule, delete_rule
+from app.services.rule_engine import engine
 
 router = APIRouter()
 
@@ -15,11 +16,16 @@ async def get_rules(user_id: str) -> List[RuleOut]:
 @router.post("/users/{user_id}/alerts")
 async def post_rule(user_id: str, payload: dict) -> dict:
     rid = await create_rule(user_id, payload)
+    # Other workers pick the change up via the rules_changed trigger
+    await engine.refresh_rule(rid)
     return {"id": rid}
 
 
 @router.delete("/users/{user_id}/alerts/{rule_id}")
 async def delete_rule_route(user_id: str, rule_id: int) -> dict:
-    await delete_rule(user_id, rule_id)
+    # Only a rule this user owned; otherwise another user's rule would drop out
+    # of the in-memory index until the next reload
+    if await delete_rule(user_id, rule_id) > 0:
+        engine.remove_rule(rule_id)
     return {"ok": True}
 
@@ -1,13 +1,39 @@
-from typing import Optional, List, Any, Dict
-from fastapi import APIRouter, Depends
-from app.utils.pagination import get_page, Page
-from app.repos.deal_repo import list_deals
+from typing import Optional, List, Any, Dict, Union
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from app.core.config import settings
+from app.utils.pagination import get_page, Page, encode_cursor, decode_cursor
+from fastapi.responses import StreamingResponse
+from app.utils.responses import RawJSONResponse, export_response
+from app.repos.deal_repo import list_deals_json, list_deals_after, iter_deals_json
+from app.repos.version_repo import get_data_version, DEALS_VERSION
+from app.utils.conditional import make_validators
 
 router = APIRouter()
 
 
-@router.get("/deals")
+def _to_public(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Back-compat transform: derive support_cash from legacy cash_delta and remove cash_delta
+    # (mirrors api_deal_public_json in sql/views.sql)
+    out: List[Dict[str, Any]] = []
+    for d in rows:
+        d = dict(d)
+        if "support_cash" not in d:
+            cd = d.get("cash_delta")
+            if isinstance(cd, (int, float)) and cd < 0:
+                d["support_cash"] = int(abs(cd))
+            else:
+                d["support_cash"] = None
+        # Remove legacy field
+        if "cash_delta" in d:
+            d.pop("cash_delta", None)
+        out.append(d)
+    return out
+
+
+@router.get("/deals", response_model=None)
 async def get_deals(
+    request: Request,
+    response: Response,
     model: Optional[str] = None,
     carrier: Optional[str] = None,
     city: Optional[str] = None,
@@ -17,8 +43,12 @@ async def get_deals(
     channel: Optional[str] = None,
     sort: str = "latest",
     page: Page = Depends(get_page),
-) -> List[Any]:
-    rows = await list_deals(
+) -> Union[RawJSONResponse, Response, Dict[str, Any]]:
+    # Answer revalidations from the data version alone, before any deals query
+    validators = make_validators(request, [await get_data_version(DEALS_VERSION)], settings.CACHE_CONTROL_DEALS)
+    if validators.matches(request):
+        return validators.not_modified()
+    filters = dict(
         model=model,
         carrier=carrier,
         city=city,
@@ -27,21 +57,47 @@ async def get_deals(
         payment=payment,
         channel=channel,
         sort=sort,
-        limit=page.limit,
-        offset=page.offset,
     )
-    # Back-compat transform: derive support_cash from legacy cash_delta and remove cash_delta
-    out: List[Dict[str, Any]] = []
-    for d in rows:
-        d = dict(d)
-        if "support_cash" not in d:
-            cd = d.get("cash_delta")
-            if isinstance(cd, (int, float)) and cd < 0:
-                d["support_cash"] = int(abs(cd))
-            else:
-                d["support_cash"] = None
-        # Remove legacy field
-        if "cash_delta" in d:
-            d.pop("cash_delta", None)
-        out.append(d)
-    return out
+    if page.cursor is None:
+        # Legacy LIMIT/OFFSET mode: plain list, serialized by Postgres
+        body = await list_deals_json(**filters, limit=page.limit, offset=page.offset)
+        return RawJSONResponse(body, headers=validators.headers())
+
+    # Cursor mode (`?cursor=` to start): seek instead of offset
+    try:
+        rows, next_key = await list_deals_after(
+            **filters, limit=page.limit, after=decode_cursor(page.cursor)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(validators.headers())
+    return {
+        "items": _to_public(rows),
+        "next_cursor": encode_cursor(next_key) if next_key else None,
+    }
+
+
+@router.get("/deals/export", response_class=StreamingResponse)
+async def export_deals(
+    model: Optional[str] = None,
+    carrier: Optional[str] = None,
+    city: Optional[str] = None,
+    move_type: Optional[str] = None,
+    contract: Optional[str] = None,
+    payment: Optional[str] = None,
+    channel: Optional[str] = None,
+    sort: str = "latest",
+    format: str = "ndjson",
+) -> StreamingResponse:
+    # Whole filtered result set, streamed with constant memory
+    rows = iter_deals_json(
+        model=model,
+        carrier=carrier,
+        city=city,
+        move_type=move_type,
+        contract=contract,
+        payment=payment,
+        channel=channel,
+        sort=sort,
+    )
+    return await export_response(rows, format, "deals")
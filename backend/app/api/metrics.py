@@ -0,0 +1,91 @@
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import PlainTextResponse
+from app.api.admin import require_admin
+from app.core.config import settings
+from app.core.logsink import log_sink
+from app.core.metrics import registry
+from app.db.notify import listener
+from app.repos.alert_repo import pending_queue_stats
+from app.repos.deal_repo import deal_cache, deal_flights
+from app.repos.report_repo import report_cache, report_flights
+from app.repos.version_repo import version_cache
+from app.services.polling_service import stats as dispatch_stats
+from app.services.rule_engine import engine as rule_engine
+
+router = APIRouter()
+
+# Scrape-time views of state other components already keep
+_counter = "counter"
+DISPATCH = registry.gauge("alerts_dispatch_total", "Dispatcher counters for this process", ["event"], kind=_counter)
+QUEUE = registry.gauge("alerts_queue", "Undelivered alert_events (depth, due) and oldest age in seconds", ["measure"])
+CACHE_EVENTS = registry.gauge("cache_events_total", "Read cache hits/misses/evictions/expirations/invalidations", ["cache", "event"], kind=_counter)
+CACHE_ENTRIES = registry.gauge("cache_entries", "Entries held by each read cache", ["cache"])
+SINGLEFLIGHT = registry.gauge("singleflight_calls_total", "Coalesced reads: queries started (leaders), callers that joined one, loads cancelled by every caller", ["group", "event"], kind=_counter)
+SINGLEFLIGHT_IN_FLIGHT = registry.gauge("singleflight_in_flight", "Shared reads currently running", ["group"])
+COMPRESSED = registry.gauge("compression_cache", "Compressed response side cache (entries, bytes, hits, misses, evictions)", ["measure"])
+LOG_SINK = registry.gauge("log_sink", "Log sink queue depth and cumulative enqueued/dropped/written/errors", ["measure"])
+NOTIFY = registry.gauge("db_notify", "LISTEN connection: connected, notifications, reconnects", ["measure"])
+RULES = registry.gauge("rule_engine", "Rule engine: rules indexed, deals seen, candidates checked, events created", ["measure"])
+
+
+def _collect_process() -> None:
+    for event in ("batches", "sent", "failed", "dead_lettered", "subscriptions_pruned", "wakeups_notify", "wakeups_timer"):
+        DISPATCH.set(getattr(dispatch_stats, event), event)
+    for cache in (deal_cache, report_cache, version_cache):
+        s = cache.stats()
+        for event in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            CACHE_EVENTS.set(s[event], s["name"], event)
+        CACHE_ENTRIES.set(s["size"], s["name"])
+    for flights in (deal_flights, report_flights):
+        s = flights.stats()
+        for event in ("leaders", "coalesced", "cancelled"):
+            SINGLEFLIGHT.set(s[event], s["name"], event)
+        SINGLEFLIGHT_IN_FLIGHT.set(s["in_flight"], s["name"])
+    for measure, value in log_sink.stats().items():
+        LOG_SINK.set(value, measure)
+    NOTIFY.set(1 if listener.connected else 0, "connected")
+    NOTIFY.set(listener.notifications, "notifications")
+    NOTIFY.set(listener.reconnects, "reconnects")
+    RULES.set(len(rule_engine.index), "rules")
+    RULES.set(rule_engine.deals_seen, "deals_seen")
+    RULES.set(rule_engine.candidates_checked, "candidates_checked")
+    RULES.set(rule_engine.events_created, "events_created")
+
+
+# monotonic time of the last queue query
+_queue_checked: Optional[float] = None
+
+
+async def _collect_queue() -> None:
+    # A count(*) over alert_events: run at most once per TTL whatever the
+    # scrape rate, scrapes in between (or after a failed query) get the last values
+    global _queue_checked
+    now = time.monotonic()
+    if _queue_checked is not None and now - _queue_checked < settings.METRICS_QUEUE_STATS_TTL_SEC:
+        return
+    _queue_checked = now
+    for measure, value in (await pending_queue_stats()).items():
+        QUEUE.set(value, measure)
+
+
+registry.add_collector(_collect_process)
+registry.add_collector(_collect_queue)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(
+    request: Request,
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+) -> PlainTextResponse:
+    # Prometheus text exposition format 0.0.4; scrape with ADMIN_TOKEN as bearer token
+    require_admin(authorization, x_admin_token)
+    await registry.collect(timeout=settings.METRICS_COLLECT_TIMEOUT_SEC)
+    compressed = getattr(request.app.state, "compressed_cache", None)
+    if compressed is not None:
+        for measure, value in compressed.stats().items():
+            COMPRESSED.set(value, measure)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
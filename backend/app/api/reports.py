@@ -1,25 +1,54 @@
-from typing import Optional, List, Any
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response, StreamingResponse
 from app.utils.pagination import get_page, Page
+from app.core.config import settings
+from app.utils.responses import RawJSONResponse, export_response
+from app.utils.conditional import make_validators
+from app.repos.version_repo import get_data_version, AGGREGATES_VERSION, LATEST_REPORTS_VERSION
 from app.repos.report_repo import (
-    list_daily_reports,
-    list_daily_latest_reports,
-    list_daily_reports_by_date,
+    list_daily_latest_reports_json,
+    list_daily_reports_by_date_json,
+    iter_daily_reports_json,
 )
 
 router = APIRouter()
 
 
-@router.get("/reports/daily")
+@router.get("/reports/daily", response_class=RawJSONResponse)
 async def get_reports_daily(
+    request: Request,
     date: str,
     page: Page = Depends(get_page),
-) -> List[Any]:
+) -> Response:
     # History by date
-    return await list_daily_reports_by_date(date=date, limit=page.limit, offset=page.offset)
+    validators = make_validators(
+        request, [await get_data_version(AGGREGATES_VERSION)], settings.CACHE_CONTROL_REPORTS_DAILY
+    )
+    if validators.matches(request):
+        return validators.not_modified()
+    body = await list_daily_reports_by_date_json(date=date, limit=page.limit, offset=page.offset)
+    return RawJSONResponse(body, headers=validators.headers())
 
 
-@router.get("/reports/daily/latest")
-async def get_reports_daily_latest() -> List[Any]:
-    # Latest snapshot for all models
-    return await list_daily_latest_reports()
+@router.get("/reports/daily/latest", response_class=RawJSONResponse)
+async def get_reports_daily_latest(request: Request) -> Response:
+    # Latest snapshot for all models; versioned by snapshot refreshes, not raw aggregates writes
+    validators = make_validators(
+        request, [await get_data_version(LATEST_REPORTS_VERSION)], settings.CACHE_CONTROL_REPORTS_LATEST
+    )
+    if validators.matches(request):
+        return validators.not_modified()
+    return RawJSONResponse(await list_daily_latest_reports_json(), headers=validators.headers())
+
+
+@router.get("/reports/daily/export", response_class=StreamingResponse)
+async def export_reports_daily(
+    model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    format: str = "ndjson",
+) -> StreamingResponse:
+    # Full history, streamed with constant memory
+    rows = iter_daily_reports_json(model=model, date_from=date_from, date_to=date_to)
+    return await export_response(rows, format, "reports_daily")
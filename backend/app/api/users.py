@@ -1,6 +1,10 @@
-from fastapi import APIRouter
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.core.config import settings
 from app.schemas.user import ProfileIn, ProfileOut
 from app.repos.profile_repo import upsert_profile, get_profile
+from app.repos.deal_repo import list_rank_candidates, get_deals_by_ids
+from app.services.tco_engine import DealArrays, rank_by_savings
 
 router = APIRouter()
 
@@ -12,3 +16,59 @@ async def save_profile(user_id: str, profile: ProfileIn) -> ProfileOut:
     assert row is not None
     return ProfileOut(**row)
 
+
+@router.get("/users/{user_id}/deals/ranked")
+async def ranked_deals(
+    user_id: str,
+    model: Optional[str] = None,
+    carrier: Optional[str] = None,
+    move_type: Optional[str] = None,
+    contract: Optional[str] = None,
+    payment: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+) -> List[Dict[str, Any]]:
+    """Deals ordered by savings versus the user's current plan (profile).
+
+    Candidates are the RANKED_CANDIDATE_LIMIT deals with the lowest monthly
+    net cost among those matching the filters and the profile's
+    channel_pref/city. They are re-ranked here with the profile's plan and
+    mvno_flag.
+    """
+    profile = await get_profile(user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    rows = await list_rank_candidates(
+        model=model,
+        carrier=carrier,
+        move_type=move_type,
+        contract=contract,
+        payment=payment,
+        channel_pref=profile.get("channel_pref"),
+        profile_city=profile.get("city"),
+        limit=settings.RANKED_CANDIDATE_LIMIT,
+    )
+    arr = DealArrays.from_rows(rows)
+    ranking = rank_by_savings(
+        arr,
+        current_plan_fee=profile.get("current_plan_fee"),
+        addons_monthly=profile.get("addons_monthly"),
+        mvno_ok=bool(profile.get("mvno_flag")),
+        limit=limit,
+    )
+    ids = [arr.ids[i] for i in ranking.index]
+    deals = await get_deals_by_ids(ids)
+    by_id = {d.get("id"): d for d in deals}
+    out: List[Dict[str, Any]] = []
+    for pos, deal_id in enumerate(ids):
+        deal = by_id.get(deal_id)
+        if deal is None:
+            # Deleted between the two queries
+            continue
+        out.append({
+            **deal,
+            "tco_total": int(ranking.tco_total[pos]),
+            "tco_net": int(ranking.tco_net[pos]),
+            "savings_total": int(round(ranking.savings_total[pos])),
+            "savings_monthly": int(round(ranking.savings_monthly[pos])),
+        })
+    return out
@@ -12,10 +12,41 @@ class Settings(BaseSettings):
     VAPID_PUBLIC_KEY: str | None = None
     VAPID_SUBJECT: str = "mailto:ops@example.com"
 
-    # Polling/dispatch (A-plan)
+    # Polling/dispatch (A-plan). With sql/notify.sql installed the dispatcher is
+    # woken by NOTIFY and POLL_INTERVAL_SEC is only the fallback
     POLL_INTERVAL_SEC: int = 30
     POLL_BATCH_SIZE: int = 200
     MAX_RETRY_PUSH: int = 3
+    # Exponential backoff between attempts: base * 2^(attempts-1), capped, with jitter
+    PUSH_RETRY_BASE_SEC: float = 30.0
+    PUSH_RETRY_MAX_SEC: float = 3600.0
+    # Burst coalescing after an alert_events notification wakes the dispatcher
+    ALERT_DEBOUNCE_MS: int = 200
+    # A claimed alert returns to the queue if not acked within this lease
+    ALERT_CLAIM_LEASE_SEC: int = 120
+    # Web Push delivery: worker threads, per push-service in-flight cap, request timeout
+    PUSH_MAX_WORKERS: int = 32
+    PUSH_MAX_INFLIGHT_PER_ORIGIN: int = 16
+    PUSH_TIMEOUT_SEC: float = 10.0
+    # Pooled push transport: VAPID JWT lifetime (max 24h) and re-sign margin, keep-alive, TLS
+    PUSH_VAPID_EXP_SEC: int = 12 * 3600
+    PUSH_VAPID_REFRESH_MARGIN_SEC: int = 600
+    PUSH_KEEPALIVE_SEC: float = 60.0
+    PUSH_VERIFY_TLS: bool = True
+    # TTL header sent to the push service (0 = deliver now or drop)
+    PUSH_MESSAGE_TTL_SEC: int = 0
+    # Rule engine: matches newly parsed deals against enabled rules and inserts alert_events.
+    # Woken by deals_changed NOTIFY (debounced); the interval is the fallback
+    RULE_ENGINE_ENABLED: bool = True
+    RULE_ENGINE_BATCH_SIZE: int = 1000
+    RULE_ENGINE_INTERVAL_SEC: int = 60
+    RULE_ENGINE_DEBOUNCE_SEC: float = 1.0
+    # Pipeline watermarks (rule engine, aggregates) stay this far behind NOW() and
+    # behind the oldest open write transaction, so late commits are not skipped
+    PIPELINE_COMMIT_GRACE_SEC: float = 2.0
+    # /users/{id}/deals/ranked: the N matching deals with the lowest monthly net
+    # cost are re-ranked per profile
+    RANKED_CANDIDATE_LIMIT: int = 2000
 
     # CORS
     CORS_ORIGINS: list[str] = [
@@ -31,6 +62,26 @@ class Settings(BaseSettings):
     DEBUG_HTTP_HEADERS: bool = True
     # Max bytes to preview from bodies
     DEBUG_HTTP_MAX_PREVIEW: int = 1024
+    # Fraction of requests (0.0-1.0) logged even without X-Debug, for production sampling
+    DEBUG_HTTP_SAMPLE_RATE: float = 0.0
+
+    # /metrics (Prometheus text format, behind ADMIN_TOKEN); scrape-time DB collectors
+    # are bounded by this timeout
+    METRICS_ENABLED: bool = True
+    METRICS_COLLECT_TIMEOUT_SEC: float = 2.0
+    # alert_events queue gauges are re-queried at most this often, not on every scrape
+    METRICS_QUEUE_STATS_TTL_SEC: float = 30.0
+
+    # Shared secret for /admin/* and /metrics (Bearer or X-Admin-Token); they answer 404 when unset
+    ADMIN_TOKEN: Optional[str] = None
+
+    # Background log sink (http.debug, dispatcher): bounded queue, batched writes
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_BATCH_SIZE: int = 256
+    # Optional rotating file output in addition to stderr
+    LOG_FILE: Optional[str] = None
+    LOG_FILE_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_FILE_BACKUPS: int = 5
 
     # Optional individual Postgres parts (for ops environments)
     IS_POSTGRES_HOST: Optional[str] = None
@@ -40,10 +91,97 @@ class Settings(BaseSettings):
     IS_POSTGRES_DB: Optional[str] = None
 
     # Database pool & timeout
+    # Primary pool: API writes and anything not declared @uses_pool(READ)
     DB_POOL_MIN: int = 1
     DB_POOL_MAX: int = 10
-    # Per-query timeout (seconds) to prevent hanging requests
+    # Seconds to wait for a free connection before failing the call
+    DB_POOL_TIMEOUT: float = 5.0
+    # Read replicas (comma-separated URLs) for @uses_pool(READ) repo functions; one
+    # pool of DB_READ_POOL_* per replica. Replicas lagging more than
+    # DB_REPLICA_MAX_LAG_SEC (checked every DB_REPLICA_CHECK_SEC) or unreachable
+    # are skipped and reads fall back to the primary
+    DATABASE_REPLICA_URLS: Optional[str] = None
+    DB_READ_POOL_MIN: int = 1
+    DB_READ_POOL_MAX: int = 10
+    DB_READ_POOL_TIMEOUT: float = 2.0
+    DB_REPLICA_MAX_LAG_SEC: float = 5.0
+    DB_REPLICA_CHECK_SEC: float = 2.0
+    # Background pool on the primary for @background_job work (dispatcher, rule
+    # engine, aggregates, snapshot refresh); 0 runs those on the primary pool
+    DB_BACKGROUND_POOL_MIN: int = 1
+    DB_BACKGROUND_POOL_MAX: int = 4
+    DB_BACKGROUND_POOL_TIMEOUT: float = 30.0
+    # Canonical statements (deal pages, see deal_repo) are loaded into asyncpg's
+    # per-connection LRU of prepared statements when a pool connection opens;
+    # other SQL is prepared there on first use. Keep the size well above the
+    # canonical set so ad-hoc queries don't evict it
+    DB_PREPARE_ON_CONNECT: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 1024
+    # :name -> $n compiled SQL texts kept in process
+    DB_COMPILE_CACHE_SIZE: int = 4096
+    # Optional plan_cache_mode for pool connections (auto / force_generic_plan /
+    # force_custom_plan); unset keeps the server default
+    DB_PLAN_CACHE_MODE: Optional[str] = None
+    # Per-query timeout (seconds) to prevent hanging requests; the session default
+    # statement_timeout of the replica pools, and of the primary when background
+    # jobs have their own pool (DB_BACKGROUND_POOL_MAX > 0)
     DB_QUERY_TIMEOUT: float = 5.0
+    # Slow named queries go to a ring buffer served at /admin/slow-queries; a sampled
+    # fraction is re-run under EXPLAIN (ANALYZE, BUFFERS) in the background
+    SLOW_QUERY_THRESHOLD_MS: float = 500.0
+    SLOW_QUERY_BUFFER_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_EXPLAIN_MAX_CONCURRENT: int = 1
+    SLOW_QUERY_EXPLAIN_TIMEOUT_SEC: float = 30.0
+    # Dedicated LISTEN connection for change notifications (sql/notify.sql)
+    DB_NOTIFY_ENABLED: bool = True
+
+    # In-process read cache (invalidated via NOTIFY; TTL bounds staleness if a notification is missed)
+    CACHE_ENABLED: bool = True
+    CACHE_TTL_SEC: float = 60.0
+    CACHE_MAX_ENTRIES: int = 512
+    # Only /deals pages with offset + limit up to this depth are cached
+    CACHE_DEALS_MAX_DEPTH: int = 200
+    # Concurrent identical deal/report reads that miss the cache share one query
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    # HTTP caching on read routes: ETag/Last-Modified come from api_data_versions
+    # (sql/notify.sql); Cache-Control per route, empty string to omit
+    CACHE_CONTROL_DEALS: str = "public, max-age=15, stale-while-revalidate=60"
+    CACHE_CONTROL_REPORTS_DAILY: str = "public, max-age=300, stale-while-revalidate=3600"
+    CACHE_CONTROL_REPORTS_LATEST: str = "public, max-age=60, stale-while-revalidate=300"
+
+    # Response compression (gzip always; br/zstd when brotli/zstandard are installed).
+    # Bodies with an ETag are compressed once per (ETag, coding) and kept in a side cache
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # Streaming exports (/deals/export, /reports/daily/export)
+    EXPORT_CHUNK_BYTES: int = 65536
+    # Each running export holds one pool connection
+    EXPORT_MAX_CONCURRENT: int = 2
+
+    # Latest-report snapshot (api_reports_daily_latest_mv) refresh
+    REPORTS_SNAPSHOT_ENABLED: bool = True
+    # Safety-net refresh interval when no aggregates notification arrives
+    REPORTS_SNAPSHOT_REFRESH_SEC: int = 300
+    # Coalesce bursts of aggregates_daily writes into one refresh
+    REPORTS_SNAPSHOT_DEBOUNCE_SEC: float = 2.0
+
+    # Incremental aggregates_daily builder (sql/aggregates.sql). Off by default while
+    # aggregates are still produced externally; days are cut in AGGREGATES_TIMEZONE
+    AGGREGATES_ENABLED: bool = False
+    AGGREGATES_TIMEZONE: str = "Asia/Seoul"
+    AGGREGATES_INTERVAL_SEC: int = 300
+    AGGREGATES_DEBOUNCE_SEC: float = 5.0
+    # Max parsed_at span folded per transaction (catch-up after downtime)
+    AGGREGATES_MAX_WINDOW_HOURS: int = 24
+    AGGREGATES_BACKFILL_CONCURRENCY: int = 4
+    AGGREGATES_TDIGEST_COMPRESSION: float = 100.0
 
 
 settings = Settings()  # loads from .env and environment
@@ -0,0 +1,169 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import IO, Optional
+
+from app.core.config import settings
+
+
+class StructuredFormatter(logging.Formatter):
+    # dict messages become one JSON line; everything else formats as usual
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.msg, dict):
+            return json.dumps(record.msg, ensure_ascii=False, default=str)
+        return super().format(record)
+
+
+class _EnqueueHandler(logging.Handler):
+    """Hot-path handler: hands the raw record to the sink without formatting.
+
+    Never blocks; when the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, sink: "LogSink") -> None:
+        super().__init__()
+        self.sink = sink
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.sink.queue.put_nowait(record)
+            self.sink.enqueued += 1
+        except queue.Full:
+            self.sink.dropped += 1
+
+
+class LogSink:
+    """Bounded queue drained by one background thread that formats and writes in batches.
+
+    Output goes to ``stream`` (stderr by default) and, if ``file_path`` is set,
+    to a size-rotated file.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        batch_size: int = 256,
+        file_path: Optional[str] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5,
+        stream: Optional[IO[str]] = None,
+    ) -> None:
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=maxsize)
+        self.batch_size = max(1, batch_size)
+        self.stream = stream
+        self.formatter = StructuredFormatter("%(message)s")
+        self._file: Optional[logging.handlers.RotatingFileHandler] = None
+        if file_path:
+            self._file = logging.handlers.RotatingFileHandler(
+                file_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+
+    def handler(self) -> logging.Handler:
+        return _EnqueueHandler(self)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        # Flushes whatever is queued, then joins the writer thread
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(r is self._STOP for r in batch)
+            self._write([r for r in batch if r is not self._STOP])  # type: ignore[misc]
+            if stop:
+                return
+
+    def _write(self, records: list[logging.LogRecord]) -> None:
+        if not records:
+            return
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                self.errors += 1
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        try:
+            out = self.stream or sys.stderr
+            out.write(text)
+            out.flush()
+            if self._file is not None:
+                fh = self._file
+                if fh.stream is None:
+                    fh.stream = fh._open()
+                fh.stream.write(text)
+                fh.stream.flush()
+                # Rotate between batches rather than per record
+                if fh.maxBytes and fh.stream.tell() >= fh.maxBytes:
+                    fh.doRollover()
+            self.written += len(lines)
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "errors": self.errors,
+        }
+
+
+log_sink = LogSink(
+    maxsize=settings.LOG_QUEUE_SIZE,
+    batch_size=settings.LOG_BATCH_SIZE,
+    file_path=settings.LOG_FILE,
+    max_bytes=settings.LOG_FILE_MAX_BYTES,
+    backups=settings.LOG_FILE_BACKUPS,
+)
+
+
+def get_sink_logger(name: str, level: int = logging.INFO) -> logging.Logger:
+    """Logger whose records go through the shared background sink.
+
+    Pass dicts as the message for structured JSON lines; they are serialized
+    on the sink thread, not on the event loop.
+    """
+    logger = logging.getLogger(name)
+    if not any(isinstance(h, _EnqueueHandler) for h in logger.handlers):
+        logger.handlers = [log_sink.handler()]
+        # Avoid double-logging via root
+        logger.propagate = False
+    if not logger.level:
+        logger.setLevel(level)
+    log_sink.start()
+    return logger
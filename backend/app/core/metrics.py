@@ -0,0 +1,232 @@
+"""In-process metrics with Prometheus text exposition.
+
+Everything is recorded from the event loop thread, so metrics are plain
+dicts and floats: no locks and no per-request allocation beyond a label
+tuple. Values owned by other components (cache stats, log sink, pool
+sizes, queue depth) are read by collectors at scrape time instead of being
+pushed on every change.
+"""
+import asyncio
+import functools
+import inspect
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterable, Optional, Sequence, TypeVar, Union
+
+LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterable[str]:  # pragma: no cover - abstract
+        return ()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, v in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(v)}"
+
+
+class Gauge(_Metric):
+    """Last-set value per label set.
+
+    ``kind="counter"`` exposes a cumulative value kept elsewhere (e.g. a
+    stats object) with counter semantics.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), kind: str = "gauge") -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = float(value)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, v in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(v)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        # Non-cumulative here; made cumulative at exposition time
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in self._counts.items():
+            running = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                running += c
+                le = f'le="{_fmt(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(self._sums[labels])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {running}"
+
+
+Collector = Callable[[], Union[None, Awaitable[None]]]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def _add(self, metric: Any) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Module reloads re-declare metrics; keep the live instance
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), kind: str = "gauge") -> Gauge:
+        return self._add(Gauge(name, help, labelnames, kind))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn: Collector) -> None:
+        # Called at scrape time (sync or async) to refresh gauges
+        self._collectors.append(fn)
+
+    async def collect(self, timeout: float = 2.0) -> None:
+        for fn in self._collectors:
+            try:
+                result = fn()
+                if inspect.isawaitable(result):
+                    await asyncio.wait_for(result, timeout=timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A failing collector only leaves its gauges stale
+                SCRAPE_ERRORS.inc(getattr(fn, "__name__", "collector"))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            samples = list(metric.samples())
+            if not samples:
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+SCRAPE_ERRORS = registry.counter("metrics_collector_errors_total", "Collectors that failed during a scrape", ["collector"])
+
+# HTTP (middleware/metrics.py)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP responses by route template and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time to the last response byte", ["method", "route"]
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently being handled")
+
+# Database
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds", "Repo function duration, including pool wait and cache hits", ["query"]
+)
+DB_QUERY_ERRORS = registry.counter("db_query_errors_total", "Repo functions that raised", ["query"])
+DB_POOL_WAIT = registry.histogram(
+    "db_pool_acquire_seconds",
+    "Time from a timed repo call to a pooled connection being handed out",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# Marks the start of the current timed repo call (read by the pool setup hook)
+query_started: ContextVar[Optional[float]] = ContextVar("query_started", default=None)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def timed_query(fn: F) -> F:
+    """Record duration/errors of an async repo function as ``<module>.<function>``."""
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        token = query_started.set(started)
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            DB_QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            query_started.reset(token)
+            DB_QUERY_LATENCY.observe(time.perf_counter() - started, name)
+
+    return wrapper  # type: ignore[return-value]
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.db.session import asyncpg_dsn
+
+
+logger = logging.getLogger("db.notify")
+
+Callback = Callable[[str, str], Any]
+
+# Channels raised by the statement triggers in sql/notify.sql
+DEALS_CHANNEL = "deals_changed"
+AGGREGATES_CHANNEL = "aggregates_changed"
+ALERTS_CHANNEL = "alert_events"
+RULES_CHANNEL = "rules_changed"
+
+
+class NotifyListener:
+    """Holds one dedicated connection that LISTENs on the subscribed channels.
+
+    Callbacks receive ``(channel, payload)`` and run on the event loop; they
+    must be quick and must not block. After a reconnect every callback is
+    invoked once with an empty payload, since notifications sent while the
+    connection was down are lost.
+    """
+
+    def __init__(self) -> None:
+        self._callbacks: dict[str, list[Callback]] = defaultdict(list)
+        self._conn: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = asyncio.Event()
+        self._stopping = False
+        self.notifications = 0
+        self.reconnects = 0
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        self._callbacks[channel].append(callback)
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        for cb in self._callbacks.get(channel, ()):
+            try:
+                cb(channel, payload)
+            except Exception:
+                logger.exception("notify callback failed channel=%s", channel)
+
+    def _on_notify(self, conn: Any, pid: int, channel: str, payload: str) -> None:
+        self.notifications += 1
+        self._dispatch(channel, payload)
+
+    def _on_terminate(self, conn: Any) -> None:
+        self._closed.set()
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        first = True
+        while not self._stopping:
+            try:
+                self._closed = asyncio.Event()
+                conn = await asyncpg.connect(asyncpg_dsn())
+                conn.add_termination_listener(self._on_terminate)
+                for channel in self._callbacks:
+                    await conn.add_listener(channel, self._on_notify)
+                self._conn = conn
+                backoff = 1.0
+                if not first:
+                    self.reconnects += 1
+                    # Anything may have changed while we were not listening
+                    for channel in list(self._callbacks):
+                        self._dispatch(channel, "")
+                first = False
+                await self._closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("notify listener connection failed: %s", e)
+            finally:
+                self._conn = None
+            if not self._stopping:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def start(self) -> None:
+        if self._task is None and self._callbacks and settings.DB_NOTIFY_ENABLED:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        conn, task = self._conn, self._task
+        self._task = None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close()
+            except Exception:
+                pass
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+# Shared listener; repos/services subscribe at import time, lifespan starts it
+listener = NotifyListener()
@@ -0,0 +1,185 @@
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.logsink import get_sink_logger
+from app.core.metrics import registry
+from app.db.session import PoolRouter, db
+
+logger = get_sink_logger("db.slow")
+
+STATEMENT_LATENCY = registry.histogram(
+    "db_statement_duration_seconds", "Named statement execution time (server round trip)", ["query"]
+)
+STATEMENT_TIMEOUTS = registry.counter(
+    "db_statement_timeouts_total", "Named statements cancelled by statement_timeout", ["query"]
+)
+SLOW_STATEMENTS = registry.counter(
+    "db_slow_statements_total", "Named statements slower than SLOW_QUERY_THRESHOLD_MS", ["query"]
+)
+
+# SQLSTATE 57014 query_canceled (statement_timeout)
+_QUERY_CANCELED = "57014"
+
+
+def _is_statement_timeout(exc: BaseException) -> bool:
+    return getattr(exc, "sqlstate", None) == _QUERY_CANCELED
+
+
+def _preview(value: Any, limit: int = 200) -> Any:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class SlowQueryLog:
+    """Bounded ring buffer of slow statements, newest last, with optional plans."""
+
+    def __init__(self, maxlen: int) -> None:
+        self.entries: "deque[dict[str, Any]]" = deque(maxlen=maxlen)
+        self.recorded = 0
+        self.explained = 0
+        self.explain_errors = 0
+
+    def add(self, entry: dict[str, Any]) -> dict[str, Any]:
+        self.entries.append(entry)
+        self.recorded += 1
+        return entry
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return list(reversed(self.entries))
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self.entries),
+            "maxlen": self.entries.maxlen or 0,
+            "recorded": self.recorded,
+            "explained": self.explained,
+            "explain_errors": self.explain_errors,
+        }
+
+
+class QueryRunner:
+    """Named, timed statements on the shared ``db`` with a server-side timeout.
+
+    The server cancels a statement after ``timeout`` instead of the client only
+    abandoning it. Pool connections already default to DB_QUERY_TIMEOUT
+    (app/db/session.py), so the usual call is a single round trip; any other
+    timeout runs as ``BEGIN; SET LOCAL statement_timeout`` + the statement +
+    COMMIT on the task's pooled connection. Statements slower than
+    SLOW_QUERY_THRESHOLD_MS are logged to ``slow_log``; a sampled fraction of
+    them is re-run under ``EXPLAIN (ANALYZE, BUFFERS)`` in the background
+    (plain EXPLAIN for timeouts) and the plan is attached to the entry.
+
+    Only for read statements: EXPLAIN ANALYZE executes the query again.
+    """
+
+    def __init__(self, database: PoolRouter) -> None:
+        self.db = database
+        self.slow_log = SlowQueryLog(settings.SLOW_QUERY_BUFFER_SIZE)
+        self._explaining = 0
+
+    async def fetch_all(self, name: str, query: str, params: Optional[dict[str, Any]] = None,
+                        timeout: Optional[float] = None) -> list[Any]:
+        return await self._run("fetch_all", name, query, params, timeout)
+
+    async def fetch_one(self, name: str, query: str, params: Optional[dict[str, Any]] = None,
+                        timeout: Optional[float] = None) -> Any:
+        return await self._run("fetch_one", name, query, params, timeout)
+
+    async def fetch_val(self, name: str, query: str, params: Optional[dict[str, Any]] = None,
+                        timeout: Optional[float] = None) -> Any:
+        return await self._run("fetch_val", name, query, params, timeout)
+
+    async def _run(self, method: str, name: str, query: str, params: Optional[dict[str, Any]],
+                   timeout: Optional[float]) -> Any:
+        timeout = settings.DB_QUERY_TIMEOUT if timeout is None else timeout
+        ms = max(1, int(timeout * 1000))
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            # Client-side guard only for a dead connection; the server cancels first
+            return await asyncio.wait_for(self._execute(method, query, params, ms), timeout=timeout + 1.0)
+        except Exception as e:
+            timed_out = _is_statement_timeout(e) or isinstance(e, asyncio.TimeoutError)
+            if timed_out:
+                STATEMENT_TIMEOUTS.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STATEMENT_LATENCY.observe(elapsed, name)
+            if timed_out or elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+                self._record_slow(name, query, params, elapsed, timed_out)
+
+    async def _execute(self, method: str, query: str, params: Optional[dict[str, Any]], ms: int) -> Any:
+        async with self.db.connection() as conn:
+            raw = conn.raw_connection
+            if conn.statement_timeout_ms == ms:
+                return await getattr(conn, method)(query, params)
+            if raw.is_in_transaction():
+                # Caller owns the transaction; SET LOCAL would outlive this statement
+                return await getattr(conn, method)(query, params)
+            # One round trip for BEGIN + SET LOCAL (simple query protocol)
+            await raw.execute(f"BEGIN; SET LOCAL statement_timeout = {ms}")
+            try:
+                result = await getattr(conn, method)(query, params)
+            except Exception:
+                if not raw.is_closed():
+                    await raw.execute("ROLLBACK")
+                raise
+            # On cancellation the pool's reset on release aborts the transaction
+            await raw.execute("COMMIT")
+            return result
+
+    def _record_slow(self, name: str, query: str, params: Optional[dict[str, Any]], elapsed: float,
+                     timed_out: bool) -> None:
+        SLOW_STATEMENTS.inc(name)
+        entry = self.slow_log.add({
+            "name": name,
+            "at": datetime.now(timezone.utc).isoformat(),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "timed_out": timed_out,
+            "query": " ".join(query.split()),
+            "params": {k: _preview(v) for k, v in (params or {}).items()},
+            "plan": None,
+        })
+        logger.warning({"kind": "slow_query", **{k: v for k, v in entry.items() if k != "query"}})
+        if (
+            settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE > 0
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+            and self._explaining < settings.SLOW_QUERY_EXPLAIN_MAX_CONCURRENT
+        ):
+            self._explaining += 1
+            asyncio.get_running_loop().create_task(self._explain(entry, query, params, analyze=not timed_out))
+
+    async def _explain(self, entry: dict[str, Any], query: str, params: Optional[dict[str, Any]],
+                       analyze: bool) -> None:
+        # Own task, so its own pooled connection; always rolled back
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        ms = max(1, int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_SEC * 1000))
+        try:
+            async with self.db.connection() as conn:
+                raw = conn.raw_connection
+                await raw.execute(f"BEGIN; SET LOCAL statement_timeout = {ms}")
+                try:
+                    plan = await conn.fetch_val(f"EXPLAIN ({options}) {query}", params)
+                finally:
+                    if not raw.is_closed():
+                        await raw.execute("ROLLBACK")
+            entry["plan"] = plan
+            entry["plan_analyzed"] = analyze
+            self.slow_log.explained += 1
+        except Exception as e:
+            self.slow_log.explain_errors += 1
+            entry["plan_error"] = repr(e)
+        finally:
+            self._explaining -= 1
+
+
+queries = QueryRunner(db)
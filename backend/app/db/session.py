@@ -1,10 +1,723 @@
-from databases import Database
+import asyncio
+import functools
+import inspect
+import logging
+import re
+import time
+from contextlib import aclosing, asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Mapping, Optional, Sequence, TypeVar
+
+import asyncpg
+
 from app.core.config import settings
+from app.core.metrics import registry, query_started, DB_POOL_WAIT
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore
+
+logger = logging.getLogger("db")
+
+STATEMENT_EXECUTIONS = registry.counter(
+    "db_statement_executions_total",
+    "Statement executions; canonical statements by name, everything else as 'adhoc'",
+    ["statement"],
+)
+STATEMENT_PREPARE_ERRORS = registry.counter(
+    "db_statement_prepare_errors_total", "Canonical statements that failed to prepare", ["statement"]
+)
+
+# SQLAlchemy-style :name binds; "::type" casts and "\:" escapes are left alone
+_BIND_RE = re.compile(r"(?<![:\w\\]):(\w+)(?!:)")
+_compiled: dict[str, tuple[str, tuple[str, ...]]] = {}
+
+
+def compile_query(query: str) -> tuple[str, tuple[str, ...]]:
+    """``:name`` placeholders to asyncpg ``$n``; returns (sql, parameter names by position)."""
+    hit = _compiled.get(query)
+    if hit is not None:
+        return hit
+    names: list[str] = []
+
+    def _sub(match: "re.Match[str]") -> str:
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    sql = _BIND_RE.sub(_sub, query).replace("\\:", ":")
+    if len(_compiled) >= settings.DB_COMPILE_CACHE_SIZE:
+        _compiled.clear()
+    hit = _compiled[query] = (sql, tuple(names))
+    return hit
+
+
+def _bind(query: str, values: Optional[Mapping[str, Any]]) -> tuple[str, list[Any]]:
+    sql, names = compile_query(query)
+    values = values or {}
+    try:
+        return sql, [values[name] for name in names]
+    except KeyError as e:
+        raise KeyError(f"missing value for bind parameter :{e.args[0]}") from None
+
+
+def _rowcount(status: str) -> int:
+    # "UPDATE 3", "INSERT 0 1", "SELECT 5"; 0 for tags without a count
+    tail = status.rsplit(" ", 1)[-1]
+    return int(tail) if tail.isdigit() else 0
+
+
+class StatementSet:
+    """Canonical statements prepared on every pool connection.
+
+    Registered once at import time by the repos. They are put into asyncpg's
+    per-connection statement cache when the connection opens, so executions
+    with the same SQL text skip parse/plan from the first request on.
+    """
+
+    def __init__(self) -> None:
+        # compiled sql -> name
+        self._names: dict[str, str] = {}
+
+    def register(self, name: str, query: str) -> None:
+        sql, _ = compile_query(query)
+        self._names[sql] = name
+
+    def name_of(self, sql: str) -> Optional[str]:
+        return self._names.get(sql)
+
+    def items(self) -> list[tuple[str, str]]:
+        return [(name, sql) for sql, name in self._names.items()]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class Connection:
+    """A pool connection with the named-parameter API the repos use."""
+
+    __slots__ = ("raw_connection", "readonly", "statement_timeout_ms", "_statements")
+
+    def __init__(self, raw: asyncpg.Connection, statements: StatementSet, readonly: bool = False,
+                 statement_timeout_ms: Optional[int] = None) -> None:
+        self.raw_connection = raw
+        # Replica connection; never reused for a primary-pool call
+        self.readonly = readonly
+        # Session default statement_timeout of the pool (None = server default)
+        self.statement_timeout_ms = statement_timeout_ms
+        self._statements = statements
+
+    async def _run(self, method: str, query: str, values: Optional[Mapping[str, Any]]) -> Any:
+        # Canonical statements hit the statement cache warmed in init; asyncpg
+        # re-prepares a cached statement itself if the schema changed under it
+        sql, args = _bind(query, values)
+        STATEMENT_EXECUTIONS.inc(self._statements.name_of(sql) or "adhoc")
+        return await getattr(self.raw_connection, method)(sql, *args)
+
+    async def fetch_all(self, query: str, values: Optional[Mapping[str, Any]] = None) -> list[asyncpg.Record]:
+        return await self._run("fetch", query, values)
+
+    async def fetch_one(self, query: str, values: Optional[Mapping[str, Any]] = None) -> Optional[asyncpg.Record]:
+        return await self._run("fetchrow", query, values)
 
+    async def fetch_val(self, query: str, values: Optional[Mapping[str, Any]] = None, column: int = 0) -> Any:
+        row = await self._run("fetchrow", query, values)
+        return None if row is None else row[column]
 
-# Configure connection pool; timeout is handled per-query
-db = Database(
-    settings.DATABASE_URL,
-    min_size=settings.DB_POOL_MIN,
-    max_size=settings.DB_POOL_MAX,
+    async def execute(self, query: str, values: Optional[Mapping[str, Any]] = None) -> int:
+        """Run a statement; returns the affected row count from the command tag."""
+        sql, args = _bind(query, values)
+        STATEMENT_EXECUTIONS.inc(self._statements.name_of(sql) or "adhoc")
+        return _rowcount(await self.raw_connection.execute(sql, *args))
+
+    async def execute_many(self, query: str, values: Sequence[Mapping[str, Any]]) -> None:
+        sql, names = compile_query(query)
+        STATEMENT_EXECUTIONS.inc(self._statements.name_of(sql) or "adhoc", amount=len(values))
+        await self.raw_connection.executemany(sql, [[v[name] for name in names] for v in values])
+
+    async def iterate(
+        self, query: str, values: Optional[Mapping[str, Any]] = None, prefetch: int = 100
+    ) -> AsyncIterator[asyncpg.Record]:
+        # Server-side cursor; asyncpg needs one inside a transaction
+        sql, args = _bind(query, values)
+        STATEMENT_EXECUTIONS.inc(self._statements.name_of(sql) or "adhoc")
+        async with self.raw_connection.transaction():
+            if self.statement_timeout_ms:
+                # The pool default is meant for single reads; a stream lasts as
+                # long as the client keeps reading
+                await self.raw_connection.execute("SET LOCAL statement_timeout = 0")
+            async for row in self.raw_connection.cursor(sql, *args, prefetch=prefetch):
+                yield row
+
+    def transaction(self, **kwargs: Any) -> Any:
+        # Savepoint when already inside a transaction
+        return self.raw_connection.transaction(**kwargs)
+
+
+# (owning task, connection) held by the innermost connection() block of any pool
+_current: ContextVar[Optional[tuple[Any, Connection]]] = ContextVar("db_connection", default=None)
+
+# Pool a repo function declares with @uses_pool; background jobs override it
+READ = "read"
+WRITE = "write"
+_role: ContextVar[str] = ContextVar("db_pool_role", default=WRITE)
+_background: ContextVar[bool] = ContextVar("db_background", default=False)
+# (name, version) pairs of api_data_versions the current request answers for
+_min_versions: ContextVar[tuple[tuple[str, int], ...]] = ContextVar("db_min_versions", default=())
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_POOL_GAUGE = registry.gauge("db_pool_connections", "Pool connections by state", ["pool", "state"])
+_POOL_TIMEOUTS = registry.counter(
+    "db_pool_acquire_timeouts_total", "Acquires that gave up after the pool's timeout", ["pool"]
 )
+_REPLICA_LAG = registry.gauge("db_replica_lag_seconds", "Replay lag measured by the replica monitor", ["pool"])
+_REPLICA_UP = registry.gauge("db_replica_up", "1 if the replica answered the last lag check", ["pool"])
+_READ_FALLBACKS = registry.counter(
+    "db_read_fallbacks_total", "Reads sent to the primary instead of a replica", ["reason"]
+)
+
+
+class Database:
+    """One asyncpg pool with a task-local connection and canonical prepared statements.
+
+    Inside ``async with db.connection()`` (or ``db.transaction()``) every
+    ``db.*`` call from the same task uses that connection, so session advisory
+    locks and transactions cover the nested repo calls. Tasks spawned from
+    inside the block get their own connection.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: Optional[str],
+        min_size: int = 1,
+        max_size: int = 10,
+        acquire_timeout: Optional[float] = None,
+        readonly: bool = False,
+        init: Any = None,
+        statements: Optional[StatementSet] = None,
+        statement_cache_size: int = 100,
+        prepare_on_connect: bool = True,
+        server_settings: Optional[dict[str, str]] = None,
+        statement_timeout: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.readonly = readonly
+        self._init = init
+        self.statement_cache_size = statement_cache_size
+        self.prepare_on_connect = prepare_on_connect
+        # Sent as a startup parameter, so RESET ALL on release keeps it
+        self.statement_timeout_ms = max(1, int(statement_timeout * 1000)) if statement_timeout else None
+        self.server_settings = dict(server_settings or {})
+        if self.statement_timeout_ms is not None:
+            self.server_settings["statement_timeout"] = str(self.statement_timeout_ms)
+        self.statements = statements if statements is not None else StatementSet()
+        self.pool: Optional[asyncpg.Pool] = None
+        # Seconds behind the primary (replicas only; None = unreachable)
+        self.lag: Optional[float] = 0.0
+        # api_data_versions as last seen on this replica
+        self.versions: dict[str, int] = {}
+
+    @property
+    def is_connected(self) -> bool:
+        return self.pool is not None
+
+    def prepare(self, name: str, query: str) -> None:
+        """Add ``query`` to the canonical set prepared on every connection."""
+        self.statements.register(name, query)
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        if self._init is not None:
+            await self._init(conn)
+        if not self.prepare_on_connect or self.statement_cache_size <= 0:
+            return
+        # The lookup fetch()/fetchrow() do, so the statement lands in the
+        # connection's cache. asyncpg has no public way to do that:
+        # Connection.prepare() bypasses the cache and its PreparedStatement is
+        # invalidated when the connection goes back to the pool. Without it
+        # (another asyncpg) statements are simply prepared on first use.
+        warm = getattr(conn, "_get_statement", None)
+        if warm is None:
+            return
+        for name, sql in self.statements.items():
+            try:
+                await warm(sql, None)
+            except asyncpg.PostgresError as e:
+                # Left to be prepared on first use; the query itself will
+                # surface the error if it is real
+                STATEMENT_PREPARE_ERRORS.inc(name)
+                logger.warning("prepare of %s failed on %s: %s", name, self.name, e)
+
+    async def _setup_connection(self, conn: Any) -> None:
+        # Runs on every pool acquire; the wait is measured from the start of the
+        # @timed_query repo call that triggered it
+        started = query_started.get()
+        if started is not None:
+            DB_POOL_WAIT.observe(time.perf_counter() - started, self.name)
+
+    async def connect(self) -> None:
+        if self.pool is not None:
+            return
+        self.pool = await asyncpg.create_pool(
+            asyncpg_dsn(self.url),
+            min_size=self.min_size,
+            max_size=self.max_size,
+            init=self._init_connection,
+            setup=self._setup_connection,
+            statement_cache_size=self.statement_cache_size,
+            server_settings=self.server_settings or None,
+        )
+
+    async def disconnect(self) -> None:
+        pool, self.pool = self.pool, None
+        if pool is not None:
+            await pool.close()
+
+    async def _acquire(self) -> Any:
+        if self.pool is None:
+            raise RuntimeError(f"database pool {self.name} is not connected")
+        try:
+            return await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            _POOL_TIMEOUTS.inc(self.name)
+            raise
+
+    def _held(self) -> Optional[Connection]:
+        # A replica connection only serves other replica reads
+        current = _current.get()
+        if current is None or current[0] is not asyncio.current_task():
+            return None
+        if current[1].readonly and not self.readonly:
+            return None
+        return current[1]
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        held = self._held()
+        if held is not None:
+            yield held
+            return
+        raw = await self._acquire()
+        conn = Connection(raw, self.statements, self.readonly, self.statement_timeout_ms)
+        token = _current.set((asyncio.current_task(), conn))
+        try:
+            yield conn
+        finally:
+            _current.reset(token)
+            await self.pool.release(raw)
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs: Any) -> AsyncIterator[Connection]:
+        async with self.connection() as conn:
+            async with conn.transaction(**kwargs):
+                yield conn
+
+    async def fetch_all(self, query: str, values: Optional[Mapping[str, Any]] = None) -> list[asyncpg.Record]:
+        async with self.connection() as conn:
+            return await conn.fetch_all(query, values)
+
+    async def fetch_one(self, query: str, values: Optional[Mapping[str, Any]] = None) -> Optional[asyncpg.Record]:
+        async with self.connection() as conn:
+            return await conn.fetch_one(query, values)
+
+    async def fetch_val(self, query: str, values: Optional[Mapping[str, Any]] = None, column: int = 0) -> Any:
+        async with self.connection() as conn:
+            return await conn.fetch_val(query, values, column=column)
+
+    async def execute(self, query: str, values: Optional[Mapping[str, Any]] = None) -> int:
+        async with self.connection() as conn:
+            return await conn.execute(query, values)
+
+    async def execute_many(self, query: str, values: Sequence[Mapping[str, Any]]) -> None:
+        async with self.connection() as conn:
+            await conn.execute_many(query, values)
+
+    async def iterate(
+        self, query: str, values: Optional[Mapping[str, Any]] = None, prefetch: int = 100
+    ) -> AsyncIterator[asyncpg.Record]:
+        # Not published as the task connection: the generator may be closed
+        # from another context (e.g. a disconnected streaming response)
+        held = self._held()
+        if held is not None:
+            async with aclosing(held.iterate(query, values, prefetch)) as rows:
+                async for row in rows:
+                    yield row
+            return
+        raw = await self._acquire()
+        conn = Connection(raw, self.statements, self.readonly, self.statement_timeout_ms)
+        try:
+            # Closed before the release, so the cursor's transaction ends first
+            async with aclosing(conn.iterate(query, values, prefetch)) as rows:
+                async for row in rows:
+                    yield row
+        finally:
+            await self.pool.release(raw)
+
+    def stats(self) -> Optional[dict[str, int]]:
+        # None before connect
+        if self.pool is None:
+            return None
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {"size": size, "idle": idle, "in_use": size - idle, "max": self.pool.get_max_size()}
+
+
+# Replay lag; 0 on the primary and on a caught-up replica (an idle primary would
+# otherwise make pg_last_xact_replay_timestamp() look ever older)
+_LAG_SQL = """
+SELECT CASE
+         WHEN NOT pg_is_in_recovery() THEN 0
+         WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+         ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+       END
+"""
+
+_VERSIONS_SQL = "SELECT name, version FROM api_data_versions"
+
+
+def require_version(name: str, version: int) -> None:
+    """Declared reads of the current task need ``version`` of ``name`` or later.
+
+    Called when a request has put that version in its ETag: a replica that has
+    not replayed it yet would return (and let the caches keep) older rows, so
+    such reads go to the primary.
+    """
+    current = _min_versions.get()
+    _min_versions.set(tuple(v for v in current if v[0] != name) + ((name, version),))
+
+
+class PoolRouter:
+    """Named pools behind the single ``db`` object the repos use.
+
+    * ``primary`` takes writes and anything undeclared;
+    * ``replicas`` serve functions declared ``@uses_pool(READ)`` while their
+      lag is within DB_REPLICA_MAX_LAG_SEC and it has replayed the data
+      versions the request requires (``require_version``), round robin, else
+      the primary;
+    * ``background`` (on the primary) serves everything run under
+      ``@background_job`` so the dispatcher and pipeline jobs cannot take
+      connections from API requests.
+
+    A connection already held by the task (a transaction or an advisory lock
+    block) is reused whatever the declared pool, so nested calls stay on it.
+    """
+
+    def __init__(self, primary: Database, replicas: Sequence[Database] = (),
+                 background: Optional[Database] = None) -> None:
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.background = background
+        self.statements = primary.statements
+        self._next = 0
+        self._monitor: Optional[asyncio.Task] = None
+
+    @property
+    def pools(self) -> list[Database]:
+        extra = [self.background] if self.background is not None else []
+        return [self.primary, *self.replicas, *extra]
+
+    @property
+    def is_connected(self) -> bool:
+        return self.primary.is_connected
+
+    def prepare(self, name: str, query: str) -> None:
+        """Add ``query`` to the canonical set prepared on every connection of every pool."""
+        self.statements.register(name, query)
+
+    async def connect(self) -> None:
+        await self.primary.connect()
+        if self.background is not None:
+            await self.background.connect()
+        if self.replicas:
+            await self._check_replicas()
+            self._monitor = asyncio.create_task(self._monitor_replicas())
+
+    async def disconnect(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+        for database in reversed(self.pools):
+            await database.disconnect()
+
+    async def _check_replicas(self) -> None:
+        for replica in self.replicas:
+            try:
+                if replica.pool is None:
+                    await replica.connect()
+                raw = await replica._acquire()
+                try:
+                    replica.lag = float(await raw.fetchval(_LAG_SQL))
+                    await self._load_versions(replica, raw)
+                finally:
+                    await replica.pool.release(raw)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                if replica.lag is not None:
+                    logger.warning("replica %s unavailable: %r", replica.name, e)
+                replica.lag = None
+            _REPLICA_UP.set(0 if replica.lag is None else 1, replica.name)
+            if replica.lag is not None:
+                _REPLICA_LAG.set(replica.lag, replica.name)
+
+    async def _monitor_replicas(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_SEC)
+            await self._check_replicas()
+
+    @staticmethod
+    async def _load_versions(replica: Database, raw: Any) -> None:
+        try:
+            rows = await raw.fetch(_VERSIONS_SQL)
+        except asyncpg.exceptions.UndefinedTableError:
+            # sql/notify.sql not applied: no versions are ever required either
+            rows = []
+        replica.versions = {r["name"]: int(r["version"]) for r in rows}
+
+    @staticmethod
+    def _has_versions(replica: Database, required: Sequence[tuple[str, int]]) -> bool:
+        return all(replica.versions.get(name, 0) >= version for name, version in required)
+
+    async def _caught_up(self, replica: Database) -> bool:
+        # Versions only grow, so a replica seen at or past them needs no query
+        required = _min_versions.get()
+        if self._has_versions(replica, required):
+            return True
+        try:
+            raw = await replica._acquire()
+            try:
+                await self._load_versions(replica, raw)
+            finally:
+                await replica.pool.release(raw)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            return False
+        return self._has_versions(replica, required)
+
+    def _replica(self) -> Optional[Database]:
+        usable = [
+            r for r in self.replicas
+            if r.pool is not None and r.lag is not None and r.lag <= settings.DB_REPLICA_MAX_LAG_SEC
+        ]
+        if not usable:
+            reachable = any(r.lag is not None for r in self.replicas)
+            _READ_FALLBACKS.inc("lag" if reachable else "unavailable")
+            return None
+        self._next = (self._next + 1) % len(usable)
+        return usable[self._next]
+
+    def target(self) -> Database:
+        """Pool for the current call: background job, declared read, or primary."""
+        if _background.get():
+            return self.background or self.primary
+        if _role.get() == READ and self.replicas:
+            return self._replica() or self.primary
+        return self.primary
+
+    async def _pick(self) -> Database:
+        database = self.target()
+        if not database.readonly or not _min_versions.get():
+            return database
+        held = _current.get()
+        if held is not None and held[0] is asyncio.current_task():
+            # Runs on the connection the task holds anyway
+            return database
+        if await self._caught_up(database):
+            return database
+        _READ_FALLBACKS.inc("behind")
+        return self.primary
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        async with (await self._pick()).connection() as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs: Any) -> AsyncIterator[Connection]:
+        async with (await self._pick()).transaction(**kwargs) as conn:
+            yield conn
+
+    async def fetch_all(self, query: str, values: Optional[Mapping[str, Any]] = None) -> list[asyncpg.Record]:
+        return await (await self._pick()).fetch_all(query, values)
+
+    async def fetch_one(self, query: str, values: Optional[Mapping[str, Any]] = None) -> Optional[asyncpg.Record]:
+        return await (await self._pick()).fetch_one(query, values)
+
+    async def fetch_val(self, query: str, values: Optional[Mapping[str, Any]] = None, column: int = 0) -> Any:
+        return await (await self._pick()).fetch_val(query, values, column=column)
+
+    async def execute(self, query: str, values: Optional[Mapping[str, Any]] = None) -> int:
+        return await self.target().execute(query, values)
+
+    async def execute_many(self, query: str, values: Sequence[Mapping[str, Any]]) -> None:
+        await self.target().execute_many(query, values)
+
+    async def iterate(
+        self, query: str, values: Optional[Mapping[str, Any]] = None, prefetch: int = 100
+    ) -> AsyncIterator[asyncpg.Record]:
+        # aclosing: closing this generator must release the pool's cursor at once
+        async with aclosing((await self._pick()).iterate(query, values, prefetch)) as rows:
+            async for row in rows:
+                yield row
+
+
+def uses_pool(role: str) -> Callable[[F], F]:
+    """Declare the pool a repo function needs (READ may be served by a replica).
+
+    Undeclared functions use the primary. Works for coroutine functions and
+    async generators.
+    """
+
+    def decorate(fn: F) -> F:
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def gen_wrapper(*args: Any, **kwargs: Any) -> Any:
+                agen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        # Set only while the generator runs, not between items
+                        token = _role.set(role)
+                        try:
+                            item = await agen.__anext__()
+                        except StopAsyncIteration:
+                            return
+                        finally:
+                            _role.reset(token)
+                        yield item
+                finally:
+                    await agen.aclose()
+
+            return gen_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = _role.set(role)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _role.reset(token)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def background_job(fn: F) -> F:
+    """Run a job (and every repo call under it) on the background pool."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = _background.set(True)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _background.reset(token)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def _jsonb_encode(value: Any) -> str:
+    # Strings are assumed to be serialized JSON already (previous behaviour)
+    if isinstance(value, str):
+        return value
+    return orjson.dumps(value).decode("utf-8")
+
+
+async def _init_connection(conn: Any) -> None:
+    # Decode json/jsonb straight into Python objects with orjson instead of
+    # returning text for a later json.loads in the repos
+    if orjson is None:
+        return
+    for typename in ("jsonb", "json"):
+        await conn.set_type_codec(
+            typename,
+            encoder=_jsonb_encode,
+            decoder=orjson.loads,
+            schema="pg_catalog",
+        )
+
+
+def _pool(name: str, url: Optional[str], min_size: int, max_size: int, timeout: float,
+          statements: StatementSet, readonly: bool = False,
+          statement_timeout: Optional[float] = None) -> Database:
+    return Database(
+        name,
+        url,
+        min_size=min(min_size, max_size),
+        max_size=max_size,
+        acquire_timeout=timeout,
+        readonly=readonly,
+        init=_init_connection,
+        statements=statements,
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        prepare_on_connect=settings.DB_PREPARE_ON_CONNECT,
+        server_settings={"plan_cache_mode": settings.DB_PLAN_CACHE_MODE} if settings.DB_PLAN_CACHE_MODE else None,
+        statement_timeout=statement_timeout,
+    )
+
+
+def _build_router() -> PoolRouter:
+    statements = StatementSet()
+    # API pools default to DB_QUERY_TIMEOUT; background jobs (REFRESH, rebuilds)
+    # must not inherit it, so the primary only gets it when they have their own pool
+    has_background = settings.DB_BACKGROUND_POOL_MAX > 0
+    primary = _pool(
+        "primary", settings.DATABASE_URL, settings.DB_POOL_MIN, settings.DB_POOL_MAX,
+        settings.DB_POOL_TIMEOUT, statements,
+        statement_timeout=settings.DB_QUERY_TIMEOUT if has_background else None,
+    )
+    replica_urls = [u.strip() for u in (settings.DATABASE_REPLICA_URLS or "").split(",") if u.strip()]
+    replicas = [
+        _pool(
+            f"replica{i}", url, settings.DB_READ_POOL_MIN, settings.DB_READ_POOL_MAX,
+            settings.DB_READ_POOL_TIMEOUT, statements, readonly=True,
+            statement_timeout=settings.DB_QUERY_TIMEOUT,
+        )
+        for i, url in enumerate(replica_urls)
+    ]
+    background = None
+    if has_background:
+        background = _pool(
+            "background", settings.DATABASE_URL, settings.DB_BACKGROUND_POOL_MIN,
+            settings.DB_BACKGROUND_POOL_MAX, settings.DB_BACKGROUND_POOL_TIMEOUT, statements,
+        )
+    return PoolRouter(primary, replicas, background)
+
+
+# Statement timeouts are handled per query (app/db/query.py)
+db = _build_router()
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    # Connected pools by name
+    out = {}
+    for database in db.pools:
+        stats = database.stats()
+        if stats is not None:
+            out[database.name] = stats
+    return out
+
+
+def _collect_pool() -> None:
+    for name, stats in pool_stats().items():
+        for state, value in stats.items():
+            _POOL_GAUGE.set(value, name, state)
+
+
+registry.add_collector(_collect_pool)
+
+
+def asyncpg_dsn(url: str | None = None) -> str:
+    # DATABASE_URL uses the SQLAlchemy scheme; raw asyncpg wants plain postgresql://
+    url = url or settings.DATABASE_URL or ""
+    scheme, sep, rest = url.partition("://")
+    return f"{scheme.split('+', 1)[0]}{sep}{rest}"
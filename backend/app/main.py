@@ -4,22 +4,42 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
+from app.core.logsink import log_sink
 from app.db.session import db
+from app.db.notify import listener
 from app.services.polling_service import start_polling_task, stop_polling_task
+from app.services.snapshot_service import start_snapshot_task, stop_snapshot_task
+from app.services.rule_engine import start_rule_engine_task, stop_rule_engine_task
+from app.services.aggregate_service import start_aggregates_task, stop_aggregates_task
+from app.services.push_service import shutdown_push_executor, close_push_transport
 
-from app.api import deals, reports, users, alerts, push, health
+from app.api import deals, reports, users, alerts, push, health, metrics, admin
 from app.middleware.debug import DebugLoggingMiddleware
+from app.middleware.compression import CompressionMiddleware, CompressedCache
+from app.middleware.metrics import MetricsMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await db.connect()
-    poll_task = asyncio.create_task(start_polling_task())
+    await listener.start()
+    poll_task = await start_polling_task()
+    snapshot_task = start_snapshot_task()
+    rule_task = start_rule_engine_task()
+    aggregates_task = start_aggregates_task()
     try:
         yield
     finally:
+        await stop_aggregates_task(aggregates_task)
+        await stop_rule_engine_task(rule_task)
+        await stop_snapshot_task(snapshot_task)
         await stop_polling_task(poll_task)
+        await close_push_transport()
+        shutdown_push_executor()
+        await listener.stop()
         await db.disconnect()
+        # Flush queued log lines (joins the sink thread)
+        await asyncio.to_thread(log_sink.stop)
 
 
 app = FastAPI(lifespan=lifespan, title="Service API", version="v1")
@@ -39,6 +59,9 @@ app.include_router(users.router, tags=["users"])
 app.include_router(alerts.router, tags=["alerts"])
 app.include_router(push.router, tags=["push"])
 app.include_router(health.router, tags=["health"])
+app.include_router(admin.router, tags=["admin"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["metrics"])
 
 # HTTP debug logging middleware (controlled via env/header)
 app.add_middleware(
@@ -47,4 +70,21 @@ app.add_middleware(
     style=settings.DEBUG_HTTP_STYLE,
     include_headers=settings.DEBUG_HTTP_HEADERS,
     max_body_preview=settings.DEBUG_HTTP_MAX_PREVIEW,
+    sample_rate=settings.DEBUG_HTTP_SAMPLE_RATE,
 )
+
+# Outside the debug logger, so it still previews uncompressed bodies
+if settings.COMPRESSION_ENABLED:
+    app.state.compressed_cache = CompressedCache(settings.COMPRESSION_CACHE_MAX_BYTES)
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_BYTES,
+        cache=app.state.compressed_cache,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+    )
+
+if settings.METRICS_ENABLED:
+    # Outermost: latency covers compression and logging too
+    app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,327 @@
+import asyncio
+import gzip
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.conditional import ETAG_ENCODING_SUFFIXES
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    brotli = None  # type: ignore
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    zstandard = None  # type: ignore
+
+
+# Server preference when the client accepts several codings with equal q
+_PREFERENCE = ("zstd", "br", "gzip")
+_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript")
+
+
+def available_encodings() -> tuple[str, ...]:
+    return tuple(
+        e for e in _PREFERENCE
+        if e == "gzip" or (e == "br" and brotli is not None) or (e == "zstd" and zstandard is not None)
+    )
+
+
+def negotiate(accept_encoding: str, available: tuple[str, ...]) -> Optional[str]:
+    """Pick a content coding from an Accept-Encoding header (q-values honoured)."""
+    if not accept_encoding:
+        return None
+    q: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name] = weight
+    star = q.get("*")
+    best: Optional[str] = None
+    best_q = 0.0
+    for enc in available:
+        weight = q.get(enc, star if star is not None else 0.0)
+        if weight > best_q:
+            best, best_q = enc, weight
+    return best
+
+
+class CompressedCache:
+    """Byte-bounded LRU of compressed bodies keyed by (ETag, coding).
+
+    An ETag names one representation at one data version, so each body is
+    compressed once per version; concurrent misses for the same key share a
+    single compression.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: "OrderedDict[tuple[str, str], bytes]" = OrderedDict()
+        self._inflight: dict[tuple[str, str], "asyncio.Future[bytes]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get_or_compress(self, key: tuple[str, str], compress: Callable[[], Any]) -> bytes:
+        body = self._data.get(key)
+        if body is not None:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return body
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            # Own task, awaited through shield by everyone: a cancelled first
+            # caller must not cancel the compression the others are waiting on
+            pending = self._inflight[key] = asyncio.ensure_future(compress())
+            pending.add_done_callback(lambda task, key=key: self._done(key, task))
+        return await asyncio.shield(pending)
+
+    def _done(self, key: tuple[str, str], task: "asyncio.Future[bytes]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # exception() also marks it retrieved when nobody is left waiting
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result())
+
+    def _store(self, key: tuple[str, str], body: bytes) -> None:
+        # Skip bodies that would push out most of the cache on their own
+        if self.max_bytes <= 0 or len(body) > self.max_bytes // 4:
+            return
+        self._data[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes and self._data:
+            _, old = self._data.popitem(last=False)
+            self.size -= len(old)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class _StreamCompressor:
+    # Incremental encoder for streamed bodies (exports); each chunk is flushed
+    # so the client sees rows as they arrive
+    def __init__(self, encoding: str, levels: dict[str, int]) -> None:
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj: Any = zlib.compressobj(levels["gzip"], zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=levels["br"])
+        else:
+            self._obj = zstandard.ZstdCompressor(level=levels["zstd"]).compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def _compress(encoding: str, body: bytes, levels: dict[str, int]) -> bytes:
+    if encoding == "gzip":
+        # mtime=0 keeps the output byte-identical for identical input
+        return gzip.compress(body, compresslevel=levels["gzip"], mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=levels["br"])
+    return zstandard.ZstdCompressor(level=levels["zstd"]).compress(body)
+
+
+def _suffixed_etag(etag: str, encoding: str) -> str:
+    # Strong validators must differ per content coding
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return f"{etag}-{encoding}"
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/br/zstd response compression with a side cache.
+
+    Pure ASGI. Responses that carry an ETag and are not private/no-store are
+    compressed once per (ETag, coding) and served from ``cache`` afterwards;
+    other bodies are compressed per request, and streamed bodies chunk by
+    chunk. Compressed variants get ``-<coding>`` appended to their ETag and
+    every compressible response gets ``Vary: Accept-Encoding``. br and zstd are
+    offered only when ``brotli`` / ``zstandard`` are installed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        cache: Optional[CompressedCache] = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        zstd_level: int = 3,
+        offload_bytes: int = 256 * 1024,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache if cache is not None else CompressedCache()
+        self.levels = {"gzip": gzip_level, "br": brotli_quality, "zstd": zstd_level}
+        # Bodies above this size are compressed in a worker thread
+        self.offload_bytes = offload_bytes
+        self.available = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = negotiate(headers.get("accept-encoding", ""), self.available)
+        responder = _Responder(self, send, encoding, headers.get("if-none-match", ""))
+        await self.app(scope, receive, responder.send)
+
+    async def compress(self, encoding: str, body: bytes) -> bytes:
+        if len(body) >= self.offload_bytes:
+            return await asyncio.to_thread(_compress, encoding, body, self.levels)
+        return _compress(encoding, body, self.levels)
+
+
+class _Responder:
+    __slots__ = ("mw", "send_next", "encoding", "if_none_match", "start", "stream", "passthrough")
+
+    def __init__(self, mw: CompressionMiddleware, send: Send, encoding: Optional[str], if_none_match: str) -> None:
+        self.mw = mw
+        self.send_next = send
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.start: Optional[Message] = None
+        self.stream: Optional[_StreamCompressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            self._on_start(message)
+            if self.start is None:
+                await self.send_next(message)
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send_next(message)
+            return
+        if self.stream is not None:
+            await self._send_stream_chunk(message)
+            return
+        await self._on_first_body(message)
+
+    def _on_start(self, message: Message) -> None:
+        headers = MutableHeaders(scope=message)
+        status = message["status"]
+        if status == 304:
+            self._fix_not_modified(headers)
+            self.passthrough = True
+            return
+        content_type = headers.get("content-type", "")
+        compressible = any(content_type.startswith(t) for t in _COMPRESSIBLE_TYPES)
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        if (
+            not compressible
+            or self.encoding is None
+            or status != 200
+            or "content-encoding" in headers
+            or "no-transform" in headers.get("cache-control", "")
+        ):
+            self.passthrough = True
+            return
+        # Hold the start message until the first body chunk decides the framing
+        self.start = message
+
+    def _fix_not_modified(self, headers: MutableHeaders) -> None:
+        # Echo the coding-specific tag the client revalidated with, if any
+        etag = headers.get("etag")
+        if not etag or not self.if_none_match:
+            return
+        client_tags = {t.strip() for t in self.if_none_match.split(",")}
+        for suffix in ETAG_ENCODING_SUFFIXES:
+            candidate = _suffixed_etag(etag, suffix[1:])
+            if candidate in client_tags:
+                headers["ETag"] = candidate
+                return
+
+    async def _on_first_body(self, message: Message) -> None:
+        start = self.start
+        assert start is not None and self.encoding is not None
+        self.start = None
+        body: bytes = message.get("body", b"")
+        headers = MutableHeaders(scope=start)
+
+        if message.get("more_body", False):
+            # Streaming response: compress incrementally, length unknown
+            self.stream = _StreamCompressor(self.encoding, self.mw.levels)
+            self._mark_encoded(headers)
+            del headers["content-length"]
+            await self.send_next(start)
+            await self._send_stream_chunk(message)
+            return
+
+        if len(body) < self.mw.minimum_size:
+            self.passthrough = True
+            await self.send_next(start)
+            await self.send_next(message)
+            return
+
+        etag = headers.get("etag")
+        cache_control = headers.get("cache-control", "")
+        encoding = self.encoding
+        if etag and not etag.startswith("W/") and "no-store" not in cache_control and "private" not in cache_control:
+            compressed = await self.mw.cache.get_or_compress(
+                (etag, encoding), lambda: self.mw.compress(encoding, body)
+            )
+        else:
+            compressed = await self.mw.compress(encoding, body)
+        self._mark_encoded(headers)
+        headers["content-length"] = str(len(compressed))
+        self.passthrough = True
+        await self.send_next(start)
+        await self.send_next({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    def _mark_encoded(self, headers: MutableHeaders) -> None:
+        assert self.encoding is not None
+        headers["content-encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag:
+            headers["etag"] = _suffixed_etag(etag, self.encoding)
+
+    async def _send_stream_chunk(self, message: Message) -> None:
+        assert self.stream is not None
+        data = self.stream.chunk(message.get("body", b""))
+        more = message.get("more_body", False)
+        if not more:
+            data += self.stream.finish()
+        if data or not more:
+            await self.send_next({"type": "http.response.body", "body": data, "more_body": more})
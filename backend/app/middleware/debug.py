@@ -1,170 +1,218 @@
-import json
+import random
 import time
 import uuid
-import logging
 from typing import Any, Dict
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.core.logsink import get_sink_logger
 
-logger = logging.getLogger("http.debug")
-# Ensure our debug logger actually emits to console even under Uvicorn's
-# default logging config (which doesn't attach handlers to arbitrary loggers).
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter("%(message)s"))
-    logger.addHandler(handler)
-    # Avoid double-logging via root when a handler is attached
-    logger.propagate = False
-if not logger.level:
-    logger.setLevel(logging.INFO)
 
+# Records are queued and written by the log sink thread, so logging never
+# blocks the event loop (uvicorn's config doesn't attach handlers here anyway).
+logger = get_sink_logger("http.debug")
 
-def _preview_bytes(b: bytes, limit: int = 2048) -> str:
+
+_LOGGED_REQUEST_HEADERS = {"content-type", "content-length", "authorization", "x-debug", "x-debug-id", "x-request-id"}
+
+
+def _preview_bytes(b: bytes, limit: int = 2048, truncated: bool = False) -> str:
     try:
         s = b.decode("utf-8", errors="replace")
     except Exception:
         s = str(b)
     if len(s) > limit:
         return s[:limit] + "…"  # ellipsis
+    if truncated:
+        return s + "…"
     return s
 
 
-class DebugLoggingMiddleware(BaseHTTPMiddleware):
+class _Tee:
+    # Keeps at most ``limit`` bytes of a body that is streamed through untouched
+    __slots__ = ("limit", "buf", "truncated")
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.buf = bytearray()
+        self.truncated = False
+
+    def feed(self, chunk: bytes) -> None:
+        room = self.limit - len(self.buf)
+        if room > 0:
+            self.buf += chunk[:room]
+        if len(chunk) > room:
+            self.truncated = self.truncated or bool(chunk)
+
+    def preview(self) -> str:
+        return _preview_bytes(bytes(self.buf), self.limit, self.truncated)
+
+
+class DebugLoggingMiddleware:
     """Logs request and response summaries for debugging.
 
     Enabled when:
       - app setting DEBUG_HTTP_LOGS is True, or
       - request has header 'X-Debug: 1', or
-      - request has header 'X-Debug-Id'.
+      - request has header 'X-Debug-Id', or
+      - the request is picked by ``sample_rate`` (0.0-1.0).
+
+    Pure ASGI: bodies stream through unchanged. Only debugged requests tee the
+    first ``max_body_preview`` bytes of each body; every response gets
+    ``X-Request-ID`` added to its start message.
     """
 
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         debug: bool = False,
         style: str = "json",
         include_headers: bool = True,
         max_body_preview: int = 4096,
+        sample_rate: float = 0.0,
     ) -> None:
-        super().__init__(app)
+        self.app = app
         self.debug = debug
         self.style = style.lower() if isinstance(style, str) else "json"
         self.include_headers = include_headers
         self.max_body_preview = max_body_preview
+        self.sample_rate = sample_rate
 
-    async def dispatch(self, request: Request, call_next):
-        started = time.perf_counter()
-        req_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        dbg_id = request.headers.get("X-Debug-Id") or ""
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        req_id = headers.get("x-request-id") or str(uuid.uuid4())
+        dbg_id = headers.get("x-debug-id") or ""
         should_debug = (
             self.debug
-            or request.headers.get("X-Debug") == "1"
+            or headers.get("x-debug") == "1"
             or bool(dbg_id)
+            or (self.sample_rate > 0 and random.random() < self.sample_rate)
         )
 
-        # Read and cache request body to allow downstream handlers to read
-        try:
-            raw_body = await request.body()
-            # Starlette caches Request._body for subsequent reads
-            setattr(request, "_body", raw_body)
-        except Exception:
-            raw_body = b""
-
-        if should_debug:
-            try:
-                if self.style == "pretty":
-                    hdrs = {}
-                    if self.include_headers:
-                        allowed = {"content-type", "content-length", "authorization", "x-debug", "x-debug-id", "x-request-id"}
-                        hdrs = {k.lower(): v for k, v in request.headers.items() if k.lower() in allowed}
-                    q = ("?" + request.url.query) if request.url.query else ""
-                    preview = _preview_bytes(raw_body, self.max_body_preview)
-                    msg = (
-                        f"REQ req_id={req_id} dbg_id={dbg_id or '-'} "
-                        f"{request.method} {request.url.path}{q} "
-                        f"client={getattr(request.client, 'host', None)} "
-                        f"headers={hdrs} body={preview!r}"
-                    ) if self.include_headers else (
-                        f"REQ req_id={req_id} dbg_id={dbg_id or '-'} "
-                        f"{request.method} {request.url.path}{q} "
-                        f"client={getattr(request.client, 'host', None)} "
-                        f"body={preview!r}"
-                    )
-                    logger.info(msg)
-                else:
-                    info: Dict[str, Any] = {
-                        "kind": "request",
-                        "req_id": req_id,
-                        "dbg_id": dbg_id,
-                        "method": request.method,
-                        "path": request.url.path,
-                        "query": request.url.query,
-                        "client": getattr(request.client, "host", None),
-                        "body_preview": _preview_bytes(raw_body, self.max_body_preview),
-                    }
-                    if self.include_headers:
-                        info["headers"] = {k: v for k, v in request.headers.items() if k.lower() in {"content-type", "content-length", "authorization", "x-debug", "x-debug-id", "x-request-id"}}
-                    logger.info(json.dumps(info, ensure_ascii=False))
-            except Exception:
-                # best-effort only
-                pass
+        if not should_debug:
+            async def send_with_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    # Always include request id for correlation
+                    MutableHeaders(scope=message).setdefault("X-Request-ID", req_id)
+                await send(message)
 
-        response = await call_next(request)
+            await self.app(scope, receive, send_with_id)
+            return
 
-        # Collect response body by iterating the body iterator, then re-create Response
+        started = time.perf_counter()
+        req_tee = _Tee(self.max_body_preview)
+        res_tee = _Tee(self.max_body_preview)
+        state: Dict[str, Any] = {"request_logged": False, "status": None, "headers": {}}
+
+        def log_request() -> None:
+            if state["request_logged"]:
+                return
+            state["request_logged"] = True
+            self._log_request(scope, headers, req_id, dbg_id, req_tee.preview())
+
+        async def receive_tee() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and not state["request_logged"]:
+                req_tee.feed(message.get("body", b""))
+                if not message.get("more_body", False):
+                    log_request()
+            return message
+
+        async def send_tee(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Handlers that never read the body (GET) still get a request line
+                log_request()
+                MutableHeaders(scope=message).setdefault("X-Request-ID", req_id)
+                state["status"] = message["status"]
+                if self.include_headers:
+                    state["headers"] = {
+                        k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])
+                    }
+            elif message["type"] == "http.response.body":
+                res_tee.feed(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await send(message)
+                    duration_ms = int((time.perf_counter() - started) * 1000)
+                    self._log_response(req_id, dbg_id, state["status"], duration_ms, state["headers"], res_tee.preview())
+                    return
+            await send(message)
+
+        await self.app(scope, receive_tee, send_tee)
+
+    def _log_request(self, scope: Scope, headers: Headers, req_id: str, dbg_id: str, preview: str) -> None:
         try:
-            resp_bytes = b""
-            async for chunk in response.body_iterator:  # type: ignore[attr-defined]
-                resp_bytes += chunk
-            duration_ms = int((time.perf_counter() - started) * 1000)
-
-            if should_debug:
-                try:
-                    if self.style == "pretty":
-                        preview = _preview_bytes(resp_bytes, self.max_body_preview)
-                        hdrs = dict(response.headers) if self.include_headers else {}
-                        msg = (
-                            f"RES req_id={req_id} dbg_id={dbg_id or '-'} "
-                            f"status={response.status_code} duration={duration_ms}ms "
-                            f"headers={hdrs} body={preview!r}"
-                        ) if self.include_headers else (
-                            f"RES req_id={req_id} dbg_id={dbg_id or '-'} "
-                            f"status={response.status_code} duration={duration_ms}ms "
-                            f"body={preview!r}"
-                        )
-                        logger.info(msg)
-                    else:
-                        info = {
-                            "kind": "response",
-                            "req_id": req_id,
-                            "dbg_id": dbg_id,
-                            "status": response.status_code,
-                            "duration_ms": duration_ms,
-                            "body_preview": _preview_bytes(resp_bytes, self.max_body_preview),
-                        }
-                        if self.include_headers:
-                            info["headers"] = dict(response.headers)
-                        logger.info(json.dumps(info, ensure_ascii=False))
-                except Exception:
-                    pass
-
-            new_response = Response(
-                content=resp_bytes,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type,
-            )
+            method = scope.get("method", "")
+            path = scope.get("path", "")
+            query = scope.get("query_string", b"").decode("latin-1")
+            client = scope.get("client")
+            client_host = client[0] if client else None
+            hdrs = {}
+            if self.include_headers:
+                hdrs = {k: v for k, v in headers.items() if k.lower() in _LOGGED_REQUEST_HEADERS}
+            if self.style == "pretty":
+                q = ("?" + query) if query else ""
+                msg = (
+                    f"REQ req_id={req_id} dbg_id={dbg_id or '-'} "
+                    f"{method} {path}{q} "
+                    f"client={client_host} "
+                    f"headers={hdrs} body={preview!r}"
+                ) if self.include_headers else (
+                    f"REQ req_id={req_id} dbg_id={dbg_id or '-'} "
+                    f"{method} {path}{q} "
+                    f"client={client_host} "
+                    f"body={preview!r}"
+                )
+                logger.info(msg)
+            else:
+                info: Dict[str, Any] = {
+                    "kind": "request",
+                    "req_id": req_id,
+                    "dbg_id": dbg_id,
+                    "method": method,
+                    "path": path,
+                    "query": query,
+                    "client": client_host,
+                    "body_preview": preview,
+                }
+                if self.include_headers:
+                    info["headers"] = hdrs
+                # dict is serialized to JSON on the sink thread
+                logger.info(info)
         except Exception:
-            # If anything goes wrong, fall back to original response
-            new_response = response
+            # best-effort only
+            pass
 
-        # Always include request id for correlation
+    def _log_response(
+        self, req_id: str, dbg_id: str, status: Any, duration_ms: int, hdrs: Dict[str, str], preview: str
+    ) -> None:
         try:
-            new_response.headers.setdefault("X-Request-ID", req_id)
+            if self.style == "pretty":
+                msg = (
+                    f"RES req_id={req_id} dbg_id={dbg_id or '-'} "
+                    f"status={status} duration={duration_ms}ms "
+                    f"headers={hdrs} body={preview!r}"
+                ) if self.include_headers else (
+                    f"RES req_id={req_id} dbg_id={dbg_id or '-'} "
+                    f"status={status} duration={duration_ms}ms "
+                    f"body={preview!r}"
+                )
+                logger.info(msg)
+            else:
+                info: Dict[str, Any] = {
+                    "kind": "response",
+                    "req_id": req_id,
+                    "dbg_id": dbg_id,
+                    "status": status,
+                    "duration_ms": duration_ms,
+                    "body_preview": preview,
+                }
+                if self.include_headers:
+                    info["headers"] = hdrs
+                logger.info(info)
         except Exception:
             pass
-
-        return new_response
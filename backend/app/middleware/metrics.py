@@ -0,0 +1,61 @@
+import time
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
+
+
+_UNMATCHED = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Per-route latency histogram and status counts.
+
+    Routes are labelled by their template (``/users/{user_id}/alerts``), found
+    through the endpoint the router stored in the scope, so label cardinality
+    stays bounded by the number of routes.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._paths: dict[Any, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return _UNMATCHED
+        path = self._paths.get(endpoint)
+        if path is None:
+            # Built once from the app's routes (scope["app"] is the FastAPI app)
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                ep = getattr(route, "endpoint", None)
+                if ep is not None:
+                    self._paths.setdefault(ep, getattr(route, "path", _UNMATCHED))
+            path = self._paths.setdefault(endpoint, _UNMATCHED)
+        return path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            method = scope.get("method", "")
+            route = self._route(scope)
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
@@ -0,0 +1,167 @@
+from datetime import date, datetime
+from typing import Any, Optional, Sequence
+from app.db.session import db
+from app.core.metrics import timed_query
+
+# (model, capacity, day); capacity may be NULL (용량 미상)
+AggKey = tuple[str, Optional[str], date]
+
+
+@timed_query
+async def lock_days(days: Sequence[date]) -> None:
+    # Transaction-scoped lock per day so incremental runs and backfills of the
+    # same day serialize; sorted to avoid lock-order deadlocks
+    for day in sorted(set(days)):
+        await db.execute(
+            "SELECT pg_advisory_xact_lock(:ns, :day)",
+            {"ns": 0x5353_0003, "day": day.toordinal()},
+        )
+
+
+@timed_query
+async def grouped_values_between(after: datetime, until: datetime, tz: str) -> Sequence[Any]:
+    # New tco_total values per (model, capacity, local day) for deals in (after, until]
+    return await db.fetch_all(
+        """
+        SELECT d.model, d.capacity,
+               (d.parsed_at AT TIME ZONE :tz)::date AS day,
+               array_agg(d.tco_total::float8) AS vals
+          FROM deals d
+         WHERE d.parsed_at > :after AND d.parsed_at <= :until
+           AND d.tco_total IS NOT NULL AND d.model IS NOT NULL
+         GROUP BY 1, 2, 3
+        """,
+        {"after": after, "until": until, "tz": tz},
+    )
+
+
+@timed_query
+async def grouped_values_for_day(day: date, upto: Optional[datetime], tz: str) -> Sequence[Any]:
+    # Every tco_total of one local day (optionally only up to a watermark)
+    return await db.fetch_all(
+        """
+        SELECT d.model, d.capacity, CAST(:day AS date) AS day,
+               array_agg(d.tco_total::float8) AS vals
+          FROM deals d
+         WHERE d.parsed_at >= (CAST(:day AS date)::timestamp AT TIME ZONE :tz)
+           AND d.parsed_at < ((CAST(:day AS date) + 1)::timestamp AT TIME ZONE :tz)
+           AND (CAST(:upto AS timestamptz) IS NULL OR d.parsed_at <= :upto)
+           AND d.tco_total IS NOT NULL AND d.model IS NOT NULL
+         GROUP BY 1, 2
+        """,
+        {"day": day, "upto": upto, "tz": tz},
+    )
+
+
+@timed_query
+async def take_dirty_days(tz: str) -> list[date]:
+    # Claims the queued hours (sql/aggregates.sql); call inside the transaction
+    # that rebuilds their days, so a failed rebuild leaves them queued
+    rows = await db.fetch_all(
+        """
+        WITH taken AS (DELETE FROM aggregates_dirty_hours RETURNING hour)
+        SELECT DISTINCT (t.at AT TIME ZONE :tz)::date AS day
+          FROM taken, LATERAL (VALUES (taken.hour), (taken.hour + interval '1 hour' - interval '1 microsecond')) AS t(at)
+         ORDER BY 1
+        """,
+        {"tz": tz},
+    )
+    return [r["day"] for r in rows]
+
+
+@timed_query
+async def load_sketches(keys: Sequence[AggKey]) -> dict[AggKey, dict[str, Any]]:
+    if not keys:
+        return {}
+    rows = await db.fetch_all(
+        """
+        SELECT s.model, s.capacity, s.day, s.n, s.total, s.min, s.max, s.means, s.weights
+          FROM aggregates_sketches s
+          JOIN unnest(CAST(:models AS text[]), CAST(:caps AS text[]), CAST(:unknown AS bool[]), CAST(:days AS date[]))
+               AS k(model, capacity_key, capacity_unknown, day)
+            ON s.model = k.model AND s.capacity_key = k.capacity_key
+           AND s.capacity_unknown = k.capacity_unknown AND s.day = k.day
+        """,
+        {
+            "models": [k[0] for k in keys],
+            "caps": [k[1] or "" for k in keys],
+            "unknown": [k[1] is None for k in keys],
+            "days": [k[2] for k in keys],
+        },
+    )
+    return {(r["model"], r["capacity"], r["day"]): dict(r) for r in rows}
+
+
+@timed_query
+async def save_sketches(rows: Sequence[dict[str, Any]]) -> None:
+    if not rows:
+        return
+    await db.execute_many(
+        """
+        INSERT INTO aggregates_sketches (model, capacity, day, n, total, min, max, means, weights)
+        VALUES (:model, :capacity, :day, :n, :total, :min, :max, :means, :weights)
+        ON CONFLICT (model, capacity_key, capacity_unknown, day)
+        DO UPDATE SET
+            n = EXCLUDED.n, total = EXCLUDED.total, min = EXCLUDED.min, max = EXCLUDED.max,
+            means = EXCLUDED.means, weights = EXCLUDED.weights, updated_at = NOW()
+        """,
+        list(rows),
+    )
+
+
+@timed_query
+async def delete_sketches_for_day(day: date) -> None:
+    await db.execute("DELETE FROM aggregates_sketches WHERE day = :day", {"day": day})
+
+
+@timed_query
+async def replace_daily_rows(rows: Sequence[dict[str, Any]], whole_days: Sequence[date] = ()) -> None:
+    """Write aggregates_daily rows with one DELETE and one INSERT.
+
+    capacity is matched NULL-safely. ``whole_days`` are cleared entirely first
+    (backfill), so keys that no longer have deals disappear too.
+    """
+    if whole_days:
+        await db.execute(
+            "DELETE FROM aggregates_daily a WHERE CAST(a.ts AS date) = ANY(CAST(:days AS date[]))",
+            {"days": list(whole_days)},
+        )
+    if not rows:
+        return
+    params = {
+        "models": [r["model"] for r in rows],
+        "caps": [r["capacity"] for r in rows],
+        "days": [r["day"] for r in rows],
+        "mins": [r["min"] for r in rows],
+        "p25s": [r["p25"] for r in rows],
+        "medians": [r["median"] for r in rows],
+        "p75s": [r["p75"] for r in rows],
+        "maxs": [r["max"] for r in rows],
+        "avgs": [r["avg"] for r in rows],
+        "ns": [r["n"] for r in rows],
+    }
+    if not whole_days:
+        await db.execute(
+            """
+            DELETE FROM aggregates_daily a
+             USING unnest(CAST(:models AS text[]), CAST(:caps AS text[]), CAST(:days AS date[]))
+                   AS x(model, capacity, day)
+             WHERE a.model = x.model
+               AND a.capacity IS NOT DISTINCT FROM x.capacity
+               AND CAST(a.ts AS date) = x.day
+            """,
+            {"models": params["models"], "caps": params["caps"], "days": params["days"]},
+        )
+    await db.execute(
+        """
+        INSERT INTO aggregates_daily (model, capacity, ts, min, p25, median, p75, max, avg, n)
+        SELECT x.model, x.capacity, x.day, x.min, x.p25, x.median, x.p75, x.max, x.avg, x.n
+          FROM unnest(
+                 CAST(:models AS text[]), CAST(:caps AS text[]), CAST(:days AS date[]),
+                 CAST(:mins AS float8[]), CAST(:p25s AS float8[]), CAST(:medians AS float8[]),
+                 CAST(:p75s AS float8[]), CAST(:maxs AS float8[]), CAST(:avgs AS float8[]),
+                 CAST(:ns AS bigint[])
+               ) AS x(model, capacity, day, min, p25, median, p75, max, avg, n)
+        """,
+        params,
+    )
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import Any, Sequence
+from app.db.session import db, uses_pool, READ
+from app.core.metrics import timed_query
+
+
+@timed_query
+async def last_fired_by_rule(rule_ids: Sequence[int], since_hours: int) -> dict[int, datetime]:
+    # Most recent event per rule within the lookback window (cooldown checks)
+    if not rule_ids:
+        return {}
+    rows = await db.fetch_all(
+        """
+        SELECT rule_id, MAX(created_at) AS last_at
+          FROM alert_events
+         WHERE rule_id = ANY(:rule_ids)
+           AND created_at > NOW() - make_interval(hours => :hours)
+         GROUP BY rule_id
+        """,
+        {"rule_ids": list(rule_ids), "hours": since_hours},
+    )
+    return {int(r["rule_id"]): r["last_at"] for r in rows}
+
+
+@timed_query
+async def insert_alert_events(
+    events: Sequence[tuple[str, Any, int]], after: datetime, until: datetime
+) -> int:
+    """Bulk-insert (user_id, deal_id, rule_id) events in one statement.
+
+    deal ids are matched back to `deals` inside the parsed_at range they were
+    read from ([after, until]), so the insert keeps the column's own type.
+    """
+    if not events:
+        return 0
+    rows = await db.fetch_all(
+        """
+        INSERT INTO alert_events (user_id, deal_id, rule_id)
+        SELECT x.user_id, d.id, x.rule_id
+          FROM unnest(CAST(:users AS text[]), CAST(:deals AS text[]), CAST(:rules AS bigint[]))
+               AS x(user_id, deal_key, rule_id)
+          JOIN deals d
+            ON d.id::text = x.deal_key
+           AND d.parsed_at >= :after AND d.parsed_at <= :until
+        RETURNING id
+        """,
+        {
+            "users": [e[0] for e in events],
+            "deals": [str(e[1]) for e in events],
+            "rules": [e[2] for e in events],
+            "after": after,
+            "until": until,
+        },
+    )
+    return len(rows)
+
+
+@timed_query
+@uses_pool(READ)
+async def pending_queue_stats() -> dict[str, float]:
+    # Undelivered, not dead-lettered events: depth, due now, age of the oldest.
+    # Only feeds a gauge, so a replica within the lag limit is good enough
+    row = await db.fetch_one(
+        """
+        SELECT count(*) AS depth,
+               count(*) FILTER (WHERE next_attempt_at <= NOW()) AS due,
+               COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(created_at)), 0) AS oldest_age_sec
+          FROM alert_events
+         WHERE sent_at IS NULL AND dead_at IS NULL
+        """
+    )
+    assert row is not None
+    return {"depth": float(row["depth"]), "due": float(row["due"]), "oldest_age_sec": float(row["oldest_age_sec"])}
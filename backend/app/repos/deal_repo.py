@@ -1,60 +1,192 @@
-from typing import Optional, Sequence, Any
-import asyncio
+from typing import Optional, Sequence, Any, AsyncIterator
 import json
-from app.db.session import db
+from contextlib import aclosing
+from datetime import datetime
+from app.db.session import db, uses_pool, READ
+from app.db.query import queries
+from app.core.metrics import timed_query
+from app.db.notify import listener, DEALS_CHANNEL
 from app.core.config import settings
+from app.utils.cache import TTLCache, make_key
+from app.utils.singleflight import SingleFlight
 
 
-async def list_deals(
-    model: Optional[str] = None,
-    carrier: Optional[str] = None,
-    city: Optional[str] = None,
-    move_type: Optional[str] = None,
-    contract: Optional[str] = None,
-    payment: Optional[str] = None,
-    channel: Optional[str] = None,
-    sort: str = "latest",
-    limit: int = 20,
-    offset: int = 0,
-) -> Sequence[dict[str, Any]]:
-    # Read JSONB rows from the view and return the JSON payload as-is
-    base = """
-    SELECT deal
-      FROM api_deals_json
-     WHERE 1=1
-    """
+deal_cache = TTLCache(
+    "deals",
+    maxsize=settings.CACHE_MAX_ENTRIES,
+    ttl=settings.CACHE_TTL_SEC,
+    enabled=settings.CACHE_ENABLED,
+)
+listener.subscribe(DEALS_CHANNEL, deal_cache.clear)
+# Keyed by (cache key, generation) so no caller joins a load from before an invalidation
+deal_flights = SingleFlight("deals", enabled=settings.SINGLEFLIGHT_ENABLED)
+
+
+# Filterable columns on `deals`, in canonical order
+_FILTER_COLUMNS = ("model", "carrier", "city", "move_type", "contract", "payment", "channel")
+
+
+def _filter_clause(
+    model: Optional[str],
+    carrier: Optional[str],
+    city: Optional[str],
+    move_type: Optional[str],
+    contract: Optional[str],
+    payment: Optional[str],
+    channel: Optional[str],
+) -> tuple[str, dict[str, Any]]:
+    # Plain column predicates so the composite indexes in sql/indexes.sql apply
+    values = {
+        "model": model,
+        "carrier": carrier,
+        "city": city,
+        "move_type": move_type,
+        "contract": contract,
+        "payment": payment,
+        "channel": channel,
+    }
+    clause = ""
     params: dict[str, Any] = {}
-    if model:
-        base += " AND (deal->>'model') = :model"
-        params["model"] = model
-    if carrier:
-        base += " AND (deal->>'carrier') = :carrier"
-        params["carrier"] = carrier
-    if city:
-        base += " AND (deal->>'city') = :city"
-        params["city"] = city
-    if move_type:
-        base += " AND (deal->>'move_type') = :move_type"
-        params["move_type"] = move_type
-    if contract:
-        base += " AND (deal->>'contract') = :contract"
-        params["contract"] = contract
-    if payment:
-        base += " AND (deal->>'payment') = :payment"
-        params["payment"] = payment
-    if channel:
-        base += " AND (deal->>'channel') = :channel"
-        params["channel"] = channel
+    for col in _FILTER_COLUMNS:
+        if values[col]:
+            clause += f" AND d.{col} = :{col}"
+            params[col] = values[col]
+    return clause, params
+
 
+def _order_clause(sort: str, alias: str = "d") -> str:
+    # id is the final tie-breaker so both offset and keyset paging are deterministic
     if sort == "tco_asc":
-        order = "(deal->>'tco_total')::numeric ASC NULLS LAST, (deal->>'parsed_at')::timestamptz DESC"
-    else:  # default latest
-        order = "(deal->>'parsed_at')::timestamptz DESC"
+        return f"{alias}.tco_total ASC NULLS LAST, {alias}.parsed_at DESC, {alias}.id DESC"
+    # default latest
+    return f"{alias}.parsed_at DESC, {alias}.id DESC"
+
+
+def _keyset_clause(sort: str, key: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    """Seek predicate that resumes strictly after the row described by ``key``.
+
+    Raises ValueError when the cursor does not belong to ``sort`` or is malformed.
+    """
+    if key.get("s") != sort or "p" not in key or "i" not in key:
+        raise ValueError("cursor does not match sort order")
+    try:
+        # deals.id is text; anything else would reach asyncpg as a DataError
+        if not isinstance(key["i"], str):
+            raise TypeError("cursor id must be a string")
+        params: dict[str, Any] = {
+            "c_parsed_at": datetime.fromisoformat(key["p"]),
+            "c_id": key["i"],
+        }
+    except (TypeError, ValueError):
+        raise ValueError("malformed cursor")
+    after_latest = "(d.parsed_at, d.id) < (:c_parsed_at, :c_id)"
+    if sort != "tco_asc":
+        return f" AND {after_latest}", params
+
+    tco = key.get("t")
+    if tco is None:
+        # Already inside the NULLS LAST tail
+        return f" AND d.tco_total IS NULL AND {after_latest}", params
+    if not isinstance(tco, (int, float)):
+        raise ValueError("malformed cursor")
+    params["c_tco"] = tco
+    clause = (
+        " AND (d.tco_total > :c_tco"
+        " OR d.tco_total IS NULL"
+        f" OR (d.tco_total = :c_tco AND {after_latest}))"
+    )
+    return clause, params
+
+
+def _page_query(where: str, sort: str, paging: str) -> str:
+    # Filter, sort and limit on real columns; JSON is built only for the page
+    return f"""
+    SELECT api_deal_json(p.d) AS deal
+      FROM (
+        SELECT d, d.tco_total, d.parsed_at, d.id
+          FROM deals d
+         WHERE 1=1{where}
+         ORDER BY {_order_clause(sort)}
+         {paging}
+      ) p
+     ORDER BY {_order_clause(sort, alias="p")}
+    """
+
+
+def _page_json_query(where: str, sort: str, paging: str) -> str:
+    # Whole page serialized by Postgres as one JSON array in the public shape
+    return f"""
+    SELECT '[' || COALESCE(
+             string_agg(api_deal_public_json(p.d)::text, ',' ORDER BY {_order_clause(sort, alias="p")}),
+             ''
+           ) || ']' AS body
+      FROM (
+        SELECT d, d.tco_total, d.parsed_at, d.id
+          FROM deals d
+         WHERE 1=1{where}
+         ORDER BY {_order_clause(sort)}
+         {paging}
+      ) p
+    """
 
-    base += f" ORDER BY {order} LIMIT :limit OFFSET :offset"
-    params.update({"limit": limit, "offset": offset})
 
-    rows = await asyncio.wait_for(db.fetch_all(base, params), timeout=settings.DB_QUERY_TIMEOUT)
+def deal_cursor_key(deal: dict[str, Any], sort: str) -> dict[str, Any]:
+    # Tuple of the ordering columns of the last row on a page
+    key: dict[str, Any] = {"s": "tco_asc" if sort == "tco_asc" else "latest"}
+    if sort == "tco_asc":
+        key["t"] = deal.get("tco_total")
+    key["p"] = deal.get("parsed_at")
+    key["i"] = deal.get("id")
+    return key
+
+
+# Filter combinations backed by a composite index in sql/indexes.sql
+_INDEXED_FILTERS: tuple[tuple[str, ...], ...] = (
+    (),
+    ("model",),
+    ("model", "carrier"),
+    ("model", "city"),
+    ("model", "channel"),
+    ("carrier",),
+    ("city",),
+    ("channel",),
+)
+# Stand-in cursors; only used to render each seek predicate shape
+_SEEK_SHAPES = {
+    "latest": (("cursor_next", {"s": "latest", "p": "2000-01-01T00:00:00+00:00", "i": ""}),),
+    "tco_asc": (
+        ("cursor_next", {"s": "tco_asc", "t": 0, "p": "2000-01-01T00:00:00+00:00", "i": ""}),
+        ("cursor_next_null", {"s": "tco_asc", "t": None, "p": "2000-01-01T00:00:00+00:00", "i": ""}),
+    ),
+}
+
+
+def _register_statements() -> None:
+    """Prepare the /deals page queries on every pool connection.
+
+    One statement per indexed filter combination, sort and paging shape rather
+    than a catch-all ``(:model IS NULL OR d.model = :model)`` template, whose
+    generic plan could not use the composite indexes. Other combinations go
+    through asyncpg's statement cache.
+    """
+    for cols in _INDEXED_FILTERS:
+        clause, _ = _filter_clause(**{col: (col if col in cols else None) for col in _FILTER_COLUMNS})
+        tag = "+".join(cols) or "all"
+        for sort in ("latest", "tco_asc"):
+            db.prepare(
+                f"deals.page_json/{tag}/{sort}",
+                _page_json_query(clause, sort, "LIMIT :limit OFFSET :offset"),
+            )
+            db.prepare(f"deals.cursor_first/{tag}/{sort}", _page_query(clause, sort, "LIMIT :limit"))
+            for shape, sample in _SEEK_SHAPES[sort]:
+                seek, _ = _keyset_clause(sort, sample)
+                db.prepare(f"deals.{shape}/{tag}/{sort}", _page_query(clause + seek, sort, "LIMIT :limit"))
+
+
+_register_statements()
+
+
+def _decode_rows(rows: Sequence[Any]) -> list[dict[str, Any]]:
     # rows are Records with a single key 'deal'. Decode strings if needed.
     deals: list[dict[str, Any]] = []
     for row in rows:
@@ -67,3 +199,262 @@ async def list_deals(
                 raise e
         deals.append(value)
     return deals
+
+
+@timed_query
+@uses_pool(READ)
+async def list_deals_json(
+    model: Optional[str] = None,
+    carrier: Optional[str] = None,
+    city: Optional[str] = None,
+    move_type: Optional[str] = None,
+    contract: Optional[str] = None,
+    payment: Optional[str] = None,
+    channel: Optional[str] = None,
+    sort: str = "latest",
+    limit: int = 20,
+    offset: int = 0,
+) -> bytes:
+    """An offset page as a ready-to-send JSON array (public shape, support_cash derived).
+
+    Nothing is decoded in Python; the bytes go straight into the response.
+    """
+    sort = "tco_asc" if sort == "tco_asc" else "latest"
+    cacheable = offset + limit <= settings.CACHE_DEALS_MAX_DEPTH
+    key = make_key(
+        "list_deals_json", model=model, carrier=carrier, city=city, move_type=move_type,
+        contract=contract, payment=payment, channel=channel, sort=sort, limit=limit, offset=offset,
+    )
+    if cacheable:
+        cached = deal_cache.get(key)
+        if cached is not None:
+            return cached
+    generation = deal_cache.generation
+
+    clause, params = _filter_clause(model, carrier, city, move_type, contract, payment, channel)
+    query = _page_json_query(clause, sort, "LIMIT :limit OFFSET :offset")
+    params.update({"limit": limit, "offset": offset})
+
+    async def load() -> bytes:
+        out = (await queries.fetch_val("deals.list_json", query, params)).encode("utf-8")
+        if cacheable:
+            deal_cache.set(key, out, generation)
+        return out
+
+    return await deal_flights.do((key, generation), load)
+
+
+@timed_query
+@uses_pool(READ)
+async def list_deals_after(
+    model: Optional[str] = None,
+    carrier: Optional[str] = None,
+    city: Optional[str] = None,
+    move_type: Optional[str] = None,
+    contract: Optional[str] = None,
+    payment: Optional[str] = None,
+    channel: Optional[str] = None,
+    sort: str = "latest",
+    limit: int = 20,
+    after: Optional[dict[str, Any]] = None,
+) -> tuple[list[dict[str, Any]], Optional[dict[str, Any]]]:
+    """Keyset variant of list_deals_json, returning decoded deals.
+
+    Seeks past ``after`` (a key from deal_cursor_key) instead of skipping rows,
+    so every page costs the same. Returns the page and the key for the next
+    page, or None when this is the last page.
+    """
+    sort = "tco_asc" if sort == "tco_asc" else "latest"
+    # First cursor page is shared by every client; later pages are not cached
+    key = make_key(
+        "list_deals_after", model=model, carrier=carrier, city=city, move_type=move_type,
+        contract=contract, payment=payment, channel=channel, sort=sort, limit=limit,
+    )
+    if after is None:
+        cached = deal_cache.get(key)
+        if cached is not None:
+            return cached
+    generation = deal_cache.generation
+
+    clause, params = _filter_clause(model, carrier, city, move_type, contract, payment, channel)
+    if after is not None:
+        seek, seek_params = _keyset_clause(sort, after)
+        clause += seek
+        params.update(seek_params)
+    # One extra row tells us whether another page exists
+    base = _page_query(clause, sort, "LIMIT :limit")
+    params["limit"] = limit + 1
+
+    async def load() -> tuple[list[dict[str, Any]], Optional[dict[str, Any]]]:
+        deals = _decode_rows(await queries.fetch_all("deals.list_after", base, params))
+        next_key = None
+        if len(deals) > limit:
+            deals = deals[:limit]
+            next_key = deal_cursor_key(deals[-1], sort)
+        if after is None:
+            deal_cache.set(key, (deals, next_key), generation)
+        return deals, next_key
+
+    if after is not None:
+        return await load()
+    return await deal_flights.do((key, generation), load)
+
+
+@uses_pool(READ)
+async def iter_deals_json(
+    model: Optional[str] = None,
+    carrier: Optional[str] = None,
+    city: Optional[str] = None,
+    move_type: Optional[str] = None,
+    contract: Optional[str] = None,
+    payment: Optional[str] = None,
+    channel: Optional[str] = None,
+    sort: str = "latest",
+) -> AsyncIterator[str]:
+    """Stream every matching deal (public JSON shape, as text) from a server-side cursor.
+
+    Not cached and not bound by DB_QUERY_TIMEOUT; rows are fetched lazily as
+    the consumer iterates.
+    """
+    sort = "tco_asc" if sort == "tco_asc" else "latest"
+    clause, params = _filter_clause(model, carrier, city, move_type, contract, payment, channel)
+    query = f"""
+    SELECT api_deal_public_json(d)::text AS deal
+      FROM deals d
+     WHERE 1=1{clause}
+     ORDER BY {_order_clause(sort)}
+    """
+    async with aclosing(db.iterate(query, params)) as rows:
+        async for row in rows:
+            yield row["deal"]
+
+
+# Columns the rule engine and other pipeline stages read from new deals
+PIPELINE_DEAL_COLUMNS = (
+    "id, model, capacity, carrier, channel, city, move_type, contract, payment, "
+    "upfront, tco_total, tco_net, parsed_at"
+)
+
+
+@timed_query
+async def list_deals_parsed_between(
+    after: datetime, after_id: Any, until: datetime, limit: int
+) -> list[dict[str, Any]]:
+    """Deals after the (parsed_at, id) key and with parsed_at <= until, oldest first.
+
+    With ``after_id`` None every row at ``after`` counts as done. Uses deals_latest_idx.
+    """
+    params: dict[str, Any] = {"after": after, "until": until, "limit": limit}
+    if after_id is None:
+        seek = "parsed_at > :after"
+    else:
+        seek = "(parsed_at, id) > (:after, :after_id)"
+        params["after_id"] = after_id
+    rows = await db.fetch_all(
+        f"""
+        SELECT {PIPELINE_DEAL_COLUMNS}
+          FROM deals
+         WHERE {seek} AND parsed_at <= :until
+         ORDER BY parsed_at ASC, id ASC
+         LIMIT :limit
+        """,
+        params,
+    )
+    return [dict(r) for r in rows]
+
+
+@timed_query
+@uses_pool(READ)
+async def min_tco_by_model(models: Sequence[str], before: datetime) -> dict[str, Any]:
+    # Cheapest tco_total per model among deals parsed up to ``before``
+    if not models:
+        return {}
+    rows = await db.fetch_all(
+        """
+        SELECT model, MIN(tco_total) AS min_tco
+          FROM deals
+         WHERE model = ANY(:models) AND parsed_at <= :before AND tco_total IS NOT NULL
+         GROUP BY model
+        """,
+        {"models": list(models), "before": before},
+    )
+    return {r["model"]: r["min_tco"] for r in rows}
+
+
+# Profile-independent monthly cost of a deal: tco_engine.effective_tco's tco_net
+# over horizon_months, with the same fallbacks (keep the two in step)
+_MONTHLY_NET_COST = """
+(COALESCE(d.tco_net,
+          COALESCE(d.tco_total,
+                   COALESCE(d.upfront, 0)
+                   + COALESCE(d.plan_high_fee, 0) * COALESCE(d.plan_high_months, 0)
+                   + COALESCE(d.plan_after_fee, 0) * COALESCE(d.plan_after_months, 0)
+                   + COALESCE(d.mvno_tail_fee, 0) * COALESCE(d.mvno_tail_months, 0)
+                   + COALESCE(d.addons_monthly, 0) * COALESCE(d.addons_months, 0)
+                   + COALESCE(d.device_finance_total,
+                              COALESCE(d.device_finance_monthly, 0) * COALESCE(d.device_finance_months, 0)))
+          - CASE WHEN d.cash_delta < 0 THEN trunc(abs(d.cash_delta)) ELSE 0 END)::float8
+ / COALESCE(NULLIF(COALESCE(d.plan_high_months, 0) + COALESCE(d.plan_after_months, 0)
+                   + COALESCE(d.mvno_tail_months, 0), 0), 24))"""
+
+
+@timed_query
+@uses_pool(READ)
+async def list_rank_candidates(
+    model: Optional[str] = None,
+    carrier: Optional[str] = None,
+    city: Optional[str] = None,
+    move_type: Optional[str] = None,
+    contract: Optional[str] = None,
+    payment: Optional[str] = None,
+    channel: Optional[str] = None,
+    channel_pref: Optional[str] = None,
+    profile_city: Optional[str] = None,
+    limit: int = 2000,
+) -> Sequence[Any]:
+    """Raw cost columns of the matching deals with the lowest monthly net cost.
+
+    The prefilter for services/tco_engine.py, which re-ranks them per profile.
+    The order uses _MONTHLY_NET_COST, so deals without a stored TCO compete too.
+    ``channel_pref``/``profile_city`` drop deals the profile cannot take
+    (online_only keeps online deals; otherwise offline deals must be in the
+    profile's city or have none), so ``limit`` counts only eligible deals.
+    No JSON is built here.
+    """
+    clause, params = _filter_clause(model, carrier, city, move_type, contract, payment, channel)
+    if channel_pref == "online_only":
+        clause += " AND d.channel = 'online'"
+    elif profile_city:
+        clause += (
+            " AND (d.channel IS DISTINCT FROM 'offline'"
+            " OR d.city = :profile_city OR COALESCE(d.city, '') = '')"
+        )
+        params["profile_city"] = profile_city
+    query = f"""
+    SELECT d.id, d.upfront,
+           d.plan_high_fee, d.plan_high_months, d.plan_after_fee, d.plan_after_months,
+           d.mvno_tail_fee, d.mvno_tail_months, d.addons_monthly, d.addons_months,
+           d.device_finance_total, d.device_finance_months, d.device_finance_monthly,
+           d.cash_delta, d.tco_total, d.tco_net
+      FROM deals d
+     WHERE 1=1{clause}
+     ORDER BY {_MONTHLY_NET_COST} ASC, d.id
+     LIMIT :limit
+    """
+    params["limit"] = limit
+    return await queries.fetch_all("deals.rank_candidates", query, params)
+
+
+@timed_query
+@uses_pool(READ)
+async def get_deals_by_ids(ids: Sequence[Any]) -> list[dict[str, Any]]:
+    # Public JSON shape for ``ids``, returned in the given order (missing ids skipped)
+    if not ids:
+        return []
+    rows = await queries.fetch_all(
+        "deals.by_ids",
+        "SELECT d.id, api_deal_public_json(d) AS deal FROM deals d WHERE d.id = ANY(:ids)",
+        {"ids": list(ids)},
+    )
+    by_id = {r["id"]: d for r, d in zip(rows, _decode_rows(rows))}
+    return [by_id[i] for i in ids if i in by_id]
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+from typing import Any, Optional
+from app.db.session import db
+from app.core.metrics import timed_query
+
+
+@timed_query
+async def get_watermark(name: str) -> Optional[datetime]:
+    return await db.fetch_val(
+        "SELECT value FROM pipeline_watermarks WHERE name = :name",
+        {"name": name},
+    )
+
+
+@timed_query
+async def visible_until(grace_sec: float) -> datetime:
+    """Upper bound a watermark may move to without passing rows still uncommitted.
+
+    parsed_at defaults to the inserting transaction's start, so nothing that
+    commits later can be older than the oldest transaction now holding an xid.
+    The grace covers parsed_at values set by the client and sessions whose
+    pg_stat_activity rows this role cannot see.
+    """
+    return await db.fetch_val(
+        """
+        SELECT LEAST(
+                 NOW() - make_interval(secs => :grace),
+                 (SELECT MIN(xact_start) - interval '1 microsecond'
+                    FROM pg_stat_activity
+                   WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid())
+               )
+        """,
+        {"grace": grace_sec},
+    )
+
+
+@timed_query
+async def get_watermark_key(name: str) -> Optional[tuple[datetime, Any]]:
+    # (value, value_key) for keyset watermarks; value_key is None when only a time was stored
+    row = await db.fetch_one(
+        "SELECT value, value_key::text AS value_key FROM pipeline_watermarks WHERE name = :name",
+        {"name": name},
+    )
+    if row is None:
+        return None
+    return row["value"], None if row["value_key"] is None else json.loads(row["value_key"])
+
+
+@timed_query
+async def set_watermark(name: str, value: datetime, key: Any = None) -> None:
+    await db.execute(
+        """
+        INSERT INTO pipeline_watermarks (name, value, value_key)
+        VALUES (:name, :value, CAST(:key AS jsonb))
+        ON CONFLICT (name)
+        DO UPDATE SET value = EXCLUDED.value, value_key = EXCLUDED.value_key, updated_at = NOW()
+        """,
+        {"name": name, "value": value, "key": None if key is None else json.dumps(key)},
+    )
@@ -1,7 +1,9 @@
 from typing import Optional
 from app.db.session import db
+from app.core.metrics import timed_query
 
 
+@timed_query
 async def upsert_profile(user_id: str, payload: dict) -> None:
     # Simple upsert into profiles keyed by user_id
     await db.execute(
@@ -28,6 +30,7 @@ async def upsert_profile(user_id: str, payload: dict) -> None:
     )
 
 
+@timed_query
 async def get_profile(user_id: str) -> Optional[dict]:
     row = await db.fetch_one(
         "SELECT user_id, current_plan_fee, addons_monthly, mvno_flag, channel_pref, city, updated_at FROM profiles WHERE user_id = :user_id",
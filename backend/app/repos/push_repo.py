@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import Sequence
 from app.db.session import db
+from app.core.metrics import timed_query
 
 
+@timed_query
 async def upsert_subscription(user_id: str, endpoint: str, p256dh: str, auth: str) -> None:
     await db.execute(
         """
@@ -13,3 +15,15 @@ async def upsert_subscription(user_id: str, endpoint: str, p256dh: str, auth: st
         {"user_id": user_id, "endpoint": endpoint, "p256dh": p256dh, "auth": auth},
     )
 
+
+
+@timed_query
+async def delete_subscriptions(endpoints: Sequence[str]) -> int:
+    # Drops subscriptions the push service reported as gone (404/410)
+    if not endpoints:
+        return 0
+    rows = await db.fetch_all(
+        "DELETE FROM push_subscriptions WHERE endpoint = ANY(:endpoints) RETURNING endpoint",
+        {"endpoints": list(endpoints)},
+    )
+    return len(rows)
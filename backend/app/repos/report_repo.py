@@ -1,10 +1,70 @@
-from typing import Optional, Sequence, Any
-import asyncio
+from typing import Optional, Sequence, Any, AsyncIterator
 import json
-from app.db.session import db
+from contextlib import aclosing
+from app.db.session import db, uses_pool, READ
+from app.db.query import queries
+from app.core.metrics import timed_query
+from app.db.notify import listener, AGGREGATES_CHANNEL
 from app.core.config import settings
+from app.utils.cache import TTLCache, make_key
+from app.utils.singleflight import SingleFlight
 
 
+report_cache = TTLCache(
+    "reports",
+    maxsize=settings.CACHE_MAX_ENTRIES,
+    ttl=settings.CACHE_TTL_SEC,
+    enabled=settings.CACHE_ENABLED,
+)
+listener.subscribe(AGGREGATES_CHANNEL, report_cache.clear)
+# Keyed by (cache key, generation) so no caller joins a load from before an invalidation
+report_flights = SingleFlight("reports", enabled=settings.SINGLEFLIGHT_ENABLED)
+
+
+def _decode_rows(rows: Sequence[Any]) -> list[dict[str, Any]]:
+    out: list[dict[str, Any]] = []
+    for row in rows:
+        value = row["report"]
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError as e:
+                raise e
+        out.append(value)
+    return out
+
+
+async def _cached_fetch(key: tuple, query: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+    cached = report_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = report_cache.generation
+
+    async def load() -> list[dict[str, Any]]:
+        out = _decode_rows(await queries.fetch_all(f"reports.{key[0]}", query, params))
+        report_cache.set(key, out, generation)
+        return out
+
+    return await report_flights.do((key, generation), load)
+
+
+async def _cached_fetch_json(key: tuple, query: str, params: dict[str, Any]) -> bytes:
+    # ``query`` returns a single text column ``body`` holding a JSON array
+    cached = report_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = report_cache.generation
+
+    async def load() -> bytes:
+        out = (await queries.fetch_val(f"reports.{key[0]}", query, params)).encode("utf-8")
+        report_cache.set(key, out, generation)
+        return out
+
+    return await report_flights.do((key, generation), load)
+
+
+@timed_query
+@uses_pool(READ)
 async def list_daily_reports(model: Optional[str] = None, limit: int = 200, offset: int = 0) -> Sequence[dict[str, Any]]:
     base = """
     SELECT report
@@ -19,19 +79,12 @@ async def list_daily_reports(model: Optional[str] = None, limit: int = 200, offs
     base += " ORDER BY (report->>'ts')::date DESC, (report->>'model') ASC, (report->>'capacity') NULLS LAST LIMIT :limit OFFSET :offset"
     params.update({"limit": limit, "offset": offset})
 
-    rows = await asyncio.wait_for(db.fetch_all(base, params), timeout=settings.DB_QUERY_TIMEOUT)
-    out: list[dict[str, Any]] = []
-    for row in rows:
-        value = row["report"]
-        if isinstance(value, str):
-            try:
-                value = json.loads(value)
-            except json.JSONDecodeError as e:
-                raise e
-        out.append(value)
-    return out
+    rows = await queries.fetch_all("reports.list_daily", base, params)
+    return _decode_rows(rows)
 
 
+@timed_query
+@uses_pool(READ)
 async def list_daily_reports_by_date(date: str, limit: int = 200, offset: int = 0) -> Sequence[dict[str, Any]]:
     query = (
         """
@@ -43,35 +96,104 @@ async def list_daily_reports_by_date(date: str, limit: int = 200, offset: int =
         """
     )
     params = {"date": date, "limit": limit, "offset": offset}
-    rows = await asyncio.wait_for(db.fetch_all(query, params), timeout=settings.DB_QUERY_TIMEOUT)
-    out: list[dict[str, Any]] = []
-    for row in rows:
-        value = row["report"]
-        if isinstance(value, str):
-            try:
-                value = json.loads(value)
-            except json.JSONDecodeError as e:
-                raise e
-        out.append(value)
-    return out
+    key = make_key("list_daily_reports_by_date", **params)
+    return await _cached_fetch(key, query, params)
 
 
+@timed_query
+@uses_pool(READ)
 async def list_daily_latest_reports(limit: int = 1000) -> Sequence[dict[str, Any]]:
     query = (
         """
         SELECT report
-          FROM api_reports_daily_latest_json
+          FROM api_reports_daily_latest_mv
+         ORDER BY model, capacity_key, capacity_unknown
          LIMIT :limit
         """
     )
-    rows = await asyncio.wait_for(db.fetch_all(query, {"limit": limit}), timeout=settings.DB_QUERY_TIMEOUT)
-    out: list[dict[str, Any]] = []
-    for row in rows:
-        value = row["report"]
-        if isinstance(value, str):
-            try:
-                value = json.loads(value)
-            except json.JSONDecodeError as e:
-                raise e
-        out.append(value)
-    return out
+    key = make_key("list_daily_latest_reports", limit=limit)
+    return await _cached_fetch(key, query, {"limit": limit})
+
+
+@timed_query
+@uses_pool(READ)
+async def list_daily_reports_by_date_json(date: str, limit: int = 200, offset: int = 0) -> bytes:
+    # Same rows as list_daily_reports_by_date, aggregated into one JSON array by Postgres
+    query = (
+        """
+        SELECT '[' || COALESCE(string_agg(r.report::text, ',' ORDER BY r.model, r.capacity NULLS LAST), '') || ']' AS body
+          FROM (
+            SELECT report, (report->>'model') AS model, (report->>'capacity') AS capacity
+              FROM api_reports_daily_json
+             WHERE (report->>'ts') = :date
+             ORDER BY (report->>'model') ASC, (report->>'capacity') NULLS LAST
+             LIMIT :limit OFFSET :offset
+          ) r
+        """
+    )
+    params = {"date": date, "limit": limit, "offset": offset}
+    key = make_key("list_daily_reports_by_date_json", **params)
+    return await _cached_fetch_json(key, query, params)
+
+
+@timed_query
+@uses_pool(READ)
+async def list_daily_latest_reports_json(limit: int = 1000) -> bytes:
+    query = (
+        """
+        SELECT '[' || COALESCE(string_agg(r.report::text, ',' ORDER BY r.model, r.capacity_key, r.capacity_unknown), '') || ']' AS body
+          FROM (
+            SELECT report, model, capacity_key, capacity_unknown
+              FROM api_reports_daily_latest_mv
+             ORDER BY model, capacity_key, capacity_unknown
+             LIMIT :limit
+          ) r
+        """
+    )
+    key = make_key("list_daily_latest_reports_json", limit=limit)
+    return await _cached_fetch_json(key, query, {"limit": limit})
+
+
+@uses_pool(READ)
+async def iter_daily_reports_json(
+    model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> AsyncIterator[str]:
+    # Full report history as JSON text rows from a server-side cursor
+    base = """
+    SELECT report::text AS report
+      FROM api_reports_daily_json
+     WHERE 1=1
+    """
+    params: dict[str, Any] = {}
+    if model:
+        base += " AND (report->>'model') = :model"
+        params["model"] = model
+    if date_from:
+        base += " AND (report->>'ts') >= :date_from"
+        params["date_from"] = date_from
+    if date_to:
+        base += " AND (report->>'ts') <= :date_to"
+        params["date_to"] = date_to
+    base += " ORDER BY (report->>'ts')::date DESC, (report->>'model') ASC, (report->>'capacity') NULLS LAST"
+    async with aclosing(db.iterate(base, params)) as rows:
+        async for row in rows:
+            yield row["report"]
+
+
+@timed_query
+@uses_pool(READ)
+async def latest_medians(models: Sequence[str]) -> dict[tuple[str, Optional[str]], Any]:
+    # Latest daily median per (model, capacity) from the snapshot
+    if not models:
+        return {}
+    rows = await db.fetch_all(
+        """
+        SELECT model, capacity, (report->>'median')::numeric AS median
+          FROM api_reports_daily_latest_mv
+         WHERE model = ANY(:models)
+        """,
+        {"models": list(models)},
+    )
+    return {(r["model"], r["capacity"]): r["median"] for r in rows}
@@ -1,7 +1,17 @@
-from typing import Sequence, Any
+from typing import Optional, Sequence, Any
 from app.db.session import db
+from app.core.metrics import timed_query
 
+# Type-specific rule fields (schemas/rule.py) persisted inside `thresholds`
+_TYPE_THRESHOLD_FIELDS = ("drop_pct_min", "discount_pct_min", "scope")
 
+_RULE_COLUMNS = """
+    id, user_id, type, frequency, cooldown_hours, enabled,
+    constraints, thresholds, filters, created_at, updated_at
+"""
+
+
+@timed_query
 async def list_rules(user_id: str) -> Sequence[dict[str, Any]]:
     rows = await db.fetch_all(
         """
@@ -16,7 +26,12 @@ async def list_rules(user_id: str) -> Sequence[dict[str, Any]]:
     return [dict(r) for r in rows]
 
 
+@timed_query
 async def create_rule(user_id: str, payload: dict) -> int:
+    thresholds = dict(payload.get("thresholds") or {})
+    for key in _TYPE_THRESHOLD_FIELDS:
+        if payload.get(key) is not None:
+            thresholds.setdefault(key, payload[key])
     row = await db.fetch_one(
         """
         INSERT INTO rules (user_id, type, frequency, cooldown_hours, enabled, constraints, thresholds, filters)
@@ -32,7 +47,7 @@ async def create_rule(user_id: str, payload: dict) -> int:
             "cooldown_hours": payload.get("cooldown_hours"),
             "enabled": payload.get("enabled", True),
             "constraints": payload.get("constraints"),
-            "thresholds": payload.get("thresholds"),
+            "thresholds": thresholds or None,
             "models": payload.get("models"),
             "carriers": payload.get("carriers"),
             "channels": payload.get("channels"),
@@ -42,9 +57,26 @@ async def create_rule(user_id: str, payload: dict) -> int:
     return int(row["id"])  # type: ignore
 
 
+@timed_query
 async def delete_rule(user_id: str, rule_id: int) -> int:
     return await db.execute(
         "DELETE FROM rules WHERE id = :id AND user_id = :user_id",
         {"id": rule_id, "user_id": user_id},
     )
 
+
+@timed_query
+async def get_rule(rule_id: int) -> Optional[dict[str, Any]]:
+    row = await db.fetch_one(
+        f"SELECT {_RULE_COLUMNS} FROM rules WHERE id = :id",
+        {"id": rule_id},
+    )
+    return dict(row) if row else None
+
+
+@timed_query
+async def list_enabled_rules() -> Sequence[dict[str, Any]]:
+    rows = await db.fetch_all(
+        f"SELECT {_RULE_COLUMNS} FROM rules WHERE enabled ORDER BY id",
+    )
+    return [dict(r) for r in rows]
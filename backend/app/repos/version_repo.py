@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+import asyncpg
+
+from app.db.session import db, require_version
+from app.core.metrics import timed_query
+from app.db.notify import listener, DEALS_CHANNEL, AGGREGATES_CHANNEL
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+# Names in api_data_versions (sql/notify.sql)
+DEALS_VERSION = "deals"
+AGGREGATES_VERSION = "aggregates_daily"
+LATEST_REPORTS_VERSION = "api_reports_daily_latest_mv"
+
+# Every write that bumps a version also NOTIFYs one of these channels
+version_cache = TTLCache(
+    "versions",
+    maxsize=1,
+    ttl=settings.CACHE_TTL_SEC,
+    enabled=settings.CACHE_ENABLED,
+)
+listener.subscribe(DEALS_CHANNEL, version_cache.clear)
+listener.subscribe(AGGREGATES_CHANNEL, version_cache.clear)
+
+
+@timed_query
+async def get_data_versions() -> dict[str, tuple[int, datetime]]:
+    # {name: (version, changed_at)}; the whole table is a handful of rows
+    cached = version_cache.get("all")
+    if cached is not None:
+        return cached
+    generation = version_cache.generation
+    try:
+        rows = await db.fetch_all("SELECT name, version, changed_at FROM api_data_versions")
+    except asyncpg.exceptions.UndefinedTableError:
+        # sql/notify.sql not applied yet: no validators, responses are unconditional.
+        # Not cached, so validators start as soon as the table exists
+        return {}
+    versions = {r["name"]: (int(r["version"]), r["changed_at"]) for r in rows}
+    version_cache.set("all", versions, generation)
+    return versions
+
+
+async def get_data_version(name: str) -> Optional[tuple[int, datetime]]:
+    """Version of ``name`` for an ETag; the caller's replica reads must have replayed it."""
+    version = (await get_data_versions()).get(name)
+    if version is not None:
+        require_version(name, version[0])
+    return version
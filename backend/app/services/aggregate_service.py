@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Optional, Sequence
+
+from app.core.config import settings
+from app.core.logsink import get_sink_logger
+from app.db.session import db, background_job
+from app.db.notify import listener, DEALS_CHANNEL
+from app.repos.aggregate_repo import (
+    AggKey,
+    delete_sketches_for_day,
+    grouped_values_between,
+    grouped_values_for_day,
+    load_sketches,
+    lock_days,
+    replace_daily_rows,
+    save_sketches,
+    take_dirty_days,
+)
+from app.repos.pipeline_repo import get_watermark, set_watermark, visible_until
+from app.utils.tdigest import TDigest
+
+logger = get_sink_logger("reports.aggregates")
+
+WATERMARK_NAME = "aggregates_daily"
+# pg_advisory_lock key: one incremental builder at a time across workers/replicas
+_LOCK_KEY = 0x5353_0003
+
+
+class Sketch:
+    """Running moments plus a t-digest for one (model, capacity, day)."""
+
+    __slots__ = ("n", "total", "min", "max", "digest")
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.digest = TDigest(settings.AGGREGATES_TDIGEST_COMPRESSION)
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "Sketch":
+        s = cls()
+        s.n = int(row["n"])
+        s.total = float(row["total"])
+        s.min = float(row["min"])
+        s.max = float(row["max"])
+        s.digest = TDigest(settings.AGGREGATES_TDIGEST_COMPRESSION, row["means"], row["weights"])
+        return s
+
+    def add(self, values: Sequence[float]) -> None:
+        if not values:
+            return
+        self.n += len(values)
+        self.total += float(sum(values))
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self.digest.add(values)
+
+    def sketch_row(self, key: AggKey) -> dict[str, Any]:
+        return {
+            "model": key[0],
+            "capacity": key[1],
+            "day": key[2],
+            "n": self.n,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "means": self.digest.means.tolist(),
+            "weights": self.digest.weights.tolist(),
+        }
+
+    def report_row(self, key: AggKey) -> dict[str, Any]:
+        p25, median, p75 = self.digest.quantile([0.25, 0.5, 0.75], self.min, self.max).tolist()
+        return {
+            "model": key[0],
+            "capacity": key[1],
+            "day": key[2],
+            "min": self.min,
+            "p25": p25,
+            "median": median,
+            "p75": p75,
+            "max": self.max,
+            "avg": self.total / self.n,
+            "n": self.n,
+        }
+
+
+def _groups(rows: Sequence[Any]) -> dict[AggKey, list[float]]:
+    return {(r["model"], r["capacity"], r["day"]): list(r["vals"]) for r in rows}
+
+
+async def _fold(groups: dict[AggKey, list[float]]) -> int:
+    # Merge new values into the stored sketches of the touched keys only.
+    # Must run inside a transaction that already holds lock_days() for them.
+    existing = await load_sketches(list(groups))
+    sketches, reports = [], []
+    for key, values in groups.items():
+        row = existing.get(key)
+        sketch = Sketch.from_row(row) if row is not None else Sketch()
+        sketch.add(values)
+        sketches.append(sketch.sketch_row(key))
+        reports.append(sketch.report_row(key))
+    await save_sketches(sketches)
+    await replace_daily_rows(reports)
+    return len(reports)
+
+
+async def _rebuild_day(day: date, upto: Optional[datetime]) -> int:
+    # Recompute one local day from scratch (sketches and aggregates_daily rows)
+    async with db.transaction():
+        await lock_days([day])
+        if upto is None:
+            # Deals past the incremental watermark are left for the incremental
+            # builder, so nothing is counted twice
+            upto = await get_watermark(WATERMARK_NAME)
+        groups = _groups(await grouped_values_for_day(day, upto, settings.AGGREGATES_TIMEZONE))
+        await delete_sketches_for_day(day)
+        sketches, reports = [], []
+        for key, values in groups.items():
+            sketch = Sketch()
+            sketch.add(values)
+            sketches.append(sketch.sketch_row(key))
+            reports.append(sketch.report_row(key))
+        await save_sketches(sketches)
+        await replace_daily_rows(reports, whole_days=[day])
+    return len(reports)
+
+
+async def _rebuild_dirty_days() -> int:
+    # Digests cannot retract a value: days whose deals changed or were deleted
+    # after folding are recomputed. Caller holds _LOCK_KEY (stable watermark).
+    written = 0
+    async with db.transaction():
+        days = await take_dirty_days(settings.AGGREGATES_TIMEZONE)
+        for day in days:
+            written += await _rebuild_day(day, None)
+    if days:
+        logger.info({"kind": "aggregates_rebuilt", "days": [str(d) for d in days], "rows": written})
+    return written
+
+
+@background_job
+async def backfill(date_from: date, date_to: date, concurrency: Optional[int] = None) -> int:
+    """Rebuild every day in [date_from, date_to] from the deals table.
+
+    Days run in parallel (each on its own pooled connection), bounded by
+    ``concurrency`` (AGGREGATES_BACKFILL_CONCURRENCY). Returns rows written.
+    """
+    sem = asyncio.Semaphore(concurrency or settings.AGGREGATES_BACKFILL_CONCURRENCY)
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+    async def one(day: date) -> int:
+        async with sem:
+            return await _rebuild_day(day, None)
+
+    written = sum(await asyncio.gather(*(one(d) for d in days)))
+    logger.info({"kind": "aggregates_backfill", "from": str(date_from), "to": str(date_to), "rows": written})
+    return written
+
+
+@background_job
+async def build_incremental() -> int:
+    """Fold deals parsed since the watermark into the daily aggregates.
+
+    Work is proportional to the new deals: only touched (model, capacity, day)
+    sketches are read and rewritten. The watermark advances in the same
+    transaction, in windows of at most AGGREGATES_MAX_WINDOW_HOURS. Days with
+    deals updated or deleted since are then rebuilt from the table.
+    """
+    written = 0
+    async with db.connection() as conn:
+        locked = await conn.fetch_val("SELECT pg_try_advisory_lock(:key)", {"key": _LOCK_KEY})
+        if not locked:
+            return 0
+        try:
+            # Not past rows of transactions that are still open (see visible_until)
+            now = await visible_until(settings.PIPELINE_COMMIT_GRACE_SEC)
+            after = await get_watermark(WATERMARK_NAME)
+            if after is None:
+                # First run: rebuild today up to the bound; earlier days via backfill
+                today = await conn.fetch_val(
+                    "SELECT (NOW() AT TIME ZONE :tz)::date", {"tz": settings.AGGREGATES_TIMEZONE}
+                )
+                async with db.transaction():
+                    await set_watermark(WATERMARK_NAME, now)
+                return await _rebuild_day(today, now)
+            window = timedelta(hours=settings.AGGREGATES_MAX_WINDOW_HOURS)
+            while after < now:
+                until = min(now, after + window)
+                async with db.transaction():
+                    groups = _groups(await grouped_values_between(after, until, settings.AGGREGATES_TIMEZONE))
+                    if groups:
+                        await lock_days([k[2] for k in groups])
+                        written += await _fold(groups)
+                    await set_watermark(WATERMARK_NAME, until)
+                after = until
+            written += await _rebuild_dirty_days()
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(:key)", {"key": _LOCK_KEY})
+    if written:
+        logger.info({"kind": "aggregates_incremental", "rows": written})
+    return written
+
+
+_wake: Optional[asyncio.Event] = None
+
+
+def _on_deals_changed(channel: str, payload: str) -> None:
+    if _wake is not None:
+        _wake.set()
+
+
+listener.subscribe(DEALS_CHANNEL, _on_deals_changed)
+
+
+def start_aggregates_task() -> Optional[asyncio.Task]:
+    global _wake
+    if not settings.AGGREGATES_ENABLED:
+        return None
+    _wake = asyncio.Event()
+    wake = _wake
+
+    async def _loop() -> None:
+        while True:
+            wake.clear()
+            try:
+                await build_incremental()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error({"kind": "aggregates_error", "error": repr(e)})
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=settings.AGGREGATES_INTERVAL_SEC)
+                await asyncio.sleep(settings.AGGREGATES_DEBOUNCE_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+    return asyncio.create_task(_loop())
+
+
+async def stop_aggregates_task(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def _main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Daily aggregates builder")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("incremental", help="fold new deals since the watermark")
+    bf = sub.add_parser("backfill", help="rebuild a date range from scratch")
+    bf.add_argument("date_from", type=date.fromisoformat)
+    bf.add_argument("date_to", type=date.fromisoformat)
+    bf.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    await db.connect()
+    try:
+        if args.cmd == "backfill":
+            rows = await backfill(args.date_from, args.date_to, args.concurrency)
+        else:
+            rows = await build_incremental()
+        print(f"{args.cmd}: {rows} aggregate rows written")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,17 +1,107 @@
 import asyncio
 import json
+import os
+import random
+import socket
+import uuid
+from dataclasses import dataclass
+from typing import Optional
 from app.core.config import settings
-from app.db.session import db
-from app.services.push_service import send_webpush
+from app.core.logsink import get_sink_logger
+from app.core.metrics import registry, timed_query
+from app.db.session import db, background_job
+from app.db.notify import listener, ALERTS_CHANNEL
+from app.repos.push_repo import delete_subscriptions
+from app.services.push_service import PushItem, deliver_batch, PERMANENT_FAILURE_STATUSES
+
+logger = get_sink_logger("alerts.dispatch")
 
 _RUN = True
 
+# Identifies this process in alert_events.claimed_by
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class DispatchStats:
+    # Cumulative dispatcher counters for this process
+    def __init__(self) -> None:
+        self.batches = 0
+        self.sent = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.subscriptions_pruned = 0
+        self.wakeups_notify = 0
+        self.wakeups_timer = 0
+        self.lag_count = 0
+        self.lag_sum_sec = 0.0
+        self.lag_max_sec = 0.0
+        self.last_lag_sec = 0.0
+
+    def observe_lag(self, lag_sec: float) -> None:
+        self.lag_count += 1
+        self.lag_sum_sec += lag_sec
+        self.last_lag_sec = lag_sec
+        if lag_sec > self.lag_max_sec:
+            self.lag_max_sec = lag_sec
+
+
+stats = DispatchStats()
+
+BATCH_SIZE = registry.histogram(
+    "alerts_dispatch_batch_size", "Subscription rows per dispatched batch",
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+BATCH_RATE = registry.gauge("alerts_dispatch_last_batch_per_second", "Push sends per second in the last batch")
+PUSH_RESULTS = registry.counter("alerts_push_results_total", "Push attempts by HTTP status (ok/error without one)", ["status"])
+DISPATCH_LAG = registry.histogram(
+    "alerts_dispatch_lag_seconds", "alert_events enqueue-to-send lag",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+# Set by alert_events INSERT notifications (sql/notify.sql)
+_wake: Optional[asyncio.Event] = None
+
+
+def _on_alert_event(channel: str, payload: str) -> None:
+    if _wake is not None:
+        _wake.set()
+
+
+listener.subscribe(ALERTS_CHANNEL, _on_alert_event)
+
 
 async def start_polling_task():
+    """Start the dispatcher loop.
+
+    It wakes on alert_events notifications (debounced by ALERT_DEBOUNCE_MS so
+    a burst of inserts becomes one batch). POLL_INTERVAL_SEC stays as a safety
+    net for missed notifications and lease expiry.
+    """
+    global _wake, _RUN
+    _RUN = True
+    _wake = asyncio.Event()
+    wake = _wake
+
     async def _loop():
         while _RUN:
-            await dispatch_pending_alerts()
-            await asyncio.sleep(settings.POLL_INTERVAL_SEC)
+            # Cleared before dispatching so inserts during the batch trigger another pass
+            wake.clear()
+            try:
+                claimed = await dispatch_pending_alerts()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                claimed = 0
+                logger.error({"kind": "dispatch_error", "error": repr(e)})
+            if claimed >= settings.POLL_BATCH_SIZE:
+                # Backlog: keep draining without waiting
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=settings.POLL_INTERVAL_SEC)
+                stats.wakeups_notify += 1
+                await asyncio.sleep(settings.ALERT_DEBOUNCE_MS / 1000)
+            except asyncio.TimeoutError:
+                stats.wakeups_timer += 1
 
     return asyncio.create_task(_loop())
 
@@ -20,23 +110,164 @@ async def stop_polling_task(task):
     global _RUN
     _RUN = False
     task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
 
 
-async def dispatch_pending_alerts():
+@timed_query
+async def claim_pending_alerts(limit: int) -> list:
+    """Lease up to ``limit`` due events for this worker, one row per subscription.
+
+    SKIP LOCKED lets concurrent dispatchers claim disjoint sets; the lease
+    (claimed_at) hands rows of a crashed worker back after ALERT_CLAIM_LEASE_SEC.
+    Events in backoff (next_attempt_at in the future) or dead-lettered are skipped.
+    """
+    return await db.fetch_all(
+        """
+        WITH claimed AS (
+            UPDATE alert_events ae
+               SET claimed_at = NOW(), claimed_by = :worker
+             WHERE ae.id IN (
+                   SELECT p.id
+                     FROM alert_events p
+                    WHERE p.sent_at IS NULL
+                      AND p.dead_at IS NULL
+                      AND p.next_attempt_at <= NOW()
+                      AND (p.claimed_at IS NULL OR p.claimed_at < NOW() - make_interval(secs => :lease))
+                      AND EXISTS (SELECT 1 FROM push_subscriptions s WHERE s.user_id = p.user_id)
+                    ORDER BY p.next_attempt_at ASC, p.id ASC
+                    LIMIT :N
+                      FOR UPDATE SKIP LOCKED
+                   )
+            RETURNING ae.id, ae.user_id, ae.deal_id, ae.attempts
+        )
+        SELECT c.id, c.user_id, c.deal_id, c.attempts, s.endpoint, s.p256dh, s.auth
+          FROM claimed c
+          JOIN push_subscriptions s ON s.user_id = c.user_id
+         ORDER BY c.id ASC
+        """,
+        {"worker": WORKER_ID, "lease": float(settings.ALERT_CLAIM_LEASE_SEC), "N": limit},
+    )
+
+
+@dataclass
+class AlertOutcome:
+    id: int
+    attempts: int  # attempts made before this one
+    ok: bool = False
+    # every subscription of the user returned 404/410 (and was pruned)
+    all_gone: bool = True
+    error: Optional[str] = None
+
+    @property
+    def dead(self) -> bool:
+        return not self.ok and (self.all_gone or self.attempts + 1 >= settings.MAX_RETRY_PUSH)
+
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with jitter in [d/2, d] so retries of one burst spread out
+    d = min(settings.PUSH_RETRY_MAX_SEC, settings.PUSH_RETRY_BASE_SEC * (2 ** max(0, attempts - 1)))
+    return d / 2 + random.uniform(0, d / 2)
+
+
+@timed_query
+async def ack_alerts(outcomes: list[AlertOutcome]) -> list[float]:
+    """One statement per batch for successes, retries and dead letters.
+
+    Returns the enqueue-to-send lag (seconds, DB clock) of each event marked sent.
+    """
+    if not outcomes:
+        return []
     rows = await db.fetch_all(
         """
-        SELECT ae.id, ae.user_id, ae.deal_id, s.endpoint, s.p256dh, s.auth
-          FROM alert_events ae
-          JOIN push_subscriptions s ON s.user_id = ae.user_id
-         WHERE ae.sent_at IS NULL
-         ORDER BY ae.id ASC
-         LIMIT :N
+        UPDATE alert_events ae
+           SET sent_at = CASE WHEN r.ok THEN NOW() ELSE ae.sent_at END,
+               attempts = ae.attempts + 1,
+               next_attempt_at = CASE WHEN r.ok OR r.dead THEN ae.next_attempt_at
+                                      ELSE NOW() + make_interval(secs => r.delay) END,
+               dead_at = CASE WHEN r.dead THEN NOW() ELSE NULL END,
+               last_error = r.error,
+               claimed_at = NULL,
+               claimed_by = NULL
+          FROM unnest(
+                 CAST(:ids AS bigint[]),
+                 CAST(:oks AS boolean[]),
+                 CAST(:deads AS boolean[]),
+                 CAST(:delays AS double precision[]),
+                 CAST(:errors AS text[])
+               ) AS r(id, ok, dead, delay, error)
+         WHERE ae.id = r.id
+           AND ae.claimed_by = :worker
+        RETURNING r.ok, EXTRACT(EPOCH FROM (NOW() - ae.created_at)) AS lag_sec
         """,
-        {"N": settings.POLL_BATCH_SIZE},
+        {
+            "ids": [o.id for o in outcomes],
+            "oks": [o.ok for o in outcomes],
+            "deads": [o.dead for o in outcomes],
+            "delays": [retry_delay(o.attempts + 1) for o in outcomes],
+            "errors": [None if o.ok else (o.error or "send failed")[:500] for o in outcomes],
+            "worker": WORKER_ID,
+        },
     )
-    for r in rows:
-        payload = json.dumps({"type": "deal_alert", "deal_id": r["deal_id"]})
-        ok = await send_webpush(r["endpoint"], r["p256dh"], r["auth"], payload)
-        if ok:
-            await db.execute("UPDATE alert_events SET sent_at = NOW() WHERE id = :id", {"id": r["id"]})
+    return [float(r["lag_sec"]) for r in rows if r["ok"] and r["lag_sec"] is not None]
+
+
+@background_job
+async def dispatch_pending_alerts() -> int:
+    # Returns the number of claimed subscription rows (0 when the queue is empty)
+    rows = await claim_pending_alerts(settings.POLL_BATCH_SIZE)
+    if not rows:
+        return 0
+    items = [
+        PushItem(
+            endpoint=r["endpoint"],
+            p256dh=r["p256dh"],
+            auth=r["auth"],
+            payload=json.dumps({"type": "deal_alert", "deal_id": r["deal_id"]}),
+        )
+        for r in rows
+    ]
+    # All sends run concurrently off the event loop
+    results, report = await deliver_batch(items)
+
+    # An event counts as sent when any of the user's subscriptions accepted it
+    outcomes: dict[int, AlertOutcome] = {}
+    gone: list[str] = []
+    for r, res in zip(rows, results):
+        o = outcomes.get(r["id"])
+        if o is None:
+            o = outcomes[r["id"]] = AlertOutcome(id=r["id"], attempts=r["attempts"])
+        o.ok = o.ok or res.ok
+        if res.status in PERMANENT_FAILURE_STATUSES:
+            gone.append(r["endpoint"])
+        else:
+            o.all_gone = False
+        if not res.ok:
+            o.error = f"{res.status or ''} {res.error or ''}".strip()
 
+    pruned = await delete_subscriptions(gone) if gone else 0
+    lags = await ack_alerts(list(outcomes.values()))
+    for lag in lags:
+        stats.observe_lag(lag)
+        DISPATCH_LAG.observe(lag)
+    BATCH_SIZE.observe(len(rows))
+    BATCH_RATE.set(report.per_sec)
+    for status, count in report.by_status.items():
+        PUSH_RESULTS.inc(status, amount=count)
+    stats.batches += 1
+    stats.sent += sum(1 for o in outcomes.values() if o.ok)
+    stats.failed += sum(1 for o in outcomes.values() if not o.ok)
+    stats.dead_lettered += sum(1 for o in outcomes.values() if o.dead)
+    stats.subscriptions_pruned += pruned
+    logger.info({
+        "kind": "dispatch",
+        "worker": WORKER_ID,
+        "events": len(outcomes),
+        "dead_lettered": sum(1 for o in outcomes.values() if o.dead),
+        "subscriptions_pruned": pruned,
+        "lag_max_sec": round(max(lags), 3) if lags else None,
+        **report.as_dict(),
+    })
+    return len(rows)
@@ -0,0 +1,425 @@
+import asyncio
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.logsink import get_sink_logger
+from app.db.session import db, background_job
+from app.db.notify import listener, DEALS_CHANNEL, RULES_CHANNEL
+from app.repos.alert_repo import insert_alert_events, last_fired_by_rule
+from app.repos.deal_repo import list_deals_parsed_between, min_tco_by_model
+from app.repos.pipeline_repo import get_watermark_key, set_watermark, visible_until
+from app.repos.report_repo import latest_medians
+from app.repos.rule_repo import get_rule, list_enabled_rules
+
+logger = get_sink_logger("alerts.rules")
+
+WATERMARK_NAME = "rule_engine"
+# pg_advisory_lock key: one matcher at a time across workers/replicas
+_LOCK_KEY = 0x5353_0002
+
+# deal field -> key inside rules.filters
+INDEXED_FIELDS = {
+    "model": "models",
+    "carrier": "carriers",
+    "channel": "channels",
+    "city": "city",
+}
+# thresholds keys consumed by specific rule types, not generic <field>_min/_max bounds
+_TYPE_THRESHOLD_KEYS = {"drop_pct_min", "discount_pct_min", "scope"}
+_BOUNDED_FIELDS = {"upfront", "tco_total", "tco_net"}
+
+
+def _num(v: Any) -> Optional[float]:
+    if v is None:
+        return None
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (int, float)):
+        return float(v)
+    return None
+
+
+def _tco_rank(deal: dict[str, Any]) -> float:
+    # Unpriced deals (STRICT_MATCH accepts them) lose to any priced one
+    tco = _num(deal.get("tco_total"))
+    return math.inf if tco is None else tco
+
+
+def _threshold(rule: "CompiledRule", key: str, default: float) -> float:
+    # An explicit 0 is a valid threshold, only a missing one takes the default
+    value = _num(rule.thresholds.get(key))
+    return default if value is None else value
+
+
+@dataclass
+class CompiledRule:
+    id: int
+    user_id: str
+    type: str
+    cooldown_hours: int
+    constraints: dict[str, Any]
+    thresholds: dict[str, Any]
+    # indexed field -> allowed values; missing field means "any"
+    filters: dict[str, frozenset] = field(default_factory=dict)
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "CompiledRule":
+        raw_filters = row.get("filters") or {}
+        filters: dict[str, frozenset] = {}
+        for deal_field, key in INDEXED_FIELDS.items():
+            value = raw_filters.get(key)
+            if value is None or value == [] or value == "":
+                continue
+            values = value if isinstance(value, list) else [value]
+            filters[deal_field] = frozenset(values)
+        cooldown = row.get("cooldown_hours")
+        if cooldown is None:
+            cooldown = 3
+        if row.get("frequency") == "daily":
+            cooldown = max(cooldown, 24)
+        return cls(
+            id=int(row["id"]),
+            user_id=str(row["user_id"]),
+            type=str(row["type"]),
+            cooldown_hours=int(cooldown),
+            constraints=dict(row.get("constraints") or {}),
+            thresholds=dict(row.get("thresholds") or {}),
+            filters=filters,
+        )
+
+
+class RuleIndex:
+    """Enabled rules in inverted indexes keyed by model, carrier, channel and city.
+
+    A deal's candidate rules are the intersection, over the indexed fields,
+    of (rules listing the deal's value) and (rules with no filter on that
+    field), so each deal is checked only against rules that can match it.
+    """
+
+    def __init__(self) -> None:
+        self.rules: dict[int, CompiledRule] = {}
+        self._index: dict[str, dict[Any, set[int]]] = {f: {} for f in INDEXED_FIELDS}
+        self._wildcard: dict[str, set[int]] = {f: set() for f in INDEXED_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def add(self, rule: CompiledRule) -> None:
+        self.remove(rule.id)
+        self.rules[rule.id] = rule
+        for f in INDEXED_FIELDS:
+            values = rule.filters.get(f)
+            if values is None:
+                self._wildcard[f].add(rule.id)
+            else:
+                for v in values:
+                    self._index[f].setdefault(v, set()).add(rule.id)
+
+    def remove(self, rule_id: int) -> None:
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return
+        for f in INDEXED_FIELDS:
+            values = rule.filters.get(f)
+            if values is None:
+                self._wildcard[f].discard(rule_id)
+                continue
+            for v in values:
+                bucket = self._index[f].get(v)
+                if bucket is not None:
+                    bucket.discard(rule_id)
+                    if not bucket:
+                        del self._index[f][v]
+
+    def upsert_row(self, row: Optional[dict[str, Any]], rule_id: int) -> None:
+        # Deleted or disabled rules leave the index
+        if row is None or not row.get("enabled", True):
+            self.remove(rule_id)
+        else:
+            self.add(CompiledRule.from_row(row))
+
+    def candidates(self, deal: dict[str, Any]) -> set[int]:
+        sets = []
+        for f in INDEXED_FIELDS:
+            exact = self._index[f].get(deal.get(f))
+            wild = self._wildcard[f]
+            sets.append((exact | wild) if exact else wild)
+        sets.sort(key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            if not result:
+                break
+            result &= s
+        return result
+
+
+@dataclass
+class BatchContext:
+    # Baselines computed once per batch, only for the rule types present
+    prior_min_by_model: dict[str, Optional[float]] = field(default_factory=dict)
+    global_prior_min: Optional[float] = None
+    median_by_key: dict[tuple[str, Optional[str]], Optional[float]] = field(default_factory=dict)
+
+
+def _passes_generic(rule: CompiledRule, deal: dict[str, Any]) -> bool:
+    # constraints: exact value (or list of values) on deal fields
+    for key, want in rule.constraints.items():
+        have = deal.get(key)
+        if isinstance(want, list):
+            if want and have not in want:
+                return False
+        elif want is not None and have != want:
+            return False
+    # thresholds: <field>_max / <field>_min bounds on numeric deal fields
+    for key, bound in rule.thresholds.items():
+        if key in _TYPE_THRESHOLD_KEYS or bound is None:
+            continue
+        name, _, kind = key.rpartition("_")
+        if name not in _BOUNDED_FIELDS or kind not in ("max", "min"):
+            continue
+        v = _num(deal.get(name))
+        b = _num(bound)
+        if v is None or b is None:
+            return False
+        if (kind == "max" and v > b) or (kind == "min" and v < b):
+            return False
+    return True
+
+
+def evaluate(rule: CompiledRule, deal: dict[str, Any], ctx: BatchContext) -> bool:
+    if not _passes_generic(rule, deal):
+        return False
+    tco = _num(deal.get("tco_total"))
+    if rule.type == "STRICT_MATCH":
+        return True
+    if tco is None:
+        return False
+    if rule.type == "CHEAPEST":
+        # Cheaper than anything seen before this batch
+        if rule.thresholds.get("scope") == "global":
+            prior = ctx.global_prior_min
+        else:
+            prior = ctx.prior_min_by_model.get(deal.get("model"))
+        return prior is None or tco < prior
+    if rule.type == "BIG_DROP":
+        # Below the latest daily median for the same model/capacity
+        median = ctx.median_by_key.get((deal.get("model"), deal.get("capacity")))
+        if not median:
+            return False
+        pct_min = _threshold(rule, "drop_pct_min", 10.0)
+        return (median - tco) / median * 100 >= pct_min
+    if rule.type == "BEST_DISCOUNT":
+        # Share of the total cost covered by support (tco_total - tco_net)
+        net = _num(deal.get("tco_net"))
+        if net is None or tco <= 0:
+            return False
+        pct_min = _threshold(rule, "discount_pct_min", 20.0)
+        return (tco - net) / tco * 100 >= pct_min
+    return False
+
+
+async def _build_context(rule_types: set[str], deals: list[dict[str, Any]], before: datetime) -> BatchContext:
+    ctx = BatchContext()
+    models = sorted({d["model"] for d in deals if d.get("model")})
+    if "CHEAPEST" in rule_types:
+        mins = await min_tco_by_model(models, before)
+        ctx.prior_min_by_model = {m: _num(v) for m, v in mins.items()}
+        known = [v for v in ctx.prior_min_by_model.values() if v is not None]
+        ctx.global_prior_min = min(known) if known else None
+    if "BIG_DROP" in rule_types:
+        medians = await latest_medians(models)
+        ctx.median_by_key = {k: _num(v) for k, v in medians.items()}
+    return ctx
+
+
+class RuleEngine:
+    def __init__(self) -> None:
+        self.index = RuleIndex()
+        self.loaded = False
+        self.deals_seen = 0
+        self.candidates_checked = 0
+        self.events_created = 0
+
+    @background_job
+    async def load(self) -> None:
+        index = RuleIndex()
+        for row in await list_enabled_rules():
+            index.add(CompiledRule.from_row(row))
+        self.index = index
+        self.loaded = True
+
+    @background_job
+    async def refresh_rule(self, rule_id: int) -> None:
+        self.index.upsert_row(await get_rule(rule_id), rule_id)
+
+    def remove_rule(self, rule_id: int) -> None:
+        self.index.remove(rule_id)
+
+    async def match(self, deals: list[dict[str, Any]], before: datetime) -> list[tuple[str, Any, int]]:
+        """Return (user_id, deal_id, rule_id) events for ``deals``.
+
+        At most one event per rule per batch (its cheapest matching deal), and
+        none for rules still inside their cooldown.
+        """
+        per_deal = [(d, self.index.candidates(d)) for d in deals]
+        rule_ids = set().union(*(c for _, c in per_deal)) if per_deal else set()
+        if not rule_ids:
+            return []
+        rules = self.index.rules
+        ctx = await _build_context({rules[r].type for r in rule_ids if r in rules}, deals, before)
+
+        best: dict[int, dict[str, Any]] = {}
+        for deal, cands in per_deal:
+            for rid in cands:
+                rule = rules.get(rid)
+                if rule is None:
+                    continue
+                self.candidates_checked += 1
+                if not evaluate(rule, deal, ctx):
+                    continue
+                cur = best.get(rid)
+                if cur is None or _tco_rank(deal) < _tco_rank(cur):
+                    best[rid] = deal
+        if not best:
+            return []
+
+        max_cooldown = max(rules[r].cooldown_hours for r in best)
+        last = await last_fired_by_rule(list(best), max(1, max_cooldown))
+        now = datetime.now(timezone.utc)
+        events = []
+        for rid, deal in best.items():
+            fired = last.get(rid)
+            if fired is not None and now - fired < timedelta(hours=rules[rid].cooldown_hours):
+                continue
+            events.append((rules[rid].user_id, deal["id"], rid))
+        return events
+
+    @background_job
+    async def process_new_deals(self) -> int:
+        """Match deals parsed since the watermark and insert their events.
+
+        Runs under an advisory lock so only one worker matches at a time; the
+        inserts and the watermark move commit together.
+        """
+        if not self.loaded:
+            await self.load()
+        created = 0
+        async with db.connection() as conn:
+            locked = await conn.fetch_val("SELECT pg_try_advisory_lock(:key)", {"key": _LOCK_KEY})
+            if not locked:
+                return 0
+            try:
+                until = await visible_until(settings.PIPELINE_COMMIT_GRACE_SEC)
+                mark = await get_watermark_key(WATERMARK_NAME)
+                if mark is None:
+                    # First run: start from now rather than alerting on history
+                    await set_watermark(WATERMARK_NAME, until)
+                    return 0
+                # Keyset watermark: rows sharing one parsed_at (a bulk insert)
+                # can span batches without any being skipped
+                after, after_id = mark
+                while True:
+                    deals = await list_deals_parsed_between(
+                        after, after_id, until, settings.RULE_ENGINE_BATCH_SIZE
+                    )
+                    if not deals:
+                        break
+                    full = len(deals) >= settings.RULE_ENGINE_BATCH_SIZE
+                    last = deals[-1]
+                    self.deals_seen += len(deals)
+                    events = await self.match(deals, after)
+                    async with db.transaction():
+                        created += await insert_alert_events(events, after, last["parsed_at"])
+                        await set_watermark(WATERMARK_NAME, last["parsed_at"], last["id"])
+                    after, after_id = last["parsed_at"], last["id"]
+                    if not full:
+                        break
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(:key)", {"key": _LOCK_KEY})
+        self.events_created += created
+        if created:
+            logger.info({"kind": "rule_events", "created": created, "rules": len(self.index)})
+        return created
+
+
+engine = RuleEngine()
+
+_wake: Optional[asyncio.Event] = None
+# Index reloads started from notifications; referenced until done so they
+# cannot be garbage-collected mid-run
+_refreshes: set[asyncio.Task] = set()
+
+
+def _refresh_done(task: asyncio.Task) -> None:
+    _refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error({"kind": "rule_refresh_error", "error": repr(task.exception())})
+
+
+def _spawn_refresh(coro: Any) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _refreshes.add(task)
+    task.add_done_callback(_refresh_done)
+
+
+def _on_deals_changed(channel: str, payload: str) -> None:
+    if _wake is not None:
+        _wake.set()
+
+
+def _on_rule_changed(channel: str, payload: str) -> None:
+    # Another worker (or this one) changed a rule; re-read just that row
+    if not payload:
+        _spawn_refresh(engine.load())
+        return
+    try:
+        rule_id = int(payload)
+    except ValueError:
+        return
+    _spawn_refresh(engine.refresh_rule(rule_id))
+
+
+listener.subscribe(DEALS_CHANNEL, _on_deals_changed)
+listener.subscribe(RULES_CHANNEL, _on_rule_changed)
+
+
+def start_rule_engine_task() -> Optional[asyncio.Task]:
+    global _wake
+    if not settings.RULE_ENGINE_ENABLED:
+        return None
+    _wake = asyncio.Event()
+    wake = _wake
+
+    async def _loop() -> None:
+        while True:
+            wake.clear()
+            try:
+                await engine.process_new_deals()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error({"kind": "rule_engine_error", "error": repr(e)})
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=settings.RULE_ENGINE_INTERVAL_SEC)
+                await asyncio.sleep(settings.RULE_ENGINE_DEBOUNCE_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+    return asyncio.create_task(_loop())
+
+
+async def stop_rule_engine_task(task: Optional[asyncio.Task]) -> None:
+    for refresh in list(_refreshes):
+        refresh.cancel()
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.db.session import db, background_job
+from app.db.notify import listener, AGGREGATES_CHANNEL
+from app.repos.report_repo import report_cache
+
+logger = logging.getLogger("reports.snapshot")
+
+SNAPSHOT_VIEW = "api_reports_daily_latest_mv"
+# pg_advisory_lock key: only one worker/replica refreshes at a time
+_LOCK_KEY = 0x5353_0001
+# Fingerprint of the snapshot, compared around the REFRESH
+_CHECKSUM_SQL = f"""
+SELECT md5(COALESCE(string_agg(report::text, ',' ORDER BY model, capacity_key, capacity_unknown), ''))
+FROM {SNAPSHOT_VIEW}
+"""
+
+_dirty: Optional[asyncio.Event] = None
+
+
+def _on_aggregates_changed(channel: str, payload: str) -> None:
+    # Our own post-refresh notification must not schedule another refresh
+    if payload == SNAPSHOT_VIEW or _dirty is None:
+        return
+    _dirty.set()
+
+
+listener.subscribe(AGGREGATES_CHANNEL, _on_aggregates_changed)
+
+
+@background_job
+async def refresh_latest_reports_snapshot() -> bool:
+    """REFRESH the latest-report snapshot without blocking readers.
+
+    Returns False when another worker holds the refresh lock. When the
+    snapshot changed, its version is bumped and every worker's report cache is
+    cleared through the aggregates channel; an unchanged snapshot (most timer
+    refreshes) keeps its ETag.
+    """
+    async with db.connection() as conn:
+        locked = await conn.fetch_val("SELECT pg_try_advisory_lock(:key)", {"key": _LOCK_KEY})
+        if not locked:
+            return False
+        try:
+            before = await conn.fetch_val(_CHECKSUM_SQL)
+            await conn.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SNAPSHOT_VIEW}")
+            if await conn.fetch_val(_CHECKSUM_SQL) == before:
+                return True
+            # New ETag for /reports/daily/latest; before the NOTIFY so caches reload it
+            await conn.execute(
+                """
+                INSERT INTO api_data_versions AS v (name, version, changed_at)
+                VALUES (:name, 1, NOW())
+                ON CONFLICT (name) DO UPDATE SET version = v.version + 1, changed_at = NOW()
+                """,
+                {"name": SNAPSHOT_VIEW},
+            )
+            await conn.execute(
+                "SELECT pg_notify(:channel, :payload)",
+                {"channel": AGGREGATES_CHANNEL, "payload": SNAPSHOT_VIEW},
+            )
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(:key)", {"key": _LOCK_KEY})
+    # Cover the case where the LISTEN connection is down
+    report_cache.clear()
+    return True
+
+
+async def _loop() -> None:
+    assert _dirty is not None
+    while True:
+        try:
+            # Wake on aggregates_daily writes; the timeout is the safety net
+            await asyncio.wait_for(_dirty.wait(), timeout=settings.REPORTS_SNAPSHOT_REFRESH_SEC)
+            await asyncio.sleep(settings.REPORTS_SNAPSHOT_DEBOUNCE_SEC)
+        except asyncio.TimeoutError:
+            pass
+        _dirty.clear()
+        try:
+            await refresh_latest_reports_snapshot()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("latest reports snapshot refresh failed")
+
+
+def start_snapshot_task() -> Optional[asyncio.Task]:
+    global _dirty
+    if not settings.REPORTS_SNAPSHOT_ENABLED:
+        return None
+    _dirty = asyncio.Event()
+    return asyncio.create_task(_loop())
+
+
+async def stop_snapshot_task(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+
+# Cost inputs read from `deals`, in the order they are stacked into arrays
+TCO_COLUMNS = (
+    "upfront",
+    "plan_high_fee",
+    "plan_high_months",
+    "plan_after_fee",
+    "plan_after_months",
+    "mvno_tail_fee",
+    "mvno_tail_months",
+    "addons_monthly",
+    "addons_months",
+    "device_finance_total",
+    "device_finance_months",
+    "device_finance_monthly",
+    "cash_delta",
+    "tco_total",
+    "tco_net",
+)
+
+# Horizon used when a deal lists no plan months (matches tco_monthly_24m)
+DEFAULT_HORIZON_MONTHS = 24
+
+
+@dataclass
+class DealArrays:
+    """Column-oriented view of a batch of deals: one float64 array per field, NaN for NULL."""
+
+    ids: list[Any]
+    cols: dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Any]) -> "DealArrays":
+        n = len(rows)
+        cols = {
+            name: np.fromiter(
+                (np.nan if r[name] is None else float(r[name]) for r in rows), dtype=np.float64, count=n
+            )
+            for name in TCO_COLUMNS
+        }
+        return cls(
+            ids=[r["id"] for r in rows],
+            cols=cols,
+        )
+
+
+def _z(a: np.ndarray) -> np.ndarray:
+    return np.nan_to_num(a, nan=0.0)
+
+
+def support_cash(arr: DealArrays) -> np.ndarray:
+    # Same rule as api_deal_public_json: a negative cash_delta is cash back to the buyer
+    cd = arr.cols["cash_delta"]
+    return np.where(cd < 0, np.trunc(np.abs(cd)), 0.0)
+
+
+def compute_tco(arr: DealArrays) -> tuple[np.ndarray, np.ndarray]:
+    """Recompute (tco_total, tco_net) for every deal at once.
+
+    tco_total = upfront + plan_high + plan_after + mvno_tail + addons + device
+    finance, each segment fee × months; device finance falls back to
+    monthly × months when no total is stored. tco_net subtracts support_cash.
+    """
+    c = arr.cols
+    device = np.where(
+        np.isnan(c["device_finance_total"]),
+        _z(c["device_finance_monthly"]) * _z(c["device_finance_months"]),
+        c["device_finance_total"],
+    )
+    total = (
+        _z(c["upfront"])
+        + _z(c["plan_high_fee"]) * _z(c["plan_high_months"])
+        + _z(c["plan_after_fee"]) * _z(c["plan_after_months"])
+        + _z(c["mvno_tail_fee"]) * _z(c["mvno_tail_months"])
+        + _z(c["addons_monthly"]) * _z(c["addons_months"])
+        + _z(device)
+    )
+    net = total - support_cash(arr)
+    return total, net
+
+
+def effective_tco(arr: DealArrays) -> tuple[np.ndarray, np.ndarray]:
+    # Stored values win (the parser may know more); computed ones fill the NULLs
+    total, net = compute_tco(arr)
+    stored_total = arr.cols["tco_total"]
+    stored_net = arr.cols["tco_net"]
+    total = np.where(np.isnan(stored_total), total, stored_total)
+    net = np.where(np.isnan(stored_net), total - support_cash(arr), stored_net)
+    return total, net
+
+
+def horizon_months(arr: DealArrays) -> np.ndarray:
+    c = arr.cols
+    months = _z(c["plan_high_months"]) + _z(c["plan_after_months"]) + _z(c["mvno_tail_months"])
+    return np.where(months > 0, months, DEFAULT_HORIZON_MONTHS)
+
+
+def mvno_tail_surcharge(arr: DealArrays) -> np.ndarray:
+    """Extra cost of a deal's MVNO tail for a user who will not move to an MVNO.
+
+    They stay on the carrier's plan_after_fee for those months instead; 0 for
+    deals without a tail or without both fees.
+    """
+    c = arr.cols
+    extra = (c["plan_after_fee"] - c["mvno_tail_fee"]) * _z(c["mvno_tail_months"])
+    return _z(extra)
+
+
+@dataclass
+class Ranking:
+    index: np.ndarray  # row positions into the DealArrays, best first
+    tco_total: np.ndarray
+    tco_net: np.ndarray
+    savings_total: np.ndarray
+    savings_monthly: np.ndarray
+
+
+def rank_by_savings(
+    arr: DealArrays,
+    current_plan_fee: Optional[int],
+    addons_monthly: Optional[int],
+    mvno_ok: bool = True,
+    limit: int = 20,
+) -> Ranking:
+    """Order deals by what the user saves versus staying on their current plan.
+
+    Staying costs (current_plan_fee + addons_monthly) × the deal's horizon;
+    the deal costs its tco_net over the same months, plus mvno_tail_surcharge
+    unless the user is fine with an MVNO (``mvno_ok``). Savings can be
+    negative (the device is not free); the order is still best-to-worst.
+    Channel/city eligibility is left to the candidate query.
+    """
+    total, net = effective_tco(arr)
+    if not mvno_ok:
+        extra = mvno_tail_surcharge(arr)
+        total, net = total + extra, net + extra
+    months = horizon_months(arr)
+    current_monthly = float(current_plan_fee or 0) + float(addons_monthly or 0)
+    savings = current_monthly * months - net
+    savings_monthly = savings / months
+
+    candidates = np.arange(len(arr))
+    if candidates.size == 0 or limit <= 0:
+        empty = np.empty(0)
+        return Ranking(np.empty(0, dtype=np.intp), empty, empty, empty, empty)
+    # Partial selection first, then a stable sort of just the top slice
+    if candidates.size > limit:
+        top = np.argpartition(-savings_monthly[candidates], limit - 1)[:limit]
+        candidates = candidates[top]
+    order = candidates[np.argsort(-savings_monthly[candidates], kind="stable")]
+    return Ranking(
+        index=order,
+        tco_total=total[order],
+        tco_net=net[order],
+        savings_total=savings[order],
+        savings_monthly=savings_monthly[order],
+    )
@@ -0,0 +1,91 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Sequence
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+@dataclass
+class Validators:
+    """ETag/Last-Modified/Cache-Control for one representation of a read route."""
+
+    etag: Optional[str]
+    last_modified: Optional[datetime]
+    cache_control: Optional[str]
+
+    def headers(self) -> dict[str, str]:
+        out: dict[str, str] = {}
+        if self.etag is not None:
+            out["ETag"] = self.etag
+        if self.last_modified is not None:
+            out["Last-Modified"] = format_datetime(self.last_modified.astimezone(timezone.utc), usegmt=True)
+        if self.cache_control:
+            out["Cache-Control"] = self.cache_control
+        return out
+
+    def matches(self, request: Request) -> bool:
+        """True when the client's copy is current (RFC 9110 §13.2.2 precedence).
+
+        If-None-Match wins over If-Modified-Since; weak comparison is used, as
+        GET/HEAD allow.
+        """
+        inm = request.headers.get("if-none-match")
+        if inm is not None and self.etag is not None:
+            if inm.strip() == "*":
+                return True
+            mine = _opaque(self.etag)
+            return any(_opaque(tag) == mine for tag in inm.split(","))
+        ims = request.headers.get("if-modified-since")
+        if ims and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(ims)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            # HTTP dates have whole-second precision
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+
+# Content codings the compression middleware appends to ETags ("abc" -> "abc-gzip")
+ETAG_ENCODING_SUFFIXES = ("-gzip", "-br", "-zstd")
+
+
+def _opaque(tag: str) -> str:
+    # Bare opaque value: weak prefix, quotes and any content-coding suffix removed,
+    # so a client holding the compressed variant still revalidates
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ETAG_ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)]
+    return tag
+
+
+def make_validators(
+    request: Request,
+    versions: Sequence[Optional[tuple[int, datetime]]],
+    cache_control: Optional[str] = None,
+) -> Validators:
+    """Strong ETag for this path + query string at the given data versions.
+
+    ``versions`` are (counter, changed_at) pairs from api_data_versions. If any
+    is unknown only Cache-Control is sent and requests are never answered 304.
+    """
+    if not versions or any(v is None for v in versions):
+        return Validators(etag=None, last_modified=None, cache_control=cache_control)
+    # Sorted query items so ?a=1&b=2 and ?b=2&a=1 share a tag
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    stamp = ",".join(str(v[0]) for v in versions)  # type: ignore[index]
+    digest = hashlib.blake2b(f"{request.url.path}?{query}|{stamp}".encode("utf-8"), digest_size=12).hexdigest()
+    last_modified = max(v[1] for v in versions)  # type: ignore[index]
+    return Validators(etag=f'"{digest}"', last_modified=last_modified, cache_control=cache_control)
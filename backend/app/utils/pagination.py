@@ -1,14 +1,44 @@
+import base64
+import json
+from typing import Any, Optional
 from pydantic import BaseModel
-from fastapi import Query
+from fastapi import HTTPException, Query
 
 
 class Page(BaseModel):
     limit: int = 50
     offset: int = 0
+    # Opaque keyset cursor; None means classic LIMIT/OFFSET paging
+    cursor: Optional[str] = None
 
 
 def get_page(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, max_length=512),
 ) -> Page:
-    return Page(limit=limit, offset=offset)
+    return Page(limit=limit, offset=offset, cursor=cursor)
+
+
+def encode_cursor(key: dict[str, Any]) -> str:
+    # Compact JSON, base64url without padding (safe in query strings)
+    raw = json.dumps(key, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict[str, Any]]:
+    """Decode a cursor produced by encode_cursor.
+
+    An empty cursor (``?cursor=``) starts cursor mode from the first page and
+    decodes to None. Malformed cursors are rejected with 400.
+    """
+    if not cursor:
+        return None
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(cursor + pad))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if not isinstance(value, dict):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return value
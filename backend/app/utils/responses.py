@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, AsyncIterable, AsyncIterator
+
+from fastapi import HTTPException
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+
+class RawJSONResponse(Response):
+    """Response for bodies that are already serialized JSON (bytes or str).
+
+    Used for payloads aggregated by Postgres so they skip
+    jsonable_encoder and json.dumps entirely.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if isinstance(content, str):
+            return content.encode("utf-8")
+        raise TypeError("RawJSONResponse expects pre-serialized JSON")
+
+
+async def ndjson_chunks(rows: AsyncIterable[str], chunk_bytes: int = 65536) -> AsyncIterator[bytes]:
+    """Frame serialized JSON rows as NDJSON, yielding roughly ``chunk_bytes`` at a time.
+
+    Rows are pulled only when the previous chunk has been sent, so a slow
+    client slows down the database cursor instead of growing a buffer.
+    """
+    buf: list[bytes] = []
+    size = 0
+    async for row in rows:
+        line = row.encode("utf-8") + b"\n"
+        buf.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+async def json_array_chunks(rows: AsyncIterable[str], chunk_bytes: int = 65536) -> AsyncIterator[bytes]:
+    # Same as ndjson_chunks but framed as a single JSON array
+    buf: list[bytes] = [b"["]
+    size = 1
+    first = True
+    async for row in rows:
+        item = row.encode("utf-8")
+        if not first:
+            buf.append(b",")
+        buf.append(item)
+        size += len(item) + 1
+        first = False
+        if size >= chunk_bytes:
+            yield b"".join(buf)
+            buf, size = [], 0
+    buf.append(b"]")
+    yield b"".join(buf)
+
+
+_export_slots = asyncio.Semaphore(max(1, settings.EXPORT_MAX_CONCURRENT))
+
+
+class _ExportResponse(StreamingResponse):
+    # Holds an export slot and the row generator's pool connection; both are
+    # released once the response is done, however it ends. A disconnect can
+    # leave the generators suspended (or never started), and only an explicit
+    # aclose() runs their cleanup before garbage collection would.
+
+    def __init__(self, rows: AsyncIterable[str], content: AsyncIterable[bytes], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.rows = rows
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                for gen in (self.body_iterator, self.rows):
+                    aclose = getattr(gen, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+            finally:
+                _export_slots.release()
+
+
+async def export_response(rows: AsyncIterable[str], fmt: str, filename: str) -> StreamingResponse:
+    """Stream JSON text rows as NDJSON (``fmt="ndjson"``) or a chunked JSON array.
+
+    Each export pins a pool connection for its whole duration, so at most
+    EXPORT_MAX_CONCURRENT run at once; further requests get 429.
+    """
+    if fmt not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'json'")
+    # Take the slot now rather than when the body starts, or every request
+    # arriving before the first one streams would pass the check. A free slot is
+    # taken without suspending, so nothing runs between the check and acquire().
+    if _export_slots.locked():
+        raise HTTPException(status_code=429, detail="too many concurrent exports")
+    await _export_slots.acquire()
+    framer = ndjson_chunks if fmt == "ndjson" else json_array_chunks
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    ext = "ndjson" if fmt == "ndjson" else "json"
+    return _ExportResponse(
+        rows,
+        framer(rows, settings.EXPORT_CHUNK_BYTES),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{ext}"'},
+    )
@@ -0,0 +1,78 @@
+import math
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+
+class TDigest:
+    """Mergeable quantile sketch (merging t-digest, k1 scale function).
+
+    Centroids are kept as two parallel arrays (means, weights) sorted by mean.
+    Adding values or merging another digest re-clusters everything in one
+    vectorized pass, so the cost is proportional to centroids + new values,
+    never to the history the digest summarizes. Exact min/max are tracked by
+    the caller; ``quantile`` clamps its tails to them.
+    """
+
+    __slots__ = ("compression", "means", "weights")
+
+    def __init__(
+        self,
+        compression: float = 100.0,
+        means: Optional[Sequence[float]] = None,
+        weights: Optional[Sequence[float]] = None,
+    ) -> None:
+        self.compression = compression
+        self.means = np.asarray(means if means is not None else [], dtype=np.float64)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], compression: float = 100.0) -> "TDigest":
+        digest = cls(compression)
+        digest.add(values)
+        return digest
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values: Iterable[float]) -> None:
+        arr = np.asarray(list(values) if not isinstance(values, np.ndarray) else values, dtype=np.float64)
+        arr = arr[~np.isnan(arr)]
+        if arr.size == 0:
+            return
+        self._compress(np.concatenate([self.means, arr]), np.concatenate([self.weights, np.ones(arr.size)]))
+
+    def merge(self, other: "TDigest") -> None:
+        if other.weights.size == 0:
+            return
+        self._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+        )
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        # Cluster by the integer part of k(q) at each point's midpoint: clusters
+        # are tiny near q=0/1 and large around the median
+        cum = np.cumsum(weights)
+        q = np.clip((cum - weights / 2) / total, 0.0, 1.0)
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(2 * q - 1))
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(k)) + 1])
+        w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / w
+        self.weights = w
+
+    def quantile(self, q: Sequence[float] | float, lo: float, hi: float) -> np.ndarray:
+        """Interpolated quantiles; ``lo``/``hi`` are the exact min and max."""
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.weights.size == 0:
+            return np.full(qs.shape, np.nan)
+        total = self.weights.sum()
+        mid = np.cumsum(self.weights) - self.weights / 2
+        xp = np.concatenate([[0.0], mid, [total]])
+        fp = np.concatenate([[lo], self.means, [hi]])
+        return np.interp(qs * total, xp, fp)
@@ -0,0 +1,350 @@
+"""Alert dispatcher throughput harness against bench/push_mock.py.
+
+``run`` fills push_subscriptions/alert_events for N synthetic users, starts
+the mock push service and K dispatcher worker processes (each its own
+WORKER_ID, pool and event loop, like separate API replicas) that drain the
+queue with ``dispatch_pending_alerts``. It then reports deliveries per
+second, enqueue-to-accept lag, duplicate sends seen by the mock across
+instances, queue state afterwards and each worker's event-loop stalls.
+
+    cd backend
+    poetry run python -m bench.dispatch run --users 5000 --events-per-user 2 --instances 3 \\
+        --latency-ms 40 --error-rate 0.02 --gone-rate 0.01 --out bench/results/dispatch.json
+
+Needs a benchmark database (bench/schema.sql + sql/alerts.sql, seeded deals)
+in BENCH_DATABASE_URL. Rows it creates use the ``bench-dispatch-`` user
+prefix and are replaced on every run. Lag compares the DB clock at enqueue
+with the mock's clock at accept, so run both on one host.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Optional, Sequence
+
+import asyncpg
+
+USER_PREFIX = "bench-dispatch-"
+
+
+class LoopMonitor:
+    """Measures how late a periodic timer fires: time the event loop was blocked."""
+
+    def __init__(self, interval: float = 0.005, threshold: float = 0.002) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - t - self.interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self) -> dict[str, Any]:
+        lags = sorted(self.lags)
+        blocked = [v for v in lags if v > self.threshold]
+        return {
+            "samples": len(lags),
+            "blocked_total_ms": round(sum(blocked) * 1000, 1),
+            "stalls_over_50ms": sum(1 for v in lags if v > 0.05),
+            "p99_ms": round(_percentile(lags, 0.99) * 1000, 2) if lags else None,
+            "max_ms": round(lags[-1] * 1000, 2) if lags else None,
+        }
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return math.nan
+    pos = (len(sorted_values) - 1) * q
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+async def worker(timeout: float, idle_sleep: float) -> dict[str, Any]:
+    # Imported here: settings are read from the environment the coordinator set
+    from app.db.session import db
+    from app.services import polling_service
+    from app.services.push_service import close_push_transport, shutdown_push_executor, get_push_transport
+
+    await db.connect()
+    monitor = LoopMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    drained = False
+    try:
+        while time.perf_counter() - started < timeout:
+            if await polling_service.dispatch_pending_alerts():
+                continue
+            remaining = await db.fetch_val(
+                "SELECT count(*) FROM alert_events WHERE user_id LIKE :p AND sent_at IS NULL AND dead_at IS NULL",
+                {"p": USER_PREFIX + "%"},
+            )
+            if not remaining:
+                drained = True
+                break
+            # Rows in retry backoff or leased by another worker
+            await asyncio.sleep(idle_sleep)
+    finally:
+        await monitor.stop()
+        transport = get_push_transport()
+        vapid = {"signed": transport.vapid.signed, "hits": transport.vapid.hits} if transport else None
+        await close_push_transport()
+        shutdown_push_executor()
+        await db.disconnect()
+    s = polling_service.stats
+    return {
+        "worker": polling_service.WORKER_ID,
+        "drained": drained,
+        "elapsed_sec": round(time.perf_counter() - started, 2),
+        "batches": s.batches,
+        "sent": s.sent,
+        "failed": s.failed,
+        "dead_lettered": s.dead_lettered,
+        "subscriptions_pruned": s.subscriptions_pruned,
+        "ack_lag_max_sec": round(s.lag_max_sec, 3),
+        "vapid": vapid,
+        "event_loop": monitor.report(),
+    }
+
+
+async def fill(dsn: str, users: int, events_per_user: int, endpoint: str, p256dh: str, auth: str) -> float:
+    """Replace the harness rows; returns the enqueue time (DB clock, epoch seconds)."""
+    conn = await asyncpg.connect(dsn)
+    try:
+        deal_ids = [r["id"] for r in await conn.fetch(
+            "SELECT id FROM deals ORDER BY parsed_at DESC LIMIT $1", events_per_user
+        )]
+        if len(deal_ids) < events_per_user:
+            raise SystemExit("not enough deals; run bench.seed first")
+        async with conn.transaction():
+            await conn.execute("DELETE FROM alert_events WHERE user_id LIKE $1", USER_PREFIX + "%")
+            await conn.execute("DELETE FROM push_subscriptions WHERE user_id LIKE $1", USER_PREFIX + "%")
+            await conn.execute(
+                """
+                INSERT INTO push_subscriptions (user_id, endpoint, p256dh, auth)
+                SELECT $1 || i, $2 || '/' || $1 || i, $3, $4
+                  FROM generate_series(1, $5::bigint) AS i
+                """,
+                USER_PREFIX, endpoint.rstrip("/"), p256dh, auth, users,
+            )
+            # One burst, like a rule-engine pass after a big parse
+            enqueued_at = await conn.fetchval(
+                """
+                WITH ins AS (
+                    INSERT INTO alert_events (user_id, deal_id, created_at, next_attempt_at)
+                    SELECT $1 || i, d, NOW(), NOW()
+                      FROM generate_series(1, $2::bigint) AS i, unnest($3::text[]) AS d
+                    RETURNING created_at
+                )
+                SELECT EXTRACT(EPOCH FROM min(created_at))::float8 FROM ins
+                """,
+                USER_PREFIX, users, deal_ids,
+            )
+        return float(enqueued_at)
+    finally:
+        await conn.close()
+
+
+async def queue_state(dsn: str) -> dict[str, int]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        row = await conn.fetchrow(
+            """
+            SELECT count(*) FILTER (WHERE sent_at IS NOT NULL) AS sent,
+                   count(*) FILTER (WHERE dead_at IS NOT NULL) AS dead_lettered,
+                   count(*) FILTER (WHERE sent_at IS NULL AND dead_at IS NULL) AS pending,
+                   (SELECT count(*) FROM push_subscriptions WHERE user_id LIKE $1) AS subscriptions_left
+              FROM alert_events
+             WHERE user_id LIKE $1
+            """,
+            USER_PREFIX + "%",
+        )
+        return dict(row)
+    finally:
+        await conn.close()
+
+
+def _http_json(url: str, data: Optional[bytes] = None) -> Any:
+    with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 15.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("mock push service exited during startup")
+        try:
+            _http_json(url)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("mock push service did not start")
+
+
+def _vapid_private_key() -> str:
+    from py_vapid import Vapid
+
+    v = Vapid()
+    v.generate_keys()
+    raw = v.private_key.private_numbers().private_value.to_bytes(32, "big")
+    return _b64(raw)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    from app.db.session import asyncpg_dsn
+    from bench.push_mock import generate_subscription_keys
+
+    dsn = asyncpg_dsn(args.dsn)
+    private_key, p256dh, auth = generate_subscription_keys()
+    base = f"http://127.0.0.1:{args.port}"
+    mock = subprocess.Popen(
+        [
+            sys.executable, "-m", "bench.push_mock", "--port", str(args.port),
+            "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+            "--error-rate", str(args.error_rate), "--error-status", str(args.error_status),
+            "--gone-rate", str(args.gone_rate), "--private-key", private_key, "--auth", auth,
+        ],
+    )
+    workers: list[subprocess.Popen] = []
+    try:
+        _wait_ready(f"{base}/_stats", mock)
+        enqueued_at = asyncio.run(fill(dsn, args.users, args.events_per_user, f"{base}/push", p256dh, auth))
+        env = {
+            **os.environ,
+            "DATABASE_URL": args.dsn,
+            "VAPID_PRIVATE_KEY": os.environ.get("VAPID_PRIVATE_KEY") or _vapid_private_key(),
+            "POLL_BATCH_SIZE": str(args.batch_size),
+            "MAX_RETRY_PUSH": str(args.max_retry),
+            # Retries within the run instead of minutes later
+            "PUSH_RETRY_BASE_SEC": str(args.retry_base_sec),
+            "PUSH_RETRY_MAX_SEC": str(args.retry_base_sec * 8),
+        }
+        cmd = [sys.executable, "-m", "bench.dispatch", "worker",
+               "--timeout", str(args.timeout), "--idle-sleep", str(args.idle_sleep)]
+        started = time.time()
+        for _ in range(args.instances):
+            workers.append(subprocess.Popen(
+                cmd, env=env, stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.DEVNULL, text=True
+            ))
+        reports = []
+        for p in workers:
+            out, _ = p.communicate(timeout=args.timeout + 60)
+            reports.append(json.loads(out.strip().splitlines()[-1]) if p.returncode == 0 and out.strip() else
+                           {"error": f"worker exited with {p.returncode}"})
+        wall = time.time() - started
+        mock_stats = _http_json(f"{base}/_stats?since={enqueued_at}")
+    finally:
+        for p in workers:
+            if p.poll() is None:
+                p.kill()
+        mock.terminate()
+        mock.wait(timeout=10)
+
+    delivered = mock_stats["accepted_messages"]
+    # Worker start-up (imports, pool) excluded: first to last accepted message
+    first, last = mock_stats["first_accept_at"], mock_stats["last_accept_at"]
+    active = (last - first) if first is not None and last is not None else 0.0
+    loops = [r["event_loop"] for r in reports if "event_loop" in r]
+    return {
+        "meta": {
+            "users": args.users,
+            "events": args.users * args.events_per_user,
+            "instances": args.instances,
+            "batch_size": args.batch_size,
+            "mock": {
+                "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+                "error_status": args.error_status, "gone_rate": args.gone_rate,
+            },
+        },
+        "throughput": {
+            "wall_sec": round(wall, 2),
+            "delivered": delivered,
+            "deliveries_per_sec": round(delivered / wall, 1) if wall > 0 else None,
+            "active_sec": round(active, 2),
+            "deliveries_per_sec_active": round(delivered / active, 1) if active > 0 else None,
+            "push_requests_per_sec": round(mock_stats["requests"] / wall, 1) if wall > 0 else None,
+        },
+        "lag_ms": mock_stats.get("lag_ms"),
+        "duplicates": {
+            "duplicate_sends": mock_stats["duplicate_sends"],
+            "messages_with_duplicates": mock_stats["messages_with_duplicates"],
+        },
+        "event_loop": {
+            "max_ms": max((m["max_ms"] or 0) for m in loops) if loops else None,
+            "blocked_total_ms": round(sum(m["blocked_total_ms"] for m in loops), 1) if loops else None,
+            "stalls_over_50ms": sum(m["stalls_over_50ms"] for m in loops) if loops else None,
+        },
+        "mock": mock_stats,
+        "queue_after": asyncio.run(queue_state(dsn)),
+        "workers": reports,
+    }
+
+
+def _main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Alert dispatcher throughput harness")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="fill the queue, start the mock and workers, report")
+    r.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL"))
+    r.add_argument("--users", type=int, default=1000)
+    r.add_argument("--events-per-user", type=int, default=1)
+    r.add_argument("--instances", type=int, default=2, help="dispatcher processes")
+    r.add_argument("--batch-size", type=int, default=200, help="POLL_BATCH_SIZE per worker")
+    r.add_argument("--max-retry", type=int, default=3, help="MAX_RETRY_PUSH")
+    r.add_argument("--retry-base-sec", type=float, default=0.5)
+    r.add_argument("--port", type=int, default=8089)
+    r.add_argument("--latency-ms", type=float, default=30.0)
+    r.add_argument("--jitter-ms", type=float, default=10.0)
+    r.add_argument("--error-rate", type=float, default=0.0)
+    r.add_argument("--error-status", type=int, default=503)
+    r.add_argument("--gone-rate", type=float, default=0.0)
+    r.add_argument("--timeout", type=float, default=300.0, help="max seconds per worker")
+    r.add_argument("--idle-sleep", type=float, default=0.2)
+    r.add_argument("--verbose", action="store_true", help="show worker logs")
+    r.add_argument("--out", help="write JSON here instead of stdout")
+    w = sub.add_parser("worker", help=argparse.SUPPRESS)
+    w.add_argument("--timeout", type=float, default=300.0)
+    w.add_argument("--idle-sleep", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "worker":
+        print(json.dumps(asyncio.run(worker(args.timeout, args.idle_sleep))))
+        return 0
+    if not args.dsn:
+        parser.error("no database: set BENCH_DATABASE_URL or pass --dsn")
+    text = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
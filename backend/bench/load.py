@@ -0,0 +1,445 @@
+"""Scripted HTTP load against a running backend, with baseline comparison.
+
+Each scenario runs on its own for --duration seconds (after --warmup) with
+--concurrency keep-alive connections, so its percentiles are not mixed with
+other routes. Results are JSON: per request name, request count, errors,
+RPS and p50/p95/p99 latency. Standard library only; point it at a backend
+started against a database filled by bench/seed.py.
+
+    cd backend
+    poetry run python -m bench.load run --out bench/results/current.json
+    poetry run python -m bench.load run --baseline bench/results/baseline.json --fail-on-regression
+    poetry run python -m bench.load compare bench/results/baseline.json bench/results/current.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional, Sequence
+from urllib.parse import urlencode, urlsplit
+
+
+class HTTPConnection:
+    """Minimal HTTP/1.1 keep-alive client (Content-Length and chunked bodies)."""
+
+    def __init__(self, host: str, port: int, headers: dict[str, str]) -> None:
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, target: str, body: Optional[bytes] = None) -> tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{k}: {v}" for k, v in self.headers.items()]
+        if body is not None:
+            lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        try:
+            return await self._read_response()
+        except BaseException:
+            self.close()
+            raise
+
+    async def _read_response(self) -> tuple[int, bytes]:
+        assert self._reader is not None
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        headers = {}
+        for line in header_lines:
+            if line:
+                k, _, v = line.partition(":")
+                headers[k.strip().lower()] = v.strip()
+        if "content-length" in headers:
+            data = await self._reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                parts.append(chunk[:-2])
+            data = b"".join(parts)
+        elif status in (204, 304):
+            data = b""
+        else:
+            data = await self._reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+@dataclass
+class Samples:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: int = 0
+    bytes: int = 0
+
+
+class Client:
+    """One worker's connection; every request is timed under a name."""
+
+    def __init__(self, conn: HTTPConnection, results: dict[str, Samples]) -> None:
+        self.conn = conn
+        self.results = results
+        self.recording = False
+
+    async def call(self, name: str, method: str, path: str, params: Optional[dict[str, Any]] = None,
+                   json_body: Any = None) -> tuple[int, Any]:
+        target = path + ("?" + urlencode({k: v for k, v in params.items() if v is not None}) if params else "")
+        body = json.dumps(json_body).encode("utf-8") if json_body is not None else None
+        started = time.perf_counter()
+        try:
+            status, data = await self.conn.request(method, target, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            if self.recording:
+                self.results.setdefault(name, Samples()).errors += 1
+            return 0, None
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            s = self.results.setdefault(name, Samples())
+            s.latencies.append(elapsed)
+            s.statuses[str(status)] += 1
+            s.bytes += len(data)
+            if status >= 400:
+                s.errors += 1
+        return status, data
+
+
+@dataclass
+class Context:
+    """Values scenarios draw from, discovered from the running API."""
+
+    models: list[str]
+    dates: list[str]
+    users: int
+    rng: random.Random
+
+    def model(self) -> str:
+        # Skewed like real traffic: flagship models get most requests
+        return self.models[min(len(self.models) - 1, int(len(self.models) * self.rng.random() ** 2))]
+
+    def user(self) -> str:
+        return f"bench-user-{self.rng.randint(1, self.users)}"
+
+
+Scenario = Callable[[Client, Context], Awaitable[None]]
+SCENARIOS: dict[str, Scenario] = {}
+
+
+def scenario(name: str) -> Callable[[Scenario], Scenario]:
+    def register(fn: Scenario) -> Scenario:
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+@scenario("deals_latest")
+async def _deals_latest(c: Client, ctx: Context) -> None:
+    await c.call("deals_latest", "GET", "/deals", {"limit": 20})
+
+
+@scenario("deals_model_latest")
+async def _deals_model_latest(c: Client, ctx: Context) -> None:
+    await c.call("deals_model_latest", "GET", "/deals", {"model": ctx.model(), "limit": 20})
+
+
+@scenario("deals_model_tco")
+async def _deals_model_tco(c: Client, ctx: Context) -> None:
+    await c.call("deals_model_tco", "GET", "/deals", {"model": ctx.model(), "sort": "tco_asc", "limit": 20})
+
+
+@scenario("deals_model_carrier_tco")
+async def _deals_model_carrier_tco(c: Client, ctx: Context) -> None:
+    carrier = ctx.rng.choice(["SKT", "KT", "LGU+", "MVNO"])
+    await c.call("deals_model_carrier_tco", "GET", "/deals",
+                 {"model": ctx.model(), "carrier": carrier, "sort": "tco_asc", "limit": 20})
+
+
+@scenario("deals_model_channel_city")
+async def _deals_model_channel_city(c: Client, ctx: Context) -> None:
+    params = {"model": ctx.model(), "sort": "tco_asc", "limit": 20}
+    if ctx.rng.random() < 0.5:
+        params["channel"] = ctx.rng.choice(["online", "offline"])
+    else:
+        params["city"] = ctx.rng.choice(["서울", "부산", "인천", "대구"])
+    await c.call("deals_model_channel_city", "GET", "/deals", params)
+
+
+@scenario("deals_many_filters")
+async def _deals_many_filters(c: Client, ctx: Context) -> None:
+    # Combinations without a dedicated index
+    await c.call("deals_many_filters", "GET", "/deals", {
+        "model": ctx.model(),
+        "carrier": ctx.rng.choice(["SKT", "KT", "LGU+"]),
+        "move_type": ctx.rng.choice(["번호이동", "기기변경"]),
+        "contract": ctx.rng.choice(["공시지원", "선택약정"]),
+        "payment": ctx.rng.choice(["현금완납", "할부"]),
+        "sort": ctx.rng.choice(["latest", "tco_asc"]),
+        "limit": 20,
+    })
+
+
+@scenario("deals_offset")
+async def _deals_offset(c: Client, ctx: Context) -> None:
+    # Deep pages, beyond CACHE_DEALS_MAX_DEPTH for most requests
+    await c.call("deals_offset", "GET", "/deals",
+                 {"model": ctx.model(), "sort": "tco_asc", "limit": 20, "offset": ctx.rng.randrange(0, 2000, 20)})
+
+
+@scenario("deals_cursor")
+async def _deals_cursor(c: Client, ctx: Context) -> None:
+    # First page plus up to four follow-ups, each timed separately
+    params: dict[str, Any] = {"model": ctx.model(), "sort": ctx.rng.choice(["latest", "tco_asc"]), "limit": 20, "cursor": ""}
+    for _ in range(5):
+        status, data = await c.call("deals_cursor", "GET", "/deals", params)
+        if status != 200:
+            return
+        cursor = json.loads(data).get("next_cursor")
+        if not cursor:
+            return
+        params["cursor"] = cursor
+
+
+@scenario("reports_daily")
+async def _reports_daily(c: Client, ctx: Context) -> None:
+    await c.call("reports_daily", "GET", "/reports/daily", {"date": ctx.rng.choice(ctx.dates), "limit": 200})
+
+
+@scenario("reports_latest")
+async def _reports_latest(c: Client, ctx: Context) -> None:
+    await c.call("reports_latest", "GET", "/reports/daily/latest")
+
+
+@scenario("profile_ranked")
+async def _profile_ranked(c: Client, ctx: Context) -> None:
+    user = ctx.user()
+    await c.call("profile_upsert", "POST", f"/users/{user}/profile", json_body={
+        "current_plan_fee": ctx.rng.choice([55000, 69000, 89000]),
+        "addons_monthly": ctx.rng.choice([0, 3300]),
+        "channel_pref": ctx.rng.choice(["online_only", "offline_ok"]),
+    })
+    await c.call("deals_ranked", "GET", f"/users/{user}/deals/ranked", {"model": ctx.model(), "limit": 20})
+
+
+@scenario("alerts_crud")
+async def _alerts_crud(c: Client, ctx: Context) -> None:
+    user = ctx.user()
+    await c.call("alerts_list", "GET", f"/users/{user}/alerts")
+    status, data = await c.call("alerts_create", "POST", f"/users/{user}/alerts", json_body={
+        "type": "CHEAPEST", "models": [ctx.model()], "scope": "per_model",
+    })
+    rule_id = json.loads(data).get("id") if status == 200 and data else None
+    if rule_id is not None:
+        await c.call("alerts_delete", "DELETE", f"/users/{user}/alerts/{rule_id}")
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    # Linear interpolation between closest ranks
+    if not sorted_values:
+        return math.nan
+    pos = (len(sorted_values) - 1) * q
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarize(samples: Samples, elapsed: float) -> dict[str, Any]:
+    lat = sorted(samples.latencies)
+    ms = lambda v: round(v * 1000, 3) if not math.isnan(v) else None  # noqa: E731
+    return {
+        "requests": len(lat),
+        "errors": samples.errors,
+        "rps": round(len(lat) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": ms(_percentile(lat, 0.50)),
+        "p95_ms": ms(_percentile(lat, 0.95)),
+        "p99_ms": ms(_percentile(lat, 0.99)),
+        "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+        "max_ms": ms(lat[-1]) if lat else None,
+        "bytes": samples.bytes,
+        "status": dict(samples.statuses),
+    }
+
+
+async def _discover(base: HTTPConnection, users: int, seed: int) -> Context:
+    # Models and dates from the latest-report snapshot, so scenarios hit real rows
+    status, data = await base.request("GET", "/reports/daily/latest")
+    reports = json.loads(data) if status == 200 else []
+    models = sorted({r["model"] for r in reports if r.get("model")}) or ["iPhone 16"]
+    dates = sorted({str(r["ts"])[:10] for r in reports if r.get("ts")}) or [datetime.now().date().isoformat()]
+    return Context(models=models, dates=dates, users=users, rng=random.Random(seed))
+
+
+async def run_scenario(
+    name: str, fn: Scenario, host: str, port: int, headers: dict[str, str], ctx: Context,
+    concurrency: int, duration: float, warmup: float,
+) -> dict[str, dict[str, Any]]:
+    results: dict[str, Samples] = {}
+    clients = [Client(HTTPConnection(host, port, headers), results) for _ in range(concurrency)]
+    # Per-worker RNGs derived from the run seed keep request mixes reproducible
+    contexts = [Context(ctx.models, ctx.dates, ctx.users, random.Random(f"{ctx.rng.random()}:{name}:{i}"))
+                for i in range(concurrency)]
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    async def worker(client: Client, wctx: Context) -> None:
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            client.recording = now >= measure_from
+            await fn(client, wctx)
+
+    try:
+        await asyncio.gather(*(worker(c, x) for c, x in zip(clients, contexts)))
+    finally:
+        for c in clients:
+            c.conn.close()
+    elapsed = time.perf_counter() - measure_from
+    return {k: summarize(v, elapsed) for k, v in sorted(results.items())}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    url = urlsplit(args.base_url)
+    host, port = url.hostname or "127.0.0.1", url.port or 80
+    headers = {"Accept": "application/json", "Accept-Encoding": args.accept_encoding}
+    for h in args.header:
+        k, _, v = h.partition(":")
+        headers[k.strip()] = v.strip()
+    names = args.scenario or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenario(s): {', '.join(unknown)}; known: {', '.join(SCENARIOS)}")
+
+    probe = HTTPConnection(host, port, headers)
+    try:
+        ctx = await _discover(probe, args.users, args.seed)
+    finally:
+        probe.close()
+
+    results: dict[str, dict[str, Any]] = {}
+    for name in names:
+        print(f"{name} ...", file=sys.stderr)
+        results.update(await run_scenario(
+            name, SCENARIOS[name], host, port, headers, ctx, args.concurrency, args.duration, args.warmup
+        ))
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "label": args.label,
+            "git": _git_revision(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration_sec": args.duration,
+            "warmup_sec": args.warmup,
+            "seed": args.seed,
+            "headers": headers,
+            "python": platform.python_version(),
+            "models": len(ctx.models),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], max_regression_pct: float) -> dict[str, Any]:
+    """Percent change per request name; p95 up or RPS down beyond the limit is a regression."""
+    out: dict[str, Any] = {}
+    regressions: list[str] = []
+    for name, cur in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        deltas: dict[str, Optional[float]] = {}
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            b, c = base.get(metric), cur.get(metric)
+            deltas[metric] = round((c - b) / b * 100, 1) if b and c is not None else None
+        worse = (deltas["p95_ms"] or 0) > max_regression_pct or -(deltas["rps"] or 0) > max_regression_pct
+        if worse:
+            regressions.append(name)
+        out[name] = {"delta_pct": deltas, "regression": worse}
+    return {"max_regression_pct": max_regression_pct, "results": out, "regressions": regressions}
+
+
+def _load_json(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(report: dict[str, Any], path: Optional[str]) -> None:
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def _main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backend HTTP benchmark")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="run scenarios against a live backend")
+    r.add_argument("--base-url", default="http://127.0.0.1:8000")
+    r.add_argument("--scenario", action="append", help=f"repeatable; default all of: {', '.join(SCENARIOS)}")
+    r.add_argument("--concurrency", type=int, default=16)
+    r.add_argument("--duration", type=float, default=20.0, help="measured seconds per scenario")
+    r.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds per scenario")
+    r.add_argument("--users", type=int, default=1000, help="bench-user-N ids to draw from (seeded users)")
+    r.add_argument("--seed", type=int, default=42)
+    r.add_argument("--accept-encoding", default="identity")
+    r.add_argument("--header", action="append", default=[], help='extra header, e.g. "X-Debug: 1"')
+    r.add_argument("--label", default=None, help="free text stored in meta (scale, branch, ...)")
+    r.add_argument("--out", help="write JSON here instead of stdout")
+    r.add_argument("--baseline", help="compare against this earlier result")
+    r.add_argument("--max-regression-pct", type=float, default=10.0)
+    r.add_argument("--fail-on-regression", action="store_true", help="exit 1 when any regression is found")
+    c = sub.add_parser("compare", help="compare two result files")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--max-regression-pct", type=float, default=10.0)
+    c.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compare":
+        report = compare(_load_json(args.baseline), _load_json(args.current), args.max_regression_pct)
+        _write(report, None)
+    else:
+        report = asyncio.run(run(args))
+        if args.baseline:
+            report["comparison"] = compare(_load_json(args.baseline), report, args.max_regression_pct)
+        _write(report, args.out)
+        report = report.get("comparison", {})
+    if args.fail_on_regression and report.get("regressions"):
+        print(f"regressions: {', '.join(report['regressions'])}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
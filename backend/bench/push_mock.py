@@ -0,0 +1,204 @@
+"""Local stand-in for a Web Push service (FCM/Mozilla autopush).
+
+Accepts ``POST /push/<anything>`` with configurable latency, transient
+errors and permanently gone (410) subscriptions, and keeps delivery
+statistics for bench/dispatch.py at ``GET /_stats``. Given the subscription
+private key and auth secret it decrypts each aes128gcm payload, so a message
+accepted twice (the same deal for the same endpoint) is counted as a
+duplicate send.
+
+    cd backend
+    poetry run python -m bench.push_mock --port 8089 --latency-ms 40 --error-rate 0.02 --gone-rate 0.01
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import math
+import random
+import secrets
+import time
+from typing import Any, Optional, Sequence
+
+from aiohttp import web
+
+try:
+    import http_ece  # type: ignore
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+except Exception:  # pragma: no cover - pywebpush dependencies
+    http_ece = None  # type: ignore
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def generate_subscription_keys() -> tuple[str, str, str]:
+    """(private key, p256dh, auth) for subscriptions this mock can decrypt."""
+    if http_ece is None:
+        raise SystemExit("http_ece and cryptography (pywebpush dependencies) are required")
+    key = ec.generate_private_key(ec.SECP256R1())
+    private = key.private_numbers().private_value.to_bytes(32, "big")
+    public = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return _b64(private), _b64(public), _b64(secrets.token_bytes(16))
+
+
+class MockPushService:
+    def __init__(
+        self,
+        latency_ms: float = 30.0,
+        jitter_ms: float = 10.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        gone_rate: float = 0.0,
+        private_key: Optional[str] = None,
+        auth: Optional[str] = None,
+        seed: int = 1,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.gone_rate = gone_rate
+        self.rng = random.Random(seed)
+        self._key = None
+        self._auth = None
+        if private_key and auth and http_ece is not None:
+            self._key = ec.derive_private_key(int.from_bytes(_unb64(private_key), "big"), ec.SECP256R1())
+            self._auth = _unb64(auth)
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.by_status: dict[str, int] = {}
+        self.undecryptable = 0
+        # (endpoint path, message) -> accept times (epoch seconds)
+        self.accepted: dict[tuple[str, str], list[float]] = {}
+
+    def _gone(self, path: str) -> bool:
+        # Stable per endpoint: a gone subscription stays gone on every retry
+        if self.gone_rate <= 0:
+            return False
+        h = int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest(), "big")
+        return h / 2**64 < self.gone_rate
+
+    def _message_key(self, body: bytes) -> Optional[str]:
+        if self._key is None:
+            return None
+        try:
+            plain = http_ece.decrypt(body, private_key=self._key, auth_secret=self._auth, version="aes128gcm")
+        except Exception:
+            self.undecryptable += 1
+            return None
+        return plain.decode("utf-8", errors="replace")
+
+    async def handle_push(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            await asyncio.sleep(delay)
+            path = request.path
+            if self._gone(path):
+                status = 410
+            elif self.rng.random() < self.error_rate:
+                status = self.error_status
+            else:
+                status = 201
+                message = self._message_key(body)
+                key = (path, message if message is not None else f"#{self.requests}")
+                self.accepted.setdefault(key, []).append(time.time())
+        finally:
+            self.in_flight -= 1
+        self.by_status[str(status)] = self.by_status.get(str(status), 0) + 1
+        return web.Response(status=status, headers={"Location": f"{request.path}/m/{self.requests}"})
+
+    def stats(self, since: Optional[float] = None) -> dict[str, Any]:
+        firsts = sorted(times[0] for times in self.accepted.values())
+        dup_keys = [times for times in self.accepted.values() if len(times) > 1]
+        out: dict[str, Any] = {
+            "requests": self.requests,
+            "by_status": self.by_status,
+            "max_in_flight": self.max_in_flight,
+            "accepted_messages": len(self.accepted),
+            "accepted_total": sum(len(t) for t in self.accepted.values()),
+            "duplicate_sends": sum(len(t) - 1 for t in dup_keys) if self._key is not None else None,
+            "messages_with_duplicates": len(dup_keys) if self._key is not None else None,
+            "undecryptable": self.undecryptable,
+            "first_accept_at": firsts[0] if firsts else None,
+            "last_accept_at": firsts[-1] if firsts else None,
+        }
+        if since is not None and firsts:
+            lags = [(t - since) * 1000 for t in firsts]
+            out["lag_ms"] = {
+                "p50": round(_percentile(lags, 0.50), 1),
+                "p95": round(_percentile(lags, 0.95), 1),
+                "p99": round(_percentile(lags, 0.99), 1),
+                "max": round(lags[-1], 1),
+            }
+        return out
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        since = request.query.get("since")
+        return web.json_response(self.stats(float(since) if since else None))
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024)
+        app.router.add_post("/push/{tail:.*}", self.handle_push)
+        app.router.add_get("/_stats", self.handle_stats)
+        app.router.add_post("/_reset", self.handle_reset)
+        return app
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return math.nan
+    pos = (len(sorted_values) - 1) * q
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Mock Web Push service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--gone-rate", type=float, default=0.0, help="fraction of endpoints answered 410")
+    parser.add_argument("--private-key", help="subscription private key (b64url raw) to decrypt payloads")
+    parser.add_argument("--auth", help="subscription auth secret (b64url)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    service = MockPushService(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        gone_rate=args.gone_rate,
+        private_key=args.private_key,
+        auth=args.auth,
+        seed=args.seed,
+    )
+    web.run_app(service.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,109 @@
+-- Base tables for a local benchmark database (bench/seed.py).
+-- In production these tables are owned by the parser; this file only mirrors
+-- the columns the backend reads and writes so the API can run against a
+-- throwaway Postgres. Apply it first, then the backend's own SQL files:
+--
+--   psql "$BENCH_DSN" -f backend/bench/schema.sql
+--   psql "$BENCH_DSN" -f backend/sql/views.sql
+--   psql "$BENCH_DSN" -f backend/sql/alerts.sql
+--   psql "$BENCH_DSN" -f backend/sql/notify.sql
+--   psql "$BENCH_DSN" -f backend/sql/aggregates.sql
+--   (seed, then) psql "$BENCH_DSN" -f backend/sql/indexes.sql
+
+CREATE TABLE IF NOT EXISTS deals (
+  id text PRIMARY KEY,
+  post_id text,
+  url text,
+  source_posted_at timestamptz,
+  model text,
+  capacity text,
+  carrier text,
+  move_type text,
+  contract text,
+  contract_type text,
+  contract_months integer,
+  contract_extra_support boolean,
+  payment text,
+  channel text,
+  city text,
+  upfront integer,
+  plan_high_fee integer,
+  plan_high_months integer,
+  plan_after_fee integer,
+  plan_after_months integer,
+  mvno_tail_fee integer,
+  mvno_tail_months integer,
+  addons_monthly integer,
+  addons_months integer,
+  addons_detail jsonb,
+  addons_count integer,
+  device_finance_total integer,
+  device_finance_months integer,
+  device_finance_monthly integer,
+  cash_delta integer,
+  store text,
+  advertorial_score double precision,
+  flags jsonb,
+  badges jsonb,
+  parsed_at timestamptz NOT NULL DEFAULT NOW(),
+  tco_total bigint,
+  tco_net bigint,
+  retention_line_months integer,
+  retention_plan_months integer,
+  retention_addons_months integer,
+  contract_support_amount integer
+);
+
+CREATE TABLE IF NOT EXISTS aggregates_daily (
+  model text NOT NULL,
+  capacity text,
+  ts date NOT NULL,
+  min double precision,
+  p25 double precision,
+  median double precision,
+  p75 double precision,
+  max double precision,
+  avg double precision,
+  n bigint
+);
+
+CREATE TABLE IF NOT EXISTS profiles (
+  user_id text PRIMARY KEY,
+  current_plan_fee integer,
+  addons_monthly integer,
+  mvno_flag boolean NOT NULL DEFAULT false,
+  channel_pref text,
+  city text,
+  updated_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS rules (
+  id bigserial PRIMARY KEY,
+  user_id text NOT NULL,
+  type text NOT NULL,
+  frequency text NOT NULL DEFAULT 'immediate',
+  cooldown_hours integer NOT NULL DEFAULT 3,
+  enabled boolean NOT NULL DEFAULT true,
+  constraints jsonb NOT NULL DEFAULT '{}'::jsonb,
+  thresholds jsonb NOT NULL DEFAULT '{}'::jsonb,
+  filters jsonb NOT NULL DEFAULT '{}'::jsonb,
+  created_at timestamptz NOT NULL DEFAULT NOW(),
+  updated_at timestamptz NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS rules_user_idx ON rules (user_id, id DESC);
+
+CREATE TABLE IF NOT EXISTS push_subscriptions (
+  endpoint text PRIMARY KEY,
+  user_id text NOT NULL,
+  p256dh text NOT NULL,
+  auth text NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS push_subscriptions_user_idx ON push_subscriptions (user_id);
+
+CREATE TABLE IF NOT EXISTS alert_events (
+  id bigserial PRIMARY KEY,
+  user_id text NOT NULL,
+  deal_id text NOT NULL,
+  sent_at timestamptz
+);
@@ -0,0 +1,329 @@
+"""Seed a benchmark database with synthetic deals, aggregates, users and rules.
+
+Rows are generated inside Postgres (generate_series + random() after
+setseed), so 10M deals take minutes rather than hours. The same --seed and
+--epoch give the same data: parsed_at is spread back from --epoch (default:
+today's midnight UTC) and the push subscription keys derive from --seed.
+Expects bench/schema.sql and the backend's sql/*.sql
+to be applied already (see the header of bench/schema.sql).
+
+    cd backend
+    poetry run python -m bench.seed --scale small --reset
+    poetry run python -m bench.seed --deals 2500000 --users 50000 --reset
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional, Sequence
+
+import asyncpg
+
+from app.core.config import settings
+from app.db.session import asyncpg_dsn
+
+# --scale presets: deals, users
+SCALES = {
+    "small": (10_000, 1_000),
+    "medium": (100_000, 10_000),
+    "large": (1_000_000, 50_000),
+    "xl": (10_000_000, 200_000),
+}
+
+MODELS = (
+    "iPhone 16", "iPhone 16 Pro", "iPhone 16 Pro Max", "iPhone 15", "Galaxy S25",
+    "Galaxy S25+", "Galaxy S25 Ultra", "Galaxy Z Flip6", "Galaxy Z Fold6", "Galaxy A55",
+)
+CAPACITIES = ("128GB", "256GB", "512GB", "1TB")
+CARRIERS = ("SKT", "KT", "LGU+", "MVNO", "미상")
+MOVE_TYPES = ("번호이동", "기기변경", "자급")
+CONTRACTS = ("공시지원", "선택약정", "무약정")
+PAYMENTS = ("현금완납", "할부")
+CHANNELS = ("online", "offline", "unknown")
+CITIES = ("서울", "부산", "인천", "대구", "대전", "광주", "수원", "성남", "고양", "울산")
+RULE_TYPES = ("STRICT_MATCH", "CHEAPEST", "BIG_DROP", "BEST_DISCOUNT")
+
+# Tables seeded here, cleared by --reset (with the aggregates_*/pipeline_watermarks
+# pipeline state if present)
+_TABLES = ("alert_events", "push_subscriptions", "rules", "profiles", "aggregates_daily", "deals")
+
+_DEALS_CHUNK = 250_000
+
+# random() picks skewed towards the head of each list, like real traffic:
+# a few flagship models and the big three carriers dominate
+_DEALS_SQL = """
+INSERT INTO deals (
+    id, post_id, url, source_posted_at, model, capacity, carrier, move_type, contract,
+    contract_months, payment, channel, city, upfront,
+    plan_high_fee, plan_high_months, plan_after_fee, plan_after_months,
+    mvno_tail_fee, mvno_tail_months, addons_monthly, addons_months, addons_count,
+    device_finance_total, device_finance_months, cash_delta, store, advertorial_score,
+    flags, badges, parsed_at, tco_total, tco_net
+)
+SELECT g.id, g.post_id, g.url, g.parsed_at - interval '10 minutes', g.model, g.capacity, g.carrier,
+       g.move_type, g.contract, 24, g.payment, g.channel, g.city, g.upfront,
+       g.plan_high_fee, 6, g.plan_after_fee, 18,
+       NULL, NULL, g.addons_monthly, 4, CASE WHEN g.addons_monthly > 0 THEN 1 ELSE 0 END,
+       g.device_finance_total, CASE WHEN g.device_finance_total IS NULL THEN NULL ELSE 24 END,
+       g.cash_delta, g.store, g.advertorial_score,
+       '[]'::jsonb, '[]'::jsonb, g.parsed_at,
+       g.upfront + g.plan_high_fee * 6 + g.plan_after_fee * 18 + g.addons_monthly * 4
+         + COALESCE(g.device_finance_total, 0),
+       g.upfront + g.plan_high_fee * 6 + g.plan_after_fee * 18 + g.addons_monthly * 4
+         + COALESCE(g.device_finance_total, 0) + LEAST(g.cash_delta, 0)
+  FROM (
+    SELECT 'bench-' || i AS id,
+           'p' || i AS post_id,
+           'https://example.invalid/posts/' || i AS url,
+           ($3::text[])[1 + floor(power(random(), 1.8) * array_length($3::text[], 1))::int] AS model,
+           CASE WHEN random() < 0.08 THEN NULL
+                ELSE ($4::text[])[1 + floor(power(random(), 1.5) * array_length($4::text[], 1))::int] END AS capacity,
+           ($5::text[])[1 + floor(power(random(), 1.4) * array_length($5::text[], 1))::int] AS carrier,
+           ($6::text[])[1 + floor(random() * array_length($6::text[], 1))::int] AS move_type,
+           ($7::text[])[1 + floor(random() * array_length($7::text[], 1))::int] AS contract,
+           ($8::text[])[1 + floor(random() * array_length($8::text[], 1))::int] AS payment,
+           ($9::text[])[1 + floor(power(random(), 1.3) * array_length($9::text[], 1))::int] AS channel,
+           CASE WHEN random() < 0.15 THEN NULL
+                ELSE ($10::text[])[1 + floor(power(random(), 1.6) * array_length($10::text[], 1))::int] END AS city,
+           (floor(random() * 60) * 10000)::int AS upfront,
+           (69000 + floor(random() * 6) * 10000)::int AS plan_high_fee,
+           (33000 + floor(random() * 5) * 10000)::int AS plan_after_fee,
+           CASE WHEN random() < 0.4 THEN (floor(random() * 4) * 3300)::int ELSE 0 END AS addons_monthly,
+           CASE WHEN random() < 0.5 THEN (floor(random() * 120) * 10000)::int END AS device_finance_total,
+           CASE WHEN random() < 0.3 THEN -(floor(random() * 40) * 10000)::int ELSE 0 END AS cash_delta,
+           'store-' || floor(random() * 500)::int AS store,
+           round(random()::numeric, 3)::float8 AS advertorial_score,
+           $12::timestamptz - random() * make_interval(days => $11) AS parsed_at
+      FROM generate_series($1::bigint, $2::bigint) AS i
+  ) g
+"""
+
+# Exact percentiles per (model, capacity, local day), as the aggregates builder would produce
+_AGGREGATES_SQL = """
+INSERT INTO aggregates_daily (model, capacity, ts, min, p25, median, p75, max, avg, n)
+SELECT d.model, d.capacity, (d.parsed_at AT TIME ZONE $1)::date,
+       min(d.tco_total), percentile_cont(0.25) WITHIN GROUP (ORDER BY d.tco_total),
+       percentile_cont(0.5) WITHIN GROUP (ORDER BY d.tco_total),
+       percentile_cont(0.75) WITHIN GROUP (ORDER BY d.tco_total),
+       max(d.tco_total), avg(d.tco_total), count(*)
+  FROM deals d
+ WHERE d.tco_total IS NOT NULL AND d.model IS NOT NULL
+ GROUP BY 1, 2, 3
+"""
+
+_PROFILES_SQL = """
+INSERT INTO profiles (user_id, current_plan_fee, addons_monthly, mvno_flag, channel_pref, city)
+SELECT 'bench-user-' || i,
+       (45000 + floor(random() * 7) * 10000)::int,
+       (floor(random() * 3) * 3300)::int,
+       random() < 0.15,
+       CASE WHEN random() < 0.5 THEN 'online_only' ELSE 'offline_ok' END,
+       CASE WHEN random() < 0.3 THEN NULL ELSE ($2::text[])[1 + floor(random() * array_length($2::text[], 1))::int] END
+  FROM generate_series(1, $1::bigint) AS i
+"""
+
+_RULES_SQL = """
+INSERT INTO rules (user_id, type, frequency, cooldown_hours, enabled, thresholds, filters)
+SELECT r.user_id, r.type, 'immediate', 3, r.enabled,
+       CASE r.type WHEN 'BIG_DROP' THEN jsonb_build_object('drop_pct_min', 10)
+                   WHEN 'BEST_DISCOUNT' THEN jsonb_build_object('discount_pct_min', 20)
+                   WHEN 'CHEAPEST' THEN jsonb_build_object('scope', 'per_model')
+                   ELSE jsonb_build_object('tco_total_max', r.tco_max) END,
+       jsonb_build_object('models', jsonb_build_array(r.model), 'carriers', r.carriers,
+                          'channels', NULL, 'city', NULL)
+  FROM (
+    SELECT 'bench-user-' || (1 + floor(random() * $1)::bigint) AS user_id,
+           ($5::text[])[1 + floor(random() * array_length($5::text[], 1))::int] AS type,
+           random() < 0.9 AS enabled,
+           1500000 + floor(random() * 20) * 50000 AS tco_max,
+           ($3::text[])[1 + floor(power(random(), 1.8) * array_length($3::text[], 1))::int] AS model,
+           CASE WHEN random() < 0.5 THEN NULL
+                ELSE jsonb_build_array(($4::text[])[1 + floor(random() * 3)::int]) END AS carriers
+      FROM generate_series(1, $2::bigint) AS i
+  ) r
+"""
+
+_SUBSCRIPTIONS_SQL = """
+INSERT INTO push_subscriptions (user_id, endpoint, p256dh, auth)
+SELECT 'bench-user-' || i, $2 || '/bench-user-' || i, $3, $4
+  FROM generate_series(1, $1::bigint) AS i
+"""
+
+_ALERTS_SQL = """
+INSERT INTO alert_events (user_id, deal_id, rule_id, created_at, next_attempt_at)
+SELECT 'bench-user-' || (1 + floor(random() * $1)::bigint),
+       'bench-' || (1 + floor(random() * $2)::bigint),
+       NULL, NOW(), NOW()
+  FROM generate_series(1, $3::bigint) AS i
+"""
+
+
+@dataclass
+class Scale:
+    deals: int
+    users: int
+    rules_per_user: float = 1.5
+    subscriptions_ratio: float = 0.8
+    pending_alerts: int = 0
+    days: int = 90
+    seed: float = 0.42
+    # ISO timestamp parsed_at is spread back from; None = today's midnight UTC
+    epoch: Optional[str] = None
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+
+
+def _epoch(value: str) -> datetime:
+    epoch = datetime.fromisoformat(value)
+    return epoch if epoch.tzinfo is not None else epoch.replace(tzinfo=timezone.utc)
+
+
+def subscription_keys(seed: float) -> tuple[str, str]:
+    """A valid P-256 public key + auth secret shared by every seeded subscription.
+
+    Web Push encryption needs a real curve point; one key pair is enough for
+    benchmarking and lets a mock push service ignore the payload. Both are
+    derived from ``seed``, like the rest of the data.
+    """
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+    except Exception:  # pragma: no cover - pywebpush brings cryptography along
+        raise SystemExit("cryptography is required to generate subscription keys")
+    digest = lambda label: hashlib.sha256(f"bench-{label}:{seed!r}".encode()).digest()  # noqa: E731
+    # Any value in [1, n) is a valid private key; reducing 256 bits mod n is close enough to uniform
+    n = 0xFFFFFFFF00000000FFFFFFFFFFFFFFFFBCE6FAADA7179E84F3B9CAC2FC632551
+    key = ec.derive_private_key(1 + int.from_bytes(digest("p256dh"), "big") % (n - 1), ec.SECP256R1())
+    point = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    b64 = lambda raw: base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")  # noqa: E731
+    return b64(point), b64(digest("auth")[:16])
+
+
+async def _table_exists(conn: asyncpg.Connection, name: str) -> bool:
+    return await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", name)
+
+
+async def _step(label: str, coro: Any) -> Any:
+    started = time.perf_counter()
+    result = await coro
+    print(f"  {label}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return result
+
+
+async def seed(dsn: str, scale: Scale, reset: bool, push_endpoint: str) -> dict[str, Any]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        existing = await conn.fetchval("SELECT EXISTS (SELECT 1 FROM deals)")
+        if existing and not reset:
+            raise SystemExit("deals is not empty; pass --reset to truncate the benchmark tables first")
+        if reset:
+            tables = list(_TABLES)
+            for optional in ("aggregates_sketches", "aggregates_dirty_hours", "pipeline_watermarks"):
+                if await _table_exists(conn, optional):
+                    tables.append(optional)
+            await conn.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+
+        # Deterministic random(): serial plans only, one session
+        await conn.execute("SET max_parallel_workers_per_gather = 0")
+        await conn.execute("SELECT setseed($1)", scale.seed)
+
+        started = time.perf_counter()
+        for lo in range(1, scale.deals + 1, _DEALS_CHUNK):
+            hi = min(scale.deals, lo + _DEALS_CHUNK - 1)
+            await _step(f"deals {lo}-{hi}", conn.execute(
+                _DEALS_SQL, lo, hi, list(MODELS), list(CAPACITIES), list(CARRIERS), list(MOVE_TYPES),
+                list(CONTRACTS), list(PAYMENTS), list(CHANNELS), list(CITIES), scale.days,
+                _epoch(scale.epoch or _today()),
+            ))
+        await _step("aggregates_daily", conn.execute(_AGGREGATES_SQL, settings.AGGREGATES_TIMEZONE))
+        await _step("profiles", conn.execute(_PROFILES_SQL, scale.users, list(CITIES)))
+        n_rules = int(scale.users * scale.rules_per_user)
+        await _step("rules", conn.execute(
+            _RULES_SQL, scale.users, n_rules, list(MODELS), list(CARRIERS), list(RULE_TYPES)
+        ))
+        n_subs = int(scale.users * scale.subscriptions_ratio)
+        p256dh, auth = subscription_keys(scale.seed)
+        await _step("push_subscriptions", conn.execute(
+            _SUBSCRIPTIONS_SQL, n_subs, push_endpoint.rstrip("/"), p256dh, auth
+        ))
+        if scale.pending_alerts:
+            await _step("alert_events", conn.execute(_ALERTS_SQL, n_subs, scale.deals, scale.pending_alerts))
+
+        # Background stages start from the seeded state instead of replaying it
+        if await _table_exists(conn, "pipeline_watermarks"):
+            await conn.execute(
+                """
+                INSERT INTO pipeline_watermarks (name, value)
+                SELECT w.name, (SELECT max(parsed_at) FROM deals)
+                  FROM unnest(ARRAY['rule_engine', 'aggregates_daily']) AS w(name)
+                 WHERE EXISTS (SELECT 1 FROM deals)
+                ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+                """
+            )
+        if await _table_exists(conn, "api_reports_daily_latest_mv"):
+            await _step("refresh latest snapshot", conn.execute("REFRESH MATERIALIZED VIEW api_reports_daily_latest_mv"))
+        await _step("analyze", conn.execute(f"ANALYZE {', '.join(_TABLES)}"))
+
+        counts = {t: await conn.fetchval(f"SELECT count(*) FROM {t}") for t in _TABLES}
+        return {
+            "scale": asdict(scale),
+            "counts": counts,
+            "seconds": round(time.perf_counter() - started, 1),
+        }
+    finally:
+        await conn.close()
+
+
+def _main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Seed a benchmark database")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL") or settings.DATABASE_URL,
+                        help="defaults to BENCH_DATABASE_URL, then DATABASE_URL")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--deals", type=int, help="overrides the --scale preset")
+    parser.add_argument("--users", type=int, help="overrides the --scale preset")
+    parser.add_argument("--rules-per-user", type=float, default=1.5)
+    parser.add_argument("--subscriptions-ratio", type=float, default=0.8)
+    parser.add_argument("--pending-alerts", type=int, default=0, help="undelivered alert_events to enqueue")
+    parser.add_argument("--days", type=int, default=90, help="parsed_at spread back from --epoch")
+    parser.add_argument("--epoch", default=None,
+                        help="ISO timestamp the data ends at (default: today's midnight UTC)")
+    parser.add_argument("--seed", type=float, default=0.42, help="setseed() value in [-1, 1]")
+    parser.add_argument("--push-endpoint", default="http://127.0.0.1:8089/push",
+                        help="base URL of seeded push subscriptions (a local mock push service)")
+    parser.add_argument("--reset", action="store_true", help="truncate the benchmark tables first")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("no database: set BENCH_DATABASE_URL or pass --dsn")
+    if args.epoch:
+        try:
+            _epoch(args.epoch)
+        except ValueError:
+            parser.error(f"--epoch: not an ISO timestamp: {args.epoch!r}")
+
+    deals, users = SCALES[args.scale]
+    scale = Scale(
+        deals=args.deals or deals,
+        users=args.users or users,
+        rules_per_user=args.rules_per_user,
+        subscriptions_ratio=args.subscriptions_ratio,
+        pending_alerts=args.pending_alerts,
+        days=args.days,
+        seed=args.seed,
+        epoch=args.epoch or _today(),
+    )
+    summary = asyncio.run(seed(asyncpg_dsn(args.dsn), scale, args.reset, args.push_endpoint))
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,65 @@
+-- Incremental daily aggregates (app/services/aggregate_service.py).
+-- One mergeable sketch per (model, capacity, day): exact n/sum/min/max plus a
+-- t-digest (centroid means/weights) for p25/median/p75. New deals are folded
+-- into the touched sketches and only those aggregates_daily rows are rewritten;
+-- days with updated or deleted deals are rebuilt (aggregates_dirty_hours).
+-- TRUNCATE deals is not tracked: run a backfill afterwards.
+--
+--   psql "$DATABASE_URL" -f backend/sql/aggregates.sql
+--
+-- Also needs pipeline_watermarks from sql/alerts.sql.
+
+CREATE TABLE IF NOT EXISTS aggregates_sketches (
+  model text NOT NULL,
+  capacity text,
+  -- NULL-safe key parts (용량 미상 rows), same convention as api_reports_daily_latest_mv
+  capacity_key text GENERATED ALWAYS AS (COALESCE(capacity, '')) STORED,
+  capacity_unknown boolean GENERATED ALWAYS AS (capacity IS NULL) STORED,
+  day date NOT NULL,
+  n bigint NOT NULL,
+  total double precision NOT NULL,
+  min double precision NOT NULL,
+  max double precision NOT NULL,
+  means double precision[] NOT NULL,
+  weights double precision[] NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (model, capacity_key, capacity_unknown, day)
+);
+
+CREATE INDEX IF NOT EXISTS aggregates_sketches_day_idx
+  ON aggregates_sketches (day);
+
+-- Deals updated or deleted after they may have been folded. Sketches only
+-- grow, so the builder rebuilds the local days of these hours from the table.
+-- Hours (UTC) keep the queue small and do not depend on AGGREGATES_TIMEZONE.
+CREATE TABLE IF NOT EXISTS aggregates_dirty_hours (
+  hour timestamptz PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION aggregates_mark_dirty() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO aggregates_dirty_hours (hour)
+  SELECT DISTINCT date_trunc('hour', t.parsed_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+    FROM (VALUES (OLD.parsed_at), (CASE WHEN TG_OP = 'UPDATE' THEN NEW.parsed_at END)) AS t(parsed_at)
+   WHERE t.parsed_at IS NOT NULL
+  ON CONFLICT (hour) DO NOTHING;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS deals_aggregates_dirty_update ON deals;
+CREATE TRIGGER deals_aggregates_dirty_update
+  AFTER UPDATE OF model, capacity, tco_total, parsed_at ON deals
+  FOR EACH ROW
+  WHEN (OLD.model IS DISTINCT FROM NEW.model
+        OR OLD.capacity IS DISTINCT FROM NEW.capacity
+        OR OLD.tco_total IS DISTINCT FROM NEW.tco_total
+        OR OLD.parsed_at IS DISTINCT FROM NEW.parsed_at)
+  EXECUTE FUNCTION aggregates_mark_dirty();
+
+DROP TRIGGER IF EXISTS deals_aggregates_dirty_delete ON deals;
+CREATE TRIGGER deals_aggregates_dirty_delete
+  AFTER DELETE ON deals
+  FOR EACH ROW
+  EXECUTE FUNCTION aggregates_mark_dirty();
@@ -0,0 +1,43 @@
+-- Alert dispatch bookkeeping on alert_events (app/services/polling_service.py).
+--   psql "$DATABASE_URL" -f backend/sql/alerts.sql
+
+-- Claim lease: a dispatcher owns a row until it acks it or the lease expires
+ALTER TABLE alert_events
+  ADD COLUMN IF NOT EXISTS claimed_at timestamptz,
+  ADD COLUMN IF NOT EXISTS claimed_by text;
+
+-- Retry state: failed sends back off until next_attempt_at; after
+-- MAX_RETRY_PUSH attempts the event is dead-lettered (dead_at set)
+ALTER TABLE alert_events
+  ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS next_attempt_at timestamptz NOT NULL DEFAULT NOW(),
+  ADD COLUMN IF NOT EXISTS dead_at timestamptz,
+  ADD COLUMN IF NOT EXISTS last_error text;
+
+-- Due-queue scan used by the claim query (replaces alert_events_pending_idx)
+DROP INDEX IF EXISTS alert_events_pending_idx;
+CREATE INDEX IF NOT EXISTS alert_events_due_idx
+  ON alert_events (next_attempt_at, id)
+  WHERE sent_at IS NULL AND dead_at IS NULL;
+
+-- Enqueue time, for the enqueue-to-send lag metric
+ALTER TABLE alert_events
+  ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT NOW();
+
+-- Rule that produced the event (rule engine); drives cooldown lookups
+ALTER TABLE alert_events
+  ADD COLUMN IF NOT EXISTS rule_id bigint;
+CREATE INDEX IF NOT EXISTS alert_events_rule_created_idx
+  ON alert_events (rule_id, created_at DESC)
+  WHERE rule_id IS NOT NULL;
+
+-- Progress markers for backend pipeline stages (rule engine, aggregates)
+CREATE TABLE IF NOT EXISTS pipeline_watermarks (
+  name text PRIMARY KEY,
+  value timestamptz NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT NOW()
+);
+-- Tie-breaker for keyset watermarks: (value, value_key) is the last row done,
+-- value_key holding its id in the id's own JSON type
+ALTER TABLE pipeline_watermarks
+  ADD COLUMN IF NOT EXISTS value_key jsonb;
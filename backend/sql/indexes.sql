@@ -0,0 +1,44 @@
+-- Indexes backing the column-based /deals queries (deal_repo) and report snapshots.
+-- Every index ends with the full sort key so ORDER BY ... LIMIT and keyset
+-- seeks read rows in index order instead of sorting the whole match set.
+--
+-- CONCURRENTLY cannot run inside a transaction block:
+--   psql "$DATABASE_URL" -f backend/sql/indexes.sql
+
+-- No filter
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_latest_idx
+  ON deals (parsed_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_tco_idx
+  ON deals (tco_total ASC NULLS LAST, parsed_at DESC, id DESC);
+
+-- model (the PWA always filters by model)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_model_latest_idx
+  ON deals (model, parsed_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_model_tco_idx
+  ON deals (model, tco_total ASC NULLS LAST, parsed_at DESC, id DESC);
+
+-- model + carrier
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_model_carrier_latest_idx
+  ON deals (model, carrier, parsed_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_model_carrier_tco_idx
+  ON deals (model, carrier, tco_total ASC NULLS LAST, parsed_at DESC, id DESC);
+
+-- model + channel / model + city
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_model_channel_tco_idx
+  ON deals (model, channel, tco_total ASC NULLS LAST, parsed_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_model_city_tco_idx
+  ON deals (model, city, tco_total ASC NULLS LAST, parsed_at DESC, id DESC);
+
+-- Single non-model filters
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_carrier_latest_idx
+  ON deals (carrier, parsed_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_city_latest_idx
+  ON deals (city, parsed_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS deals_channel_latest_idx
+  ON deals (channel, parsed_at DESC, id DESC);
+
+ANALYZE deals;
+
+-- aggregates_daily: DISTINCT ON scan behind api_reports_daily_latest_mv refreshes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS aggregates_daily_model_capacity_ts_idx
+  ON aggregates_daily (model, capacity, ts DESC);
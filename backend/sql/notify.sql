@@ -0,0 +1,109 @@
+-- Change notifications consumed by the API's LISTEN connection (app/db/notify.py).
+-- Statement-level triggers: one NOTIFY per ingest statement, not per row, and
+-- Postgres folds identical notifications within a transaction into one.
+--
+--   psql "$DATABASE_URL" -f backend/sql/notify.sql
+
+CREATE OR REPLACE FUNCTION api_notify_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  -- TG_ARGV[0] is the channel name
+  PERFORM pg_notify(TG_ARGV[0], TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS deals_notify_change ON deals;
+CREATE TRIGGER deals_notify_change
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON deals
+  FOR EACH STATEMENT EXECUTE FUNCTION api_notify_change('deals_changed');
+
+DROP TRIGGER IF EXISTS aggregates_daily_notify_change ON aggregates_daily;
+CREATE TRIGGER aggregates_daily_notify_change
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON aggregates_daily
+  FOR EACH STATEMENT EXECUTE FUNCTION api_notify_change('aggregates_changed');
+
+-- Wakes the alert dispatcher as soon as new alert_events are inserted
+DROP TRIGGER IF EXISTS alert_events_notify_insert ON alert_events;
+CREATE TRIGGER alert_events_notify_insert
+  AFTER INSERT ON alert_events
+  FOR EACH STATEMENT EXECUTE FUNCTION api_notify_change('alert_events');
+
+-- Rule CRUD: row-level so other workers can update their rule index by id
+CREATE OR REPLACE FUNCTION api_notify_rule_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM pg_notify('rules_changed', OLD.id::text);
+  ELSE
+    PERFORM pg_notify('rules_changed', NEW.id::text);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS rules_notify_change ON rules;
+CREATE TRIGGER rules_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON rules
+  FOR EACH ROW EXECUTE FUNCTION api_notify_rule_change();
+
+-- Data version counters for HTTP conditional GET (ETag / Last-Modified).
+-- Bumped once per writing transaction, at commit; the API caches them
+-- in-process and drops the cache on the NOTIFYs above. The latest-report snapshot row is
+-- bumped by the backend after a REFRESH that changed the snapshot.
+CREATE TABLE IF NOT EXISTS api_data_versions (
+  name text PRIMARY KEY,
+  version bigint NOT NULL,
+  changed_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO api_data_versions (name, version)
+VALUES ('deals', 1), ('aggregates_daily', 1), ('api_reports_daily_latest_mv', 1)
+ON CONFLICT (name) DO NOTHING;
+
+-- Writers only queue a bump (once per table and transaction, guarded by a
+-- transaction-local setting); the deferred trigger applies it at commit, so
+-- the single counter row is locked for the commit only, not for the whole
+-- ingest transaction, and concurrent ingests do not queue behind each other.
+CREATE TABLE IF NOT EXISTS api_data_version_bumps (
+  name text NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION api_queue_data_version_bump() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF current_setting('api.version_bump_' || TG_TABLE_NAME, true) IS DISTINCT FROM 'queued' THEN
+    PERFORM set_config('api.version_bump_' || TG_TABLE_NAME, 'queued', true);
+    INSERT INTO api_data_version_bumps (name) VALUES (TG_TABLE_NAME);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION api_bump_data_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO api_data_versions AS v (name, version, changed_at)
+  VALUES (NEW.name, 1, NOW())
+  ON CONFLICT (name)
+  DO UPDATE SET version = v.version + 1, changed_at = NOW();
+  DELETE FROM api_data_version_bumps WHERE ctid = NEW.ctid;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS api_data_version_bumps_apply ON api_data_version_bumps;
+CREATE CONSTRAINT TRIGGER api_data_version_bumps_apply
+  AFTER INSERT ON api_data_version_bumps
+  DEFERRABLE INITIALLY DEFERRED
+  FOR EACH ROW EXECUTE FUNCTION api_bump_data_version();
+
+DROP TRIGGER IF EXISTS deals_bump_version ON deals;
+CREATE TRIGGER deals_bump_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON deals
+  FOR EACH STATEMENT EXECUTE FUNCTION api_queue_data_version_bump();
+
+DROP TRIGGER IF EXISTS aggregates_daily_bump_version ON aggregates_daily;
+CREATE TRIGGER aggregates_daily_bump_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON aggregates_daily
+  FOR EACH STATEMENT EXECUTE FUNCTION api_queue_data_version_bump();
@@ -1,8 +1,8 @@
 -- JSON Views backing the Service API
 
--- Deals JSON view
--- Deals JSON view
-CREATE OR REPLACE VIEW api_deals_json AS
+-- Deals JSON shape (single source for the view and the column-based API queries)
+CREATE OR REPLACE FUNCTION api_deal_json(d deals) RETURNS jsonb
+LANGUAGE sql STABLE AS $$
 SELECT
   jsonb_build_object(
     'id', d.id,
@@ -48,7 +48,22 @@ SELECT
     'retention_plan_months', d.retention_plan_months,
     'retention_addons_months', d.retention_addons_months,
     'contract_support_amount', d.contract_support_amount
-  ) AS deal
+  )
+$$;
+
+-- Public /deals shape: legacy cash_delta folded into support_cash
+CREATE OR REPLACE FUNCTION api_deal_public_json(d deals) RETURNS jsonb
+LANGUAGE sql STABLE AS $$
+SELECT (api_deal_json(d) - 'cash_delta')
+       || jsonb_build_object(
+            'support_cash',
+            CASE WHEN d.cash_delta < 0 THEN trunc(abs(d.cash_delta)::numeric)::bigint END
+          )
+$$;
+
+-- Deals JSON view
+CREATE OR REPLACE VIEW api_deals_json AS
+SELECT api_deal_json(d) AS deal
 FROM deals d;
 
 -- Daily aggregates JSON view
@@ -67,14 +82,18 @@ SELECT jsonb_build_object(
 ) AS report
 FROM aggregates_daily a;
 
--- Latest snapshot per (model, capacity)
-CREATE OR REPLACE VIEW api_reports_daily_latest_json AS
-WITH latest AS (
-  SELECT model, capacity, MAX(ts) AS ts
-    FROM aggregates_daily
-   GROUP BY model, capacity
-)
-SELECT jsonb_build_object(
+-- Latest snapshot per (model, capacity), materialized.
+-- DISTINCT ON groups NULL capacities together (용량 미상 rows are kept), and the
+-- unique index on plain columns is what REFRESH ... CONCURRENTLY requires.
+-- Refreshed by the backend (app/services/snapshot_service.py).
+CREATE MATERIALIZED VIEW IF NOT EXISTS api_reports_daily_latest_mv AS
+SELECT DISTINCT ON (a.model, a.capacity)
+  a.model,
+  a.capacity,
+  COALESCE(a.capacity, '') AS capacity_key,
+  (a.capacity IS NULL) AS capacity_unknown,
+  a.ts,
+  jsonb_build_object(
     'model', a.model,
     'capacity', a.capacity,
     'ts', a.ts,
@@ -85,7 +104,14 @@ SELECT jsonb_build_object(
     'max', a.max,
     'avg', a.avg,
     'n', a.n
-) AS report
+  ) AS report
 FROM aggregates_daily a
-JOIN latest l
-  ON a.model = l.model AND a.capacity = l.capacity AND a.ts = l.ts;
+ORDER BY a.model, a.capacity, a.ts DESC;
+
+CREATE UNIQUE INDEX IF NOT EXISTS api_reports_daily_latest_mv_key
+  ON api_reports_daily_latest_mv (model, capacity_key, capacity_unknown);
+
+-- Compatibility view over the snapshot
+CREATE OR REPLACE VIEW api_reports_daily_latest_json AS
+SELECT report
+FROM api_reports_daily_latest_mv;
@@ -0,0 +1,49 @@
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache, make_key
+
+
+def test_make_key_ignores_unset_params_and_order():
+    assert make_key("deals", model="a", city=None, carrier="") == make_key("deals", model="a")
+    assert make_key("deals", a=1, b=2) == make_key("deals", b=2, a=1)
+    assert make_key("deals", a=1) != make_key("reports", a=1)
+
+
+def test_lru_eviction():
+    cache = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache("test", maxsize=10, ttl=5)
+    cache.set("a", 1)
+    now[0] += 4.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a", "gone") == "gone"
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_clear_drops_results_loaded_before_it():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.clear()
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    cache.set("a", "fresh", cache.generation)
+    assert cache.get("a") == "fresh"
+
+
+def test_disabled_cache_stores_nothing():
+    for cache in (TTLCache("off", enabled=False), TTLCache("zero", maxsize=0), TTLCache("no-ttl", ttl=0)):
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert cache.stats()["misses"] == 0
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.middleware.compression import CompressedCache, available_encodings, negotiate
+
+ALL = ("zstd", "br", "gzip")
+
+
+def test_available_encodings_always_include_gzip():
+    encodings = available_encodings()
+    assert "gzip" in encodings
+    # Server preference order is kept
+    assert list(encodings) == [e for e in ALL if e in encodings]
+
+
+@pytest.mark.parametrize(
+    "header,available,expected",
+    [
+        ("", ALL, None),
+        ("identity", ALL, None),
+        ("gzip, deflate, br, zstd", ALL, "zstd"),
+        ("gzip, br", ALL, "br"),
+        ("gzip, br", ("gzip",), "gzip"),
+        ("br;q=0.5, gzip;q=0.8", ALL, "gzip"),
+        ("GZIP", ALL, "gzip"),
+        ("*", ALL, "zstd"),
+        ("*;q=0.1, br;q=0", ALL, "zstd"),
+        ("gzip;q=0", ALL, None),
+        ("gzip;q=abc, br", ALL, "br"),
+        (" , gzip ", ALL, "gzip"),
+    ],
+)
+def test_negotiate(header, available, expected):
+    assert negotiate(header, available) == expected
+
+
+def test_compressed_cache_compresses_once_per_key():
+    cache = CompressedCache()
+    calls = 0
+
+    async def compress() -> bytes:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"body"
+
+    async def run() -> list:
+        first = await asyncio.gather(*(cache.get_or_compress(('"e1"', "gzip"), compress) for _ in range(3)))
+        return first + [await cache.get_or_compress(('"e1"', "gzip"), compress)]
+
+    assert asyncio.run(run()) == [b"body"] * 4
+    assert calls == 1
+    assert (cache.misses, cache.hits, len(cache)) == (1, 3, 1)
+
+
+def test_cancelled_first_caller_does_not_fail_waiters():
+    cache = CompressedCache()
+
+    async def run() -> tuple:
+        gate = asyncio.Event()
+
+        async def compress() -> bytes:
+            await gate.wait()
+            return b"body"
+
+        first = asyncio.ensure_future(cache.get_or_compress(('"e1"', "br"), compress))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_compress(('"e1"', "br"), compress))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        return first, await second
+
+    first, body = asyncio.run(run())
+    assert first.cancelled()
+    assert body == b"body"
+    assert len(cache) == 1
+
+
+def test_compressed_cache_is_byte_bounded():
+    cache = CompressedCache(max_bytes=40)
+
+    async def run() -> bytes:
+        for i in range(5):
+            await cache.get_or_compress((str(i), "gzip"), lambda: asyncio.sleep(0, b"x" * 10))
+        # More than a quarter of the cache: served but not kept
+        return await cache.get_or_compress(("big", "gzip"), lambda: asyncio.sleep(0, b"y" * 20))
+
+    assert asyncio.run(run()) == b"y" * 20
+    assert (cache.size, len(cache), cache.evictions) == (40, 4, 1)
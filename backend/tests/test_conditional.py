@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+from starlette.requests import Request
+
+from app.utils.conditional import make_validators
+
+CHANGED = datetime(2025, 3, 4, 5, 6, 7, 890000, tzinfo=timezone.utc)
+
+
+def _request(path: str = "/deals", query: str = "", headers: dict[str, str] | None = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+
+def test_etag_depends_on_path_query_and_versions():
+    tag = make_validators(_request(query="a=1&b=2"), [(5, CHANGED)]).etag
+    assert tag is not None and tag.startswith('"') and tag.endswith('"')
+    assert make_validators(_request(query="b=2&a=1"), [(5, CHANGED)]).etag == tag
+    assert make_validators(_request(query="a=1&b=3"), [(5, CHANGED)]).etag != tag
+    assert make_validators(_request("/reports/daily", "a=1&b=2"), [(5, CHANGED)]).etag != tag
+    assert make_validators(_request(query="a=1&b=2"), [(6, CHANGED)]).etag != tag
+
+
+def test_last_modified_is_the_latest_change():
+    earlier = CHANGED.replace(year=2024)
+    validators = make_validators(_request(), [(1, earlier), (2, CHANGED)], "public, max-age=5")
+    assert validators.last_modified == CHANGED
+    assert validators.headers() == {
+        "ETag": validators.etag,
+        "Last-Modified": "Tue, 04 Mar 2025 05:06:07 GMT",
+        "Cache-Control": "public, max-age=5",
+    }
+
+
+def test_unknown_version_disables_validation():
+    validators = make_validators(_request(), [(1, CHANGED), None], "no-cache")
+    assert validators.etag is None and validators.last_modified is None
+    assert validators.headers() == {"Cache-Control": "no-cache"}
+    assert not validators.matches(_request(headers={"If-None-Match": "*"}))
+    assert make_validators(_request(), []).etag is None
+
+
+def test_if_none_match():
+    etag = make_validators(_request(), [(5, CHANGED)]).etag
+    opaque = etag.strip('"')
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*", f'"{opaque}-gzip"', f'W/"{opaque}-br"'):
+        request = _request(headers={"If-None-Match": header})
+        assert make_validators(request, [(5, CHANGED)]).matches(request), header
+    request = _request(headers={"If-None-Match": '"other"'})
+    assert not make_validators(request, [(5, CHANGED)]).matches(request)
+
+
+def test_if_none_match_wins_over_if_modified_since():
+    request = _request(headers={"If-None-Match": '"other"', "If-Modified-Since": "Wed, 01 Jan 2031 00:00:00 GMT"})
+    assert not make_validators(request, [(5, CHANGED)]).matches(request)
+
+
+def test_if_modified_since_has_second_precision():
+    for header, expected in (
+        ("Tue, 04 Mar 2025 05:06:07 GMT", True),
+        ("Tue, 04 Mar 2025 05:06:06 GMT", False),
+        ("Wed, 05 Mar 2025 00:00:00 GMT", True),
+        ("not a date", False),
+    ):
+        request = _request(headers={"If-Modified-Since": header})
+        assert make_validators(request, [(5, CHANGED)]).matches(request) is expected, header
+
+
+def test_not_modified_keeps_validators():
+    validators = make_validators(_request(), [(5, CHANGED)], "private")
+    response = validators.not_modified()
+    assert response.status_code == 304
+    assert response.headers["etag"] == validators.etag
+    assert response.headers["cache-control"] == "private"
+    assert response.body == b""
@@ -0,0 +1,54 @@
+import pytest
+from fastapi import HTTPException
+
+from app.repos.deal_repo import _keyset_clause, deal_cursor_key
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    key = {"s": "tco_asc", "t": 1234.5, "p": "2025-01-02T03:04:05+00:00", "i": "딜-1"}
+    cursor = encode_cursor(key)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == key
+
+
+def test_empty_cursor_starts_from_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["%%%", "bm90IGpzb24", encode_cursor([1, 2])])
+def test_malformed_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_keyset_clause_latest():
+    deal = {"id": "a1", "parsed_at": "2025-01-02T03:04:05+00:00", "tco_total": 10}
+    clause, params = _keyset_clause("latest", decode_cursor(encode_cursor(deal_cursor_key(deal, "latest"))))
+    assert clause == " AND (d.parsed_at, d.id) < (:c_parsed_at, :c_id)"
+    assert params["c_id"] == "a1"
+    assert params["c_parsed_at"].isoformat() == "2025-01-02T03:04:05+00:00"
+
+
+def test_keyset_clause_tco_null_tail():
+    key = {"s": "tco_asc", "t": None, "p": "2025-01-02T03:04:05+00:00", "i": "a1"}
+    clause, params = _keyset_clause("tco_asc", key)
+    assert "d.tco_total IS NULL AND" in clause
+    assert "c_tco" not in params
+
+
+@pytest.mark.parametrize(
+    "sort,key",
+    [
+        ("tco_asc", {"s": "latest", "p": "2025-01-02T03:04:05+00:00", "i": "a1"}),
+        ("latest", {"s": "latest", "i": "a1"}),
+        ("latest", {"s": "latest", "p": "yesterday", "i": "a1"}),
+        ("latest", {"s": "latest", "p": "2025-01-02T03:04:05+00:00", "i": 7}),
+        ("tco_asc", {"s": "tco_asc", "t": "cheap", "p": "2025-01-02T03:04:05+00:00", "i": "a1"}),
+    ],
+)
+def test_keyset_clause_rejects_foreign_or_malformed_keys(sort, key):
+    with pytest.raises(ValueError):
+        _keyset_clause(sort, key)
@@ -0,0 +1,114 @@
+from decimal import Decimal
+
+import pytest
+
+from app.services.rule_engine import BatchContext, CompiledRule, RuleIndex, evaluate
+
+
+def _rule(id: int, type: str = "STRICT_MATCH", filters=None, constraints=None, thresholds=None, **extra) -> CompiledRule:
+    return CompiledRule.from_row({
+        "id": id, "user_id": "u1", "type": type, "filters": filters, "constraints": constraints,
+        "thresholds": thresholds, **extra,
+    })
+
+
+def _deal(**fields) -> dict:
+    deal = {"model": "iphone-16", "carrier": "SKT", "channel": "online", "city": "서울", "capacity": "256GB"}
+    deal.update(fields)
+    return deal
+
+
+def test_from_row_filters_and_cooldown():
+    rule = _rule(1, filters={"models": ["iphone-16"], "carriers": "KT", "city": "", "channels": []})
+    assert rule.filters == {"model": frozenset({"iphone-16"}), "carrier": frozenset({"KT"})}
+    assert rule.cooldown_hours == 3
+    assert _rule(2, cooldown_hours=0).cooldown_hours == 0
+    assert _rule(3, cooldown_hours=6, frequency="daily").cooldown_hours == 24
+
+
+def test_index_candidates_intersect_fields():
+    index = RuleIndex()
+    index.add(_rule(1))  # no filters: every deal
+    index.add(_rule(2, filters={"models": ["iphone-16", "galaxy-s25"]}))
+    index.add(_rule(3, filters={"models": ["iphone-16"], "carriers": ["KT"]}))
+    index.add(_rule(4, filters={"channels": ["offline"]}))
+    assert index.candidates(_deal()) == {1, 2}
+    assert index.candidates(_deal(carrier="KT")) == {1, 2, 3}
+    assert index.candidates(_deal(model="pixel", channel="offline")) == {1, 4}
+
+
+def test_index_remove_and_upsert():
+    index = RuleIndex()
+    index.add(_rule(1, filters={"models": ["iphone-16"]}))
+    # Re-adding replaces the old filters
+    index.add(_rule(1, filters={"models": ["galaxy-s25"]}))
+    assert index.candidates(_deal()) == set()
+    index.upsert_row({"id": 1, "user_id": "u1", "type": "STRICT_MATCH", "enabled": False}, 1)
+    assert len(index) == 0
+    assert index.candidates(_deal(model="galaxy-s25")) == set()
+    index.upsert_row({"id": 2, "user_id": "u1", "type": "STRICT_MATCH"}, 2)
+    index.upsert_row(None, 3)
+    assert index.candidates(_deal()) == {2}
+
+
+def test_generic_constraints_and_bounds():
+    rule = _rule(1, constraints={"contract": ["선택약정", "공시지원"], "payment": "할부"},
+                 thresholds={"tco_total_max": 1_000_000, "upfront_min": 0})
+    ctx = BatchContext()
+    ok = _deal(contract="선택약정", payment="할부", tco_total=Decimal("900000"), upfront=0)
+    assert evaluate(rule, ok, ctx)
+    assert not evaluate(rule, {**ok, "contract": "무약정"}, ctx)
+    assert not evaluate(rule, {**ok, "tco_total": 1_000_001}, ctx)
+    # A bound on a missing value does not pass
+    assert not evaluate(rule, {**ok, "upfront": None}, ctx)
+
+
+def test_strict_match_accepts_unpriced_deals():
+    assert evaluate(_rule(1), _deal(tco_total=None), BatchContext())
+
+
+def test_cheapest_against_prior_minimum():
+    ctx = BatchContext(prior_min_by_model={"iphone-16": 1_000.0, "galaxy-s25": None}, global_prior_min=800.0)
+    rule = _rule(1, "CHEAPEST")
+    assert evaluate(rule, _deal(tco_total=999), ctx)
+    assert not evaluate(rule, _deal(tco_total=1_000), ctx)
+    assert evaluate(rule, _deal(model="galaxy-s25", tco_total=5_000), ctx)
+    assert not evaluate(_rule(2, "CHEAPEST", thresholds={"scope": "global"}), _deal(tco_total=900), ctx)
+    assert not evaluate(rule, _deal(tco_total=None), ctx)
+
+
+@pytest.mark.parametrize(
+    "thresholds,tco,expected",
+    [
+        (None, 900, True),  # default 10%
+        (None, 901, False),
+        ({"drop_pct_min": 0}, 1_000, True),  # explicit 0: any deal at or below the median
+        ({"drop_pct_min": 0}, 1_001, False),
+        ({"drop_pct_min": 30}, 800, False),
+    ],
+)
+def test_big_drop(thresholds, tco, expected):
+    ctx = BatchContext(median_by_key={("iphone-16", "256GB"): 1_000.0})
+    assert evaluate(_rule(1, "BIG_DROP", thresholds=thresholds), _deal(tco_total=tco), ctx) is expected
+
+
+def test_big_drop_needs_a_median():
+    assert not evaluate(_rule(1, "BIG_DROP"), _deal(tco_total=1), BatchContext())
+
+
+@pytest.mark.parametrize(
+    "thresholds,net,expected",
+    [
+        (None, 800, True),  # default 20%
+        (None, 801, False),
+        ({"discount_pct_min": 0}, 1_000, True),
+        ({"discount_pct_min": 50}, 600, False),
+    ],
+)
+def test_best_discount(thresholds, net, expected):
+    rule = _rule(1, "BEST_DISCOUNT", thresholds=thresholds)
+    assert evaluate(rule, _deal(tco_total=1_000, tco_net=net), BatchContext()) is expected
+
+
+def test_unknown_type_never_matches():
+    assert not evaluate(_rule(1, "SOMETHING_ELSE"), _deal(tco_total=1), BatchContext())
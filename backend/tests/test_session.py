@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+import pytest
+
+from app.core.metrics import registry
+from app.db.session import Database, StatementSet, compile_query
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+def _executions(statement: str) -> float:
+    # As scraped from /metrics
+    prefix = f'db_statement_executions_total{{statement="{statement}"}} '
+    for line in registry.render().splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0.0
+
+
+def test_canonical_statement_survives_pool_release():
+    # One connection, so every call reuses it after it went back to the pool
+    database = Database("test", TEST_DATABASE_URL, min_size=1, max_size=1, statements=StatementSet())
+    query = "SELECT CAST(:n AS int) + 1 AS v"
+    database.prepare("test.add_one", query)
+    server_prepared = "SELECT count(*) FROM pg_prepared_statements WHERE statement = :sql"
+
+    async def run() -> list:
+        await database.connect()
+        sql = compile_query(query)[0]
+        try:
+            # Prepared on connect, before its first execution
+            warmed = await database.fetch_val(server_prepared, {"sql": sql})
+            values = [await database.fetch_val(query, {"n": n}) for n in (1, 2)]
+            rows = await database.fetch_all(query, {"n": 3})
+            # Still the one statement after the releases above
+            prepared = await database.fetch_val(server_prepared, {"sql": sql})
+            return [warmed] + values + [rows[0]["v"], prepared]
+        finally:
+            await database.disconnect()
+
+    before = _executions("test.add_one")
+    assert asyncio.run(run()) == [1, 2, 3, 4, 1]
+    assert _executions("test.add_one") - before == 3
+
@@ -0,0 +1,132 @@
+import asyncio
+
+from app.utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def load() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def run() -> list:
+        return await asyncio.gather(*(flights.do("k", load) for _ in range(5)))
+
+    assert asyncio.run(run()) == [42] * 5
+    assert calls == 1
+    assert (flights.leaders, flights.coalesced, len(flights)) == (1, 4, 0)
+
+
+def test_finished_call_is_not_joined():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def load() -> int:
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run() -> list:
+        return [await flights.do("k", load), await flights.do("k", load)]
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    flights = SingleFlight("test")
+
+    async def run() -> tuple:
+        gate = asyncio.Event()
+
+        async def load() -> str:
+            await gate.wait()
+            return "ok"
+
+        leader = asyncio.ensure_future(flights.do("k", load))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        return leader, await follower
+
+    leader, result = asyncio.run(run())
+    assert leader.cancelled()
+    assert result == "ok"
+    assert flights.cancelled == 0
+
+
+def test_call_is_cancelled_when_every_caller_is():
+    flights = SingleFlight("test")
+    cancelled = False
+
+    async def run() -> None:
+        nonlocal cancelled
+
+        async def load() -> None:
+            nonlocal cancelled
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+        callers = [asyncio.ensure_future(flights.do("k", load)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled
+    assert (flights.cancelled, len(flights)) == (1, 0)
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight("test")
+
+    async def load() -> None:
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    async def run() -> list:
+        return await asyncio.gather(*(flights.do("k", load) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(flights) == 0
+
+
+def test_disabled_runs_every_call():
+    flights = SingleFlight("test", enabled=False)
+    calls = 0
+
+    async def load() -> None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+
+    async def run() -> None:
+        await asyncio.gather(*(flights.do("k", load) for _ in range(3)))
+
+    asyncio.run(run())
+    assert calls == 3
+
+
+def test_keys_do_not_share():
+    flights = SingleFlight("test")
+
+    async def run() -> list:
+        return await asyncio.gather(
+            flights.do(("deals", 1), lambda: asyncio.sleep(0, "a")),
+            flights.do(("deals", 2), lambda: asyncio.sleep(0, "b")),
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flights.leaders == 2
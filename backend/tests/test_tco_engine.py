@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+
+from app.services.tco_engine import (
+    DEFAULT_HORIZON_MONTHS,
+    TCO_COLUMNS,
+    DealArrays,
+    compute_tco,
+    effective_tco,
+    horizon_months,
+    mvno_tail_surcharge,
+    rank_by_savings,
+)
+
+
+def _deal(id: str, **fields) -> dict:
+    row = {name: None for name in TCO_COLUMNS}
+    row.update(fields, id=id)
+    return row
+
+
+def test_compute_tco_sums_segments_and_skips_nulls():
+    arr = DealArrays.from_rows([
+        _deal(
+            "a", upfront=100_000, plan_high_fee=90_000, plan_high_months=6, plan_after_fee=50_000,
+            plan_after_months=18, addons_monthly=3_000, addons_months=6, device_finance_monthly=20_000,
+            device_finance_months=24, cash_delta=-150_000.7,
+        ),
+        _deal("b", upfront=None, plan_high_fee=30_000, plan_high_months=None, device_finance_total=500_000),
+    ])
+    total, net = compute_tco(arr)
+    expected = 100_000 + 90_000 * 6 + 50_000 * 18 + 3_000 * 6 + 20_000 * 24
+    assert total.tolist() == [expected, 500_000]
+    # Negative cash_delta is support cash, truncated to whole won
+    assert net.tolist() == [expected - 150_000, 500_000]
+
+
+def test_effective_tco_prefers_stored_values():
+    arr = DealArrays.from_rows([
+        _deal("stored", upfront=100, tco_total=999, tco_net=900),
+        _deal("computed", upfront=100, cash_delta=-10),
+        _deal("net-only", upfront=100, tco_total=500, cash_delta=-10),
+    ])
+    total, net = effective_tco(arr)
+    assert total.tolist() == [999, 100, 500]
+    assert net.tolist() == [900, 90, 490]
+
+
+def test_horizon_defaults_without_plan_months():
+    arr = DealArrays.from_rows([
+        _deal("a", plan_high_months=6, plan_after_months=18, mvno_tail_months=6),
+        _deal("b"),
+    ])
+    assert horizon_months(arr).tolist() == [30, DEFAULT_HORIZON_MONTHS]
+
+
+def test_mvno_tail_surcharge():
+    arr = DealArrays.from_rows([
+        _deal("tail", plan_after_fee=50_000, mvno_tail_fee=20_000, mvno_tail_months=12),
+        _deal("no-tail", plan_after_fee=50_000),
+        _deal("no-fee", mvno_tail_fee=20_000, mvno_tail_months=12),
+    ])
+    assert mvno_tail_surcharge(arr).tolist() == [360_000, 0, 0]
+
+
+def test_rank_by_savings_orders_by_monthly_savings():
+    arr = DealArrays.from_rows([
+        _deal("24m", tco_net=1_200_000, plan_high_months=24),
+        _deal("12m", tco_net=500_000, plan_high_months=12),
+        _deal("expensive", tco_net=3_000_000, plan_high_months=24),
+    ])
+    ranking = rank_by_savings(arr, current_plan_fee=60_000, addons_monthly=10_000)
+    assert [arr.ids[i] for i in ranking.index] == ["12m", "24m", "expensive"]
+    assert ranking.savings_total.tolist() == [70_000 * 12 - 500_000, 70_000 * 24 - 1_200_000, 70_000 * 24 - 3_000_000]
+    assert ranking.savings_monthly[0] == (70_000 * 12 - 500_000) / 12
+
+
+def test_rank_by_savings_charges_mvno_tail_unless_accepted():
+    arr = DealArrays.from_rows([
+        _deal("mvno", tco_net=900_000, plan_high_months=12, plan_after_fee=50_000,
+              mvno_tail_fee=10_000, mvno_tail_months=12),
+        _deal("carrier", tco_net=1_000_000, plan_high_months=24),
+    ])
+    ok = rank_by_savings(arr, 60_000, 0, mvno_ok=True)
+    assert arr.ids[ok.index[0]] == "mvno"
+    stay = rank_by_savings(arr, 60_000, 0, mvno_ok=False)
+    assert arr.ids[stay.index[0]] == "carrier"
+    assert stay.tco_net[stay.index.tolist().index(0)] == 900_000 + 40_000 * 12
+
+
+def test_rank_by_savings_limit_and_empty():
+    arr = DealArrays.from_rows([_deal(str(i), tco_net=1_000 * i) for i in range(50)])
+    ranking = rank_by_savings(arr, None, None, limit=5)
+    assert [arr.ids[i] for i in ranking.index] == ["0", "1", "2", "3", "4"]
+    assert rank_by_savings(arr, None, None, limit=0).index.size == 0
+    empty = rank_by_savings(DealArrays.from_rows([]), 50_000, 0)
+    assert empty.index.size == 0 and empty.savings_total.size == 0
+
+
+def test_from_rows_maps_null_to_nan():
+    arr = DealArrays.from_rows([_deal("a", upfront=None, plan_high_fee=1)])
+    assert math.isnan(arr.cols["upfront"][0])
+    assert arr.cols["plan_high_fee"].dtype == np.float64
@@ -0,0 +1,58 @@
+import math
+
+import numpy as np
+
+from app.utils.tdigest import TDigest
+
+
+def _quantiles(digest: TDigest, values: np.ndarray) -> np.ndarray:
+    return digest.quantile([0.25, 0.5, 0.75], float(values.min()), float(values.max()))
+
+
+def test_quantiles_close_to_exact():
+    values = np.random.default_rng(1).lognormal(13, 0.4, 20_000)
+    digest = TDigest.from_values(values)
+    exact = np.quantile(values, [0.25, 0.5, 0.75])
+    assert np.allclose(_quantiles(digest, values), exact, rtol=0.01)
+    assert digest.count == values.size
+    # Bounded by the compression, not by the number of values
+    assert digest.means.size <= 2 * digest.compression
+
+
+def test_merge_matches_one_digest_over_all_values():
+    rng = np.random.default_rng(2)
+    a, b = rng.normal(1e6, 1e5, 5_000), rng.normal(1.2e6, 1e5, 7_000)
+    merged = TDigest.from_values(a)
+    merged.merge(TDigest.from_values(b))
+    both = np.concatenate([a, b])
+    assert merged.count == both.size
+    assert np.allclose(_quantiles(merged, both), np.quantile(both, [0.25, 0.5, 0.75]), rtol=0.01)
+
+
+def test_incremental_adds_match_a_single_add():
+    values = np.random.default_rng(3).uniform(0, 1000, 3_000)
+    incremental = TDigest()
+    for chunk in np.array_split(values, 30):
+        incremental.add(chunk)
+    assert incremental.count == values.size
+    assert np.allclose(_quantiles(incremental, values), np.quantile(values, [0.25, 0.5, 0.75]), atol=10)
+
+
+def test_small_inputs_are_exact():
+    digest = TDigest.from_values([10.0, 20.0, 30.0])
+    assert digest.quantile(0.5, 10.0, 30.0).tolist() == [20.0]
+    assert digest.quantile([0.0, 1.0], 10.0, 30.0).tolist() == [10.0, 30.0]
+
+
+def test_empty_and_nan():
+    digest = TDigest.from_values([math.nan])
+    assert digest.count == 0
+    assert np.isnan(digest.quantile(0.5, 0.0, 1.0)).all()
+    digest.merge(TDigest())
+    assert digest.count == 0
+
+
+def test_round_trips_through_stored_arrays():
+    digest = TDigest.from_values(range(1000))
+    copy = TDigest(digest.compression, digest.means.tolist(), digest.weights.tolist())
+    assert copy.quantile(0.5, 0, 999).tolist() == digest.quantile(0.5, 0, 999).tolist()